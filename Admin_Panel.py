@@ -1,5 +1,8 @@
 import streamlit as st
-import asyncio
+import plotly.express as px
+from async_runtime import run_async
+from cohort_analytics import distributions, participation_by_team
+import counters
 
 def app():
     st.header("🏢 Enterprise Admin Panel")
@@ -13,7 +16,7 @@ def app():
     # --- Load existing organizations at the top of the page ---
     if 'organizations' not in st.session_state:
         with st.spinner("Loading organizations..."):
-            st.session_state.organizations = asyncio.run(backend.get_all_organizations())
+            st.session_state.organizations = run_async(backend.get_all_organizations())
     
     organizations = st.session_state.get('organizations', [])
     org_map = {org.get('name', 'Unnamed'): org['id'] for org in organizations if org.get('id')}
@@ -28,7 +31,7 @@ def app():
             if submitted and new_org_name:
                 admin_uid = st.session_state.user_info['uid']
                 with st.spinner(f"Creating '{new_org_name}'..."):
-                    org_id = asyncio.run(backend.create_organization(new_org_name, admin_uid))
+                    org_id = run_async(backend.create_organization(new_org_name, admin_uid))
                     if org_id:
                         st.success(f"Successfully created organization!")
                         st.session_state.pop('organizations', None) # Force reload
@@ -48,7 +51,7 @@ def app():
                 if submitted and selected_org_name and new_team_name:
                     selected_org_id = org_map[selected_org_name]
                     with st.spinner(f"Adding team..."):
-                        success = asyncio.run(backend.add_team_to_organization(selected_org_id, new_team_name))
+                        success = run_async(backend.add_team_to_organization(selected_org_id, new_team_name))
                         if success:
                             st.success("Team added successfully!")
                         else:
@@ -78,7 +81,7 @@ def app():
                         submitted = st.form_submit_button("Save Name")
                         if submitted:
                             with st.spinner("Renaming..."):
-                                success = asyncio.run(backend.rename_organization(org_id, new_org_name_input))
+                                success = run_async(backend.rename_organization(org_id, new_org_name_input))
                                 if success:
                                     st.success("Renamed successfully!")
                                     st.session_state.pop(f'rename_org_mode_{org_id}', None)
@@ -104,7 +107,7 @@ def app():
                         
                         if t_col3.button("Delete Team", key=f"delete_team_btn_{team_id}", type="primary"):
                              with st.spinner("Deleting..."):
-                                success = asyncio.run(backend.delete_team(org_id, team_id))
+                                success = run_async(backend.delete_team(org_id, team_id))
                                 if success:
                                     st.success(f"Deleted {team_name}")
                                     st.rerun()
@@ -117,10 +120,106 @@ def app():
                                 submitted = st.form_submit_button("Save")
                                 if submitted:
                                     with st.spinner("Renaming..."):
-                                        success = asyncio.run(backend.rename_team(org_id, team_id, new_name_input))
+                                        success = run_async(backend.rename_team(org_id, team_id, new_name_input))
                                         if success:
                                             st.success("Renamed successfully!")
                                             st.session_state.pop(f'rename_team_mode_{team_id}', None)
                                             st.rerun()
                                         else:
-                                            st.error("Rename failed.")
\ No newline at end of file
+                                            st.error("Rename failed.")
+
+                if teams:
+                    with st.form(f"assign_team_form_{org_id}"):
+                        st.write("**Assign a member to a team:**")
+                        members = {
+                            f"{user.get('name', 'Unnamed')} ({user.get('email', user['uid'])})": user['uid']
+                            for user in org_members(backend, org_id)
+                        }
+                        team_options = {"(no team)": None} | {team.get("name", "Unnamed Team"): team.get("id") for team in teams}
+                        a_col1, a_col2 = st.columns(2)
+                        member_label = a_col1.selectbox("Member", options=list(members.keys()), key=f"assign_member_{org_id}")
+                        team_label = a_col2.selectbox("Team", options=list(team_options.keys()), key=f"assign_team_{org_id}")
+                        if st.form_submit_button("Assign") and member_label:
+                            if run_async(backend.assign_user_to_team(org_id, members[member_label], team_options[team_label])):
+                                st.success(f"Assigned {member_label} to {team_label}.")
+                                st.session_state.pop(f'org_members_{org_id}', None)
+                                backend.cohort_analytics.invalidate(org_id)
+                            else:
+                                st.error("Assignment failed.")
+
+    # --- Population Health ---
+    st.markdown("---")
+    st.subheader("Population Health")
+    if org_map:
+        display_population_health(backend, org_map)
+    else:
+        st.info("Create an organization first.")
+
+    # --- AI Performance (this server process) ---
+    st.markdown("---")
+    st.subheader("AI Performance")
+    st.caption("Recent AI calls served by this app process. Times are in seconds; cache hits and errors are excluded from the percentiles.")
+    routes = backend.model_router.status()
+    metrics = [{'feature': row['feature'], 'model_in_use': routes.get(row['feature'], '')} | row for row in backend.ai_metrics.summary()]
+    if not metrics:
+        st.info("No AI calls recorded yet.")
+    else:
+        st.dataframe(metrics, use_container_width=True, hide_index=True)
+
+def org_members(backend, org_id):
+    """The org's user profiles, loaded once per session."""
+    key = f'org_members_{org_id}'
+    if key not in st.session_state:
+        st.session_state[key] = [user for user in run_async(backend.get_users_in_organization(org_id)) if user.get('uid')]
+    return st.session_state[key]
+
+def display_population_health(backend, org_map):
+    """Org-wide distributions and team participation from the cached cohort frame."""
+    p_col1, p_col2 = st.columns([3, 1])
+    org_name = p_col1.selectbox("Organization", options=list(org_map.keys()), key="population_org")
+    refresh = p_col2.button("🔄 Refresh", key="population_refresh")
+    org_id = org_map[org_name]
+    display_live_counters(backend, org_id)
+
+    with st.spinner("Loading population health..."):
+        frame = run_async(backend.cohort_analytics.org_frame(backend, org_id, refresh=refresh))
+    if frame.empty:
+        st.info("No members in this organization yet.")
+        return
+
+    window_days = backend.cohort_analytics.window_days
+    st.caption(f"{len(frame)} members, logs from the last {window_days} days. "
+               f"As of {frame.attrs['built_at']:%Y-%m-%d %H:%M} UTC (cached for a few minutes).")
+    m_col1, m_col2, m_col3, m_col4 = st.columns(4)
+    m_col1.metric("Members", f"{len(frame):,}")
+    m_col2.metric("Active (7 days)", f"{frame['active_7d'].mean() * 100:.0f}%")
+    m_col3.metric("Median BMI", f"{frame['bmi'].median():.1f}" if frame['bmi'].notna().any() else "—")
+    m_col4.metric("Median weekly minutes", f"{frame['weekly_active_minutes'].median():.0f}")
+
+    st.markdown("#### Distributions")
+    st.dataframe(distributions(frame), use_container_width=True, hide_index=True)
+    h_col1, h_col2 = st.columns(2)
+    h_col1.plotly_chart(px.histogram(frame, x='bmi', nbins=30, title='BMI'), use_container_width=True)
+    h_col2.plotly_chart(px.histogram(frame, x='health_score', nbins=20, title='Health Score'), use_container_width=True)
+
+    st.markdown("#### Participation by Team")
+    teams = participation_by_team(frame, backend.get_teams_for_organization(org_id))
+    st.dataframe(teams, use_container_width=True, hide_index=True)
+    st.plotly_chart(px.bar(teams, x='team', y='participation_rate', title='Active in the last 7 days (%)'), use_container_width=True)
+
+def display_live_counters(backend, org_id):
+    """Live participation from the sharded counters (a few reads per team, no scans)."""
+    teams = backend.get_teams_for_organization(org_id)
+    scopes = [counters.ORG_SCOPE] + [counters.team_scope(team['id']) for team in teams]
+    live = {scope: counters.summarize(values) for scope, values in run_async(backend.get_counters(org_id, scopes)).items()}
+    org = live[counters.ORG_SCOPE]
+    st.markdown("#### Live Participation")
+    l_col1, l_col2, l_col3, l_col4 = st.columns(4)
+    l_col1.metric("Members", f"{org['members']:,}")
+    l_col2.metric("Active this week", f"{org['active_this_week']:,}")
+    l_col3.metric("Workout minutes this week", f"{org['workout_minutes_this_week']:,}")
+    l_col4.metric("Logged today", f"{org['loggers_today']:,}")
+    if teams:
+        st.dataframe([
+            {'team': team.get('name', 'Unnamed Team')} | live[counters.team_scope(team['id'])] for team in teams
+        ], use_container_width=True, hide_index=True)
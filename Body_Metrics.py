@@ -3,7 +3,10 @@ import plotly.graph_objects as go
 import plotly.express as px
 import pandas as pd
 from datetime import datetime
-import asyncio
+from async_runtime import run_async
+import fitness_calcs
+from recompute_metrics import recompute_user_metrics
+from health_profile import ACTIVITY_LEVELS, DEFAULT_METRICS, FITNESS_GOALS, HealthProfile
 
 def app():
     """Main Body Metrics application focused on current metrics and analysis"""
@@ -18,7 +21,7 @@ def app():
             org_id = st.session_state.user_info.get('org_id')
             
             if user_uid and org_id:
-                user_profile = asyncio.run(backend.get_user_profile(user_uid, org_id))
+                user_profile = run_async(backend.get_user_profile(user_uid, org_id))
                 
                 if user_profile:
                     st.session_state.user_profile = user_profile
@@ -36,6 +39,8 @@ def app():
                         st.session_state.height_cm = float(st.session_state.body_metrics_data.get('height_cm', 175.0))
                         st.session_state.age = int(st.session_state.body_metrics_data.get('age', 30))
                         st.session_state.gender = st.session_state.body_metrics_data.get('gender', "Male")
+                    st.session_state.activity_level = st.session_state.body_metrics_data.get('activity_level', DEFAULT_METRICS['activity_level'])
+                    st.session_state.fitness_goal = st.session_state.body_metrics_data.get('fitness_goal', DEFAULT_METRICS['fitness_goal'])
                 else:
                     st.error("Could not load user profile. Please try logging in again.")
                     st.session_state.needs_metrics_input = True 
@@ -58,6 +63,8 @@ def app():
             st.session_state.age = 0
             st.session_state.gender = "Male"
 
+        st.session_state.setdefault('activity_level', DEFAULT_METRICS['activity_level'])
+        st.session_state.setdefault('fitness_goal', DEFAULT_METRICS['fitness_goal'])
         st.session_state.user_profile_loaded = True
 
     # Create tabs
@@ -124,10 +131,30 @@ def display_current_metrics(backend):
             key="input_gender"
         )
     
+    col5, col6 = st.columns(2)
+
+    with col5:
+        new_activity_level = st.selectbox(
+            "🏃 Activity Level",
+            ACTIVITY_LEVELS,
+            index=ACTIVITY_LEVELS.index(st.session_state.activity_level) if st.session_state.activity_level in ACTIVITY_LEVELS else 2,
+            key="input_activity_level"
+        )
+
+    with col6:
+        new_fitness_goal = st.selectbox(
+            "🎯 Fitness Goal",
+            FITNESS_GOALS,
+            index=FITNESS_GOALS.index(st.session_state.fitness_goal) if st.session_state.fitness_goal in FITNESS_GOALS else 2,
+            key="input_fitness_goal"
+        )
+
     st.session_state.weight_kg = new_weight
     st.session_state.height_cm = new_height
     st.session_state.age = new_age
     st.session_state.gender = new_gender
+    st.session_state.activity_level = new_activity_level
+    st.session_state.fitness_goal = new_fitness_goal
 
     if st.button("Save My Metrics", key="save_metrics_button"):
         user_uid = st.session_state.user_info.get('uid')
@@ -140,11 +167,20 @@ def display_current_metrics(backend):
                 'weight_kg': st.session_state.weight_kg,
                 'height_cm': st.session_state.height_cm,
                 'age': st.session_state.age,
-                'gender': st.session_state.gender
+                'gender': st.session_state.gender,
+                'activity_level': st.session_state.activity_level,
+                'fitness_goal': st.session_state.fitness_goal
             }
-            success = asyncio.run(backend.update_user_profile(user_uid, org_id, {'body_metrics': metrics_to_save}))
+            previous = st.session_state.get('body_metrics_data') or {}
+            success = run_async(backend.update_user_profile(user_uid, org_id, {'body_metrics': metrics_to_save}))
             if success:
                 st.success("Your body metrics have been saved successfully!")
+                # Logged BMI / body fat were computed from the old height, age and gender
+                if previous and any(previous.get(key) != metrics_to_save[key] for key in ('height_cm', 'age', 'gender')):
+                    with st.spinner("Updating your progress history..."):
+                        stats = run_async(recompute_user_metrics(backend, org_id, user_uid, metrics_to_save))
+                    if stats['written']:
+                        st.toast(f"Updated BMI and body fat in {stats['written']} past progress entries.")
                 st.session_state.body_metrics_data = metrics_to_save
                 st.session_state.needs_metrics_input = False
                 st.rerun()
@@ -158,11 +194,10 @@ def display_current_metrics(backend):
     if not st.session_state.needs_metrics_input:
         st.subheader("📊 Your Current Health Metrics")
         
-        bmi = backend.calculate_bmi(st.session_state.weight_kg, st.session_state.height_cm)
-        body_fat = backend.calculate_body_fat(bmi, st.session_state.age, st.session_state.gender)
-        bmr = backend.calculate_bmr(st.session_state.weight_kg, st.session_state.height_cm, st.session_state.age, st.session_state.gender)
+        health = session_health_profile()
+        bmi, body_fat, bmr = health.bmi, health.body_fat_percent, health.bmr
         
-        ideal_weight = calculate_ideal_weight(st.session_state.height_cm, st.session_state.gender)
+        ideal_weight = health.ideal_weight_kg
         bmi_category, bmi_color = get_bmi_category(bmi)
         bf_category = get_body_fat_category(body_fat, st.session_state.gender)
         
@@ -197,10 +232,9 @@ def display_health_analysis(backend):
     
     st.subheader("Health Status Analysis")
     
-    # Get current metrics from session state
-    bmi = backend.calculate_bmi(st.session_state.weight_kg, st.session_state.height_cm)
-    body_fat = backend.calculate_body_fat(bmi, st.session_state.age, st.session_state.gender)
-    bmr = backend.calculate_bmr(st.session_state.weight_kg, st.session_state.height_cm, st.session_state.age, st.session_state.gender)
+    # Current metrics: the same snapshot the other tabs use
+    health = session_health_profile()
+    bmi, body_fat, bmr = health.bmi, health.body_fat_percent, health.bmr
     
     # Health status indicators
     col1, col2 = st.columns(2)
@@ -255,10 +289,9 @@ def display_body_composition_analysis(backend):
     
     st.subheader("Body Composition Analysis")
     
-    # Get current metrics from session state
-    bmi = backend.calculate_bmi(st.session_state.weight_kg, st.session_state.height_cm)
-    body_fat = backend.calculate_body_fat(bmi, st.session_state.age, st.session_state.gender)
-    bmr = backend.calculate_bmr(st.session_state.weight_kg, st.session_state.height_cm, st.session_state.age, st.session_state.gender)
+    # Current metrics: the same snapshot the other tabs use
+    health = session_health_profile()
+    bmi, body_fat, bmr = health.bmi, health.body_fat_percent, health.bmr
     
     # Body composition breakdown
     fat_mass = (body_fat / 100) * st.session_state.weight_kg
@@ -306,7 +339,7 @@ def display_body_composition_analysis(backend):
         st.metric("Est. Muscle Mass", f"{muscle_mass:.1f} kg", help="Estimated skeletal muscle mass")
         
     with col4:
-        water_content = estimate_body_water(st.session_state.weight_kg, st.session_state.age, st.session_state.gender)
+        water_content = health.body_water_percent
         st.metric("Body Water", f"{water_content:.1f}%", help="Estimated total body water percentage")
     
     # BMR breakdown
@@ -315,13 +348,16 @@ def display_body_composition_analysis(backend):
 
 # Helper Functions
 
-def calculate_ideal_weight(height_cm, gender):
-    """Calculate ideal weight using Devine formula"""
-    height_inches = height_cm / 2.54
-    if gender == "Male":
-        return 50 + 2.3 * (height_inches - 60)
-    else:
-        return 45.5 + 2.3 * (height_inches - 60)
+def session_health_profile():
+    """HealthProfile of the metrics currently entered on this page (memoized, so built once per input set)"""
+    return HealthProfile.from_metrics({
+        'weight_kg': st.session_state.weight_kg,
+        'height_cm': st.session_state.height_cm,
+        'age': st.session_state.age,
+        'gender': st.session_state.gender,
+        'activity_level': st.session_state.activity_level,
+        'fitness_goal': st.session_state.fitness_goal
+    })
 
 def get_bmi_category(bmi):
     """Get BMI category and color"""
@@ -423,27 +459,7 @@ def assess_basic_health_risks(bmi, body_fat, age):
 
 def calculate_health_score(bmi, body_fat, age):
     """Calculate a simple health score out of 100"""
-    score = 100
-    
-    # BMI penalty
-    if bmi < 18.5 or bmi >= 30:
-        score -= 30
-    elif bmi >= 25:
-        score -= 15
-    
-    # Body fat penalty (simplified)
-    if body_fat > 35:
-        score -= 25
-    elif body_fat > 25:
-        score -= 10
-    
-    # Age adjustment (slight penalty for older age)
-    if age > 50:
-        score -= 5
-    elif age > 65:
-        score -= 10
-    
-    return max(0, min(100, score))
+    return int(fitness_calcs.health_score(bmi, body_fat, age))
 
 def get_score_color(score):
     """Get color based on health score"""
@@ -468,26 +484,7 @@ def get_score_category(score):
 def estimate_muscle_mass(lean_mass, gender):
     """Estimate skeletal muscle mass from lean mass"""
     # Rough estimation: skeletal muscle is about 40-45% of lean mass
-    multiplier = 0.45 if gender == "Male" else 0.40
-    return lean_mass * multiplier
-
-def estimate_body_water(weight_kg, age, gender):
-    """Estimate total body water percentage"""
-    # Watson formula approximation
-    # Note: The original code used fixed heights (175, 160) which might not be accurate.
-    # For a more precise calculation, height_cm should be used here.
-    # Assuming height_cm is available from session state.
-    height_cm = st.session_state.get('height_cm', 175.0) # Fallback to default if not found
-
-    if gender == "Male":
-        tbw = 2.447 - (0.09156 * age) + (0.1074 * height_cm) + (0.3362 * weight_kg)
-    else:
-        tbw = -2.097 + (0.1069 * height_cm) + (0.2466 * weight_kg)
-    
-    # Ensure weight_kg is not zero to avoid division by zero
-    if weight_kg > 0:
-        return (tbw / weight_kg) * 100
-    return 0.0
+    return float(fitness_calcs.muscle_mass(lean_mass, gender))
 
 def create_bmi_bodyfat_comparison(bmi, body_fat, gender):
     """Create BMI vs Body Fat comparison chart"""
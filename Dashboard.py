@@ -1,8 +1,14 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
 import asyncio
+from async_runtime import run_async
+from page_helpers import write_ai_stream
 import plotly.graph_objects as go
+from rollups import daily_series, logged_days
+from log_summary import summarize_logs
+from health_profile import HealthProfile
+import counters
+import leaderboards
 
 def app():
     """
@@ -26,14 +32,16 @@ def app():
     # --- 2. Asynchronous Data Loading ---
     async def load_dashboard_data():
         profile_task = backend.get_user_profile(user_id, org_id)
-        logs_task = backend.get_daily_logs(org_id, user_id)
+        # One small rollup document replaces scanning the raw logs
+        rollup_task = backend.get_activity_rollup(org_id, user_id)
         notifications_task = backend.get_notifications(org_id, user_id)
         # Run database calls concurrently for speed
-        results = await asyncio.gather(profile_task, logs_task, notifications_task)
+        results = await asyncio.gather(profile_task, rollup_task, notifications_task)
         return results
 
     with st.spinner("Loading your dashboard data..."):
-        user_profile, daily_logs, notifications = asyncio.run(load_dashboard_data())
+        user_profile, rollup, notifications = run_async(load_dashboard_data())
+    has_activity = bool(rollup and rollup.get('weeks'))
 
     if not user_profile:
         st.error("Could not load your user profile. Please try again.")
@@ -53,7 +61,7 @@ def app():
                 # --- FIX: Only show the dismiss button if the nudge has an ID ---
                 if nudge_id:
                     if st.button("Dismiss", key=f"dismiss_{nudge_id}_{i}", use_container_width=True):
-                        success = asyncio.run(backend.mark_notification_as_read(org_id, user_id, nudge_id))
+                        success = run_async(backend.mark_notification_as_read(org_id, user_id, nudge_id))
                         if success:
                             st.rerun() # Refresh the page to make the notification disappear
                         else:
@@ -72,17 +80,14 @@ def app():
     default_weight = 70
     default_height = 175
 
-    current_weight_kg = metrics.get('weight_kg', 0)
-    current_height_cm = metrics.get('height_cm', 0)
-    current_age = metrics.get('age', 0)
-    current_gender = metrics.get('gender', 'Male')
+    health = HealthProfile.from_metrics(metrics)
 
     col1, col2, col3 = st.columns(3)
 
     if (
-        current_weight_kg == default_weight and
-        current_height_cm == default_height and
-        current_age == 30
+        health.weight_kg == default_weight and
+        health.height_cm == default_height and
+        health.age == 30
     ):
         # New user with default profile — show placeholders
         col1.metric("Weight", "—")
@@ -90,33 +95,23 @@ def app():
         col3.metric("BMR", "—")
         st.warning("Please update your body metrics to personalize your dashboard.")
     else:
-        col1.metric("Weight", f"{current_weight_kg} kg")
-        col2.metric("BMI", f"{backend.calculate_bmi(current_weight_kg, current_height_cm):.1f}")
-        col3.metric("BMR", f"{backend.calculate_bmr(current_weight_kg, current_height_cm, current_age, current_gender)} kcal")
+        col1.metric("Weight", f"{health.weight_kg:g} kg")
+        col2.metric("BMI", f"{health.bmi:.1f}")
+        col3.metric("BMR", f"{health.bmr} kcal")
 
 
     # --- 4. Weekly Activity Summary Chart ---
     st.subheader("Weekly Activity Summary")
-    if not daily_logs:
+    if not has_activity:
         st.info("Log some progress in the 'Progress Tracker' to see your weekly activity summary!")
     else:
-        df = pd.DataFrame(daily_logs)
-        if not df.empty:
-            df['date'] = pd.to_datetime(df['date'])
-            if df['date'].dt.tz is not None:
-                df['date'] = df['date'].dt.tz_localize(None)
-            df['date'] = df['date'].dt.date
-            
-            all_7_days = [(datetime.now().date() - timedelta(days=i)) for i in range(7)]
-            df_full_week = pd.DataFrame({'date': all_7_days})
-            
-            df_merged = df_full_week.merge(df, on='date', how='left').fillna(0)
-            df_merged = df_merged.sort_values('date')
-            df_merged['Day'] = pd.to_datetime(df_merged['date']).dt.strftime('%a')
+        df_week = pd.DataFrame(daily_series(rollup, days=7))
+        if not df_week.empty:
+            df_week['Day'] = pd.to_datetime(df_week['date']).dt.strftime('%a')
 
             fig = go.Figure()
-            fig.add_trace(go.Bar(x=df_merged['Day'], y=df_merged['calories_burned'], name='Calories Burned', marker_color='#3498db'))
-            fig.add_trace(go.Scatter(x=df_merged['Day'], y=df_merged['workout_duration_min'], name='Duration (min)', yaxis='y2', line=dict(color='#2ecc71', width=4)))
+            fig.add_trace(go.Bar(x=df_week['Day'], y=df_week['calories_burned'], name='Calories Burned', marker_color='#3498db'))
+            fig.add_trace(go.Scatter(x=df_week['Day'], y=df_week['workout_duration_min'], name='Duration (min)', yaxis='y2', line=dict(color='#2ecc71', width=4)))
             
             fig.update_layout(
                 yaxis=dict(title='Calories Burned'),
@@ -131,18 +126,38 @@ def app():
     # --- 5. AI Insights on Weekly Summary ---
     st.subheader("AI Insights on Your Performance")
     if st.button("Get AI Weekly Analysis"):
-        if not daily_logs:
+        if not has_activity:
             st.warning("Not enough data to analyze. Log some progress first!")
         else:
-            summary = pd.DataFrame(daily_logs).to_markdown(index=False)
-            system_prompt = f"Analyze this user's weekly fitness data and provide 2-3 concise, actionable insights. The user's goal is {user_profile.get('fitness_goal', 'not set')}. Data:\n{summary}"
+            summary = summarize_logs(logged_days(rollup))
+            system_prompt = f"Analyze this user's weekly fitness data and provide 2-3 concise, actionable insights. The user's goal is {metrics.get('fitness_goal', 'not set')}. Data:\n{summary}"
             user_prompt = "What are the key trends and what should I focus on next week?"
             
-            with st.spinner("Analyzing your performance..."):
-                response = asyncio.run(backend.get_ai_response(system_prompt, user_prompt))
-                st.markdown(response)
-
-    # --- 6. Quick Actions ---
+            write_ai_stream(backend, system_prompt, user_prompt, feature="weekly_analysis")
+
+    # --- 6. Leaderboards ---
+    st.subheader("🏆 Leaderboards")
+    st.caption("Members appear under anonymous names. Yours is marked.")
+    team_id = user_profile.get('team_id')
+    scopes = counters.scopes_for(team_id)
+    boards = run_async(backend.get_leaderboards(org_id, scopes))
+    me = leaderboards.member_key(org_id, user_id)
+    tabs = st.tabs(["Organization", "My Team"] if team_id else ["Organization"])
+    for tab, scope in zip(tabs, scopes):
+        with tab:
+            columns = st.columns(len(leaderboards.METRICS))
+            for column, (metric, title) in zip(columns, leaderboards.METRICS.items()):
+                column.markdown(f"**{title}**")
+                entries = leaderboards.top(boards.get(scope), metric)
+                if not entries:
+                    column.caption("No entries yet.")
+                    continue
+                column.dataframe([
+                    {'#': entry['rank'], 'member': entry['alias'] + (" (you)" if entry['member'] == me else ""), 'value': entry['value']}
+                    for entry in entries
+                ], use_container_width=True, hide_index=True)
+
+    # --- 7. Quick Actions ---
     st.subheader("Quick Actions")
     col1, col2, col3, col4 = st.columns(4)
     if col1.button("🏃‍♂️ Start Workout", use_container_width=True):
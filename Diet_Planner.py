@@ -1,51 +1,27 @@
 import streamlit as st
 import time
-import asyncio
+from async_runtime import run_async
+from page_helpers import current_health_profile, write_ai_stream, follow_plan_job, reuse_library_plan
+from plan_library import profile_inputs, meal_inputs, plan_key
+from health_profile import HealthProfile
 
 def app():
     backend = st.session_state.backend 
+    user_info = st.session_state.user_info
+
+    # Plans are stored in the user's account: restore the latest one in a new session
+    if 'last_generated_meal_plan' not in st.session_state:
+        latest_plan = run_async(backend.get_latest_plan(user_info['org_id'], user_info['uid'], "meal_plan"))
+        st.session_state.last_generated_meal_plan = latest_plan.get('content') if latest_plan else None
 
     st.header("🍎 AI-Powered Diet Planner")
     st.write("Leverage AI to create personalized meal plans based on your goals, dietary preferences, and allergies.")
 
-    # --- Retrieve User Metrics ---
-    weight_kg = st.session_state.get('weight_kg', 70.0)
-    height_cm = st.session_state.get('height_cm', 175.0)
-    age = st.session_state.get('age', 30)
-    gender = st.session_state.get('gender', "Male")
-    activity_level = st.session_state.get('activity_level', "Moderately Active")
-    fitness_goal = st.session_state.get('fitness_goal', "Maintain Fitness")
-
-    bmi = backend.calculate_bmi(weight_kg, height_cm)
-    bmr = backend.calculate_bmr(weight_kg, height_cm, age, gender)
-
-    def calculate_tdee_local(bmr_val, activity_lvl):
-        multipliers = {
-            "Sedentary": 1.2,
-            "Lightly Active": 1.375,
-            "Moderately Active": 1.55,
-            "Very Active": 1.725,
-            "Extremely Active": 1.9
-        }
-        return bmr_val * multipliers.get(activity_lvl, 1.55)
-
-    def calculate_protein_needs_local(weight_val, goal):
-        multipliers = {
-            "Lose Weight": 1.6,
-            "Gain Muscle": 2.2,
-            "Maintain Fitness": 1.2,
-            "Improve Endurance": 1.4,
-            "General Health": 1.0
-        }
-        if goal == "Maintain Weight":
-            goal_for_protein = "Maintain Fitness"
-        else:
-            goal_for_protein = goal
-
-        return weight_val * multipliers.get(goal_for_protein, 1.2)
-
-    tdee = calculate_tdee_local(bmr, activity_level)
-    protein_need = calculate_protein_needs_local(weight_kg, fitness_goal)
+    # --- User Metrics: the shared snapshot of the stored body metrics ---
+    health = current_health_profile(backend)
+    fitness_goal = health.fitness_goal
+    tdee = health.tdee
+    protein_need = health.protein_g
 
     if 'diet_goal' not in st.session_state:
         st.session_state.diet_goal = fitness_goal
@@ -98,39 +74,75 @@ def app():
     st.subheader("Generate Meal Plan with AI")
     prompt = st.text_area("Describe your needs:", height=150, key="diet_plan_ai_prompt")
 
-    if st.button("✨ Generate Meal Plan", key="generate_meal_plan_btn"):
+    gen_col, regen_col = st.columns([3, 1])
+    generate_clicked = gen_col.button("✨ Generate Meal Plan", key="generate_meal_plan_btn")
+    # Identical requests are answered from the AI response cache; Regenerate skips it
+    regenerate_clicked = regen_col.button("🔄 Regenerate", key="regenerate_meal_plan_btn", help="Ignore the saved answer and generate a fresh plan")
+    finished_plan = None  # (content, goals metadata) once a plan is ready on this run
+    if generate_clicked or regenerate_clicked:
         if not prompt:
             st.warning("Please provide a prompt.")
         else:
+            # Plans for the same inputs are shared across the org, so the prompt describes the
+            # user's bucketed stats (see plan_library.profile_inputs) rather than their exact ones
+            library_profile = profile_inputs(health.inputs())
+            library_inputs = meal_inputs(library_profile, st.session_state.diet_goal, st.session_state.daily_calorie_target,
+                                         st.session_state.diet_prefs, st.session_state.diet_allergies, prompt)
+            library_key = plan_key("meal_plan", library_inputs)
+            stats = HealthProfile.from_metrics(library_profile)
+
             system_prompt = f"""
             You are an AI meal planner. User details:
-            - Weight: {weight_kg}kg
-            - Height: {height_cm}cm
-            - Age: {age}
-            - Gender: {gender}
-            - Activity Level: {activity_level}
-            - Fitness Goal: {fitness_goal}
+            - Weight: about {stats.weight_kg:.0f}kg
+            - Height: about {stats.height_cm:.0f}cm
+            - Age: about {stats.age}
+            - Gender: {stats.gender}
+            - Activity Level: {stats.activity_level}
+            - Fitness Goal: {stats.fitness_goal}
             - Diet Goal: {st.session_state.diet_goal}
-            - BMR: {bmr:.0f} kcal
-            - TDEE: {tdee:.0f} kcal
-            - Calorie Target: {st.session_state.daily_calorie_target} kcal
-            - Protein Need: {protein_need:.0f}g
+            - BMR: about {stats.bmr:.0f} kcal
+            - TDEE: about {stats.tdee:.0f} kcal
+            - Calorie Target: {library_inputs['calorie_target']} kcal
+            - Protein Need: about {stats.protein_g:.0f}g
             - Preferences: {', '.join(st.session_state.diet_prefs) or 'None'}
             - Allergies: {st.session_state.diet_allergies or 'None'}
             """
 
-            with st.spinner("Generating meal plan..."):
-                result = asyncio.run(backend.get_ai_response(system_prompt, prompt))
-                if result:
-                    st.session_state.last_generated_meal_plan = result
-                    st.session_state.protein_goal = int(protein_need)
-                    remaining_cal = st.session_state.daily_calorie_target - (st.session_state.protein_goal * 4)
-                    st.session_state.fats_goal = int(remaining_cal * 0.3 / 9)
-                    st.session_state.carbs_goal = int(remaining_cal * 0.7 / 4)
-                    st.success("Meal plan generated and goals updated!")
-
-    if 'last_generated_meal_plan' in st.session_state:
+            plan_goals = {'protein_goal': int(protein_need), 'daily_calorie_target': st.session_state.daily_calorie_target}
+            # Regenerate always makes a new plan
+            library_plan = None if regenerate_clicked else reuse_library_plan(backend, "meal_plan", library_key, None)
+            if library_plan:
+                finished_plan = (library_plan, plan_goals)
+                st.session_state.meal_plan_from_library = True
+            else:
+                # Generated in the background and saved to the user's account; progress is shown below
+                job_id = run_async(backend.plan_jobs.submit(
+                    backend, user_info['org_id'], user_info['uid'], "meal_plan", system_prompt, prompt,
+                    use_cache=not regenerate_clicked,
+                    metadata=plan_goals | {'library_key': library_key, 'library_inputs': library_inputs},
+                ))
+                if job_id:
+                    st.session_state.meal_plan_job = job_id
+                else:
+                    st.error("The plan generator is busy right now. Please try again in a minute.")
+
+    finished_job = follow_plan_job(backend, "meal_plan_job")
+    if finished_job and finished_job['status'] == "done" and finished_job.get('content'):
+        finished_plan = (finished_job['content'], finished_job.get('metadata', {}))
+        st.session_state.meal_plan_from_library = False
+    if finished_plan:
+        content, metadata = finished_plan
+        st.session_state.last_generated_meal_plan = content
+        st.session_state.protein_goal = metadata.get('protein_goal', int(protein_need))
+        remaining_cal = metadata.get('daily_calorie_target', st.session_state.daily_calorie_target) - (st.session_state.protein_goal * 4)
+        st.session_state.fats_goal = int(remaining_cal * 0.3 / 9)
+        st.session_state.carbs_goal = int(remaining_cal * 0.7 / 4)
+        st.success("Meal plan generated and goals updated!")
+
+    if st.session_state.get('last_generated_meal_plan'):
         st.subheader("Your Generated Meal Plan")
+        if st.session_state.get('meal_plan_from_library'):
+            st.caption("📚 Previously generated for this profile. Press 🔄 Regenerate for a fresh plan.")
         st.markdown(st.session_state.last_generated_meal_plan)
 
     # --- Recipe Generator ---
@@ -143,7 +155,10 @@ def app():
         ingredients = st.text_area("List ingredients:", height=100)
         style = st.text_input("Preferred cuisine/style (optional):")
 
-        if st.button("✨ Generate Recipe"):
+        recipe_col, recipe_regen_col = st.columns([3, 1])
+        recipe_clicked = recipe_col.button("✨ Generate Recipe")
+        recipe_regen_clicked = recipe_regen_col.button("🔄 Regenerate", key="regenerate_recipe_btn")
+        if recipe_clicked or recipe_regen_clicked:
             if not ingredients:
                 st.warning("Please enter ingredients.")
             else:
@@ -156,16 +171,16 @@ def app():
                 - Preferences: {', '.join(st.session_state.diet_prefs) or 'None'}
                 - Allergies: {st.session_state.diet_allergies or 'None'}
                 """
-                with st.spinner("Creating recipe..."):
-                    recipe = asyncio.run(backend.get_ai_response(system_prompt, "Create a recipe"))
-                    if recipe:
-                        st.markdown(recipe)
+                write_ai_stream(backend, system_prompt, "Create a recipe", use_cache=not recipe_regen_clicked, feature="recipe")
 
     else:
         recipe_input = st.text_area("Enter recipe or ingredient:")
         goal = st.text_input("Swap goal (e.g. lower carbs):")
 
-        if st.button("✨ Suggest Swaps"):
+        swap_col, swap_regen_col = st.columns([3, 1])
+        swap_clicked = swap_col.button("✨ Suggest Swaps")
+        swap_regen_clicked = swap_regen_col.button("🔄 Regenerate", key="regenerate_swaps_btn")
+        if swap_clicked or swap_regen_clicked:
             if not recipe_input:
                 st.warning("Please enter something.")
             else:
@@ -175,8 +190,5 @@ def app():
                 Preferences: {', '.join(st.session_state.diet_prefs) or 'None'}
                 Allergies: {st.session_state.diet_allergies or 'None'}
                 """
-                with st.spinner("Finding swaps..."):
-                    swap_result = asyncio.run(backend.get_ai_response(system_prompt, "Suggest healthy swaps"))
-                    if swap_result:
-                        st.markdown(swap_result)
+                write_ai_stream(backend, system_prompt, "Suggest healthy swaps", use_cache=not swap_regen_clicked, feature="swaps")
 
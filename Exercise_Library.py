@@ -1,5 +1,5 @@
 import streamlit as st
-import asyncio # <--- IMPORTANT: Make sure this import is at the top of your app.py or wherever app() is defined
+from page_helpers import current_health_profile, write_ai_stream
 
 def app():
     backend = st.session_state.backend # Get the backend instance
@@ -91,12 +91,7 @@ def app():
     st.subheader("AI-Powered Exercise Finder")
 
     # Retrieve user metrics for AI context
-    weight_kg = st.session_state.get('weight_kg', 70.0)
-    height_cm = st.session_state.get('height_cm', 175.0)
-    age = st.session_state.get('age', 30)
-    gender = st.session_state.get('gender', "Male")
-    activity_level = st.session_state.get('activity_level', "Moderately Active")
-    fitness_goal_overall = st.session_state.get('fitness_goal', "Maintain Fitness")
+    health = current_health_profile(backend)
 
     # From Workout_Planner, if set, otherwise default
     fitness_level_from_planner = st.session_state.get('fitness_level', "Beginner")
@@ -114,7 +109,11 @@ def app():
     if 'ai_suggestions_output' not in st.session_state:
         st.session_state.ai_suggestions_output = ""
 
-    if st.button("Get AI Exercise Suggestions", key="ai_exercise_suggestions_btn"):
+    ask_col, regen_col = st.columns([3, 1])
+    ask_clicked = ask_col.button("Get AI Exercise Suggestions", key="ai_exercise_suggestions_btn")
+    # Identical requests are answered from the AI response cache; Regenerate skips it
+    regenerate_clicked = regen_col.button("🔄 Regenerate", key="regenerate_exercise_suggestions_btn")
+    if ask_clicked or regenerate_clicked:
         if ai_exercise_query:
             # --- Construct a comprehensive system prompt for the AI with ALL relevant data ---
             system_prompt_exercise = f"""
@@ -122,12 +121,12 @@ def app():
 
             User Profile:
             - Name: {st.session_state.get('user_name', 'User')}
-            - Current Weight: {weight_kg} kg
-            - Current Height: {height_cm} cm
-            - Age: {age} years
-            - Gender: {gender}
-            - Activity Level: {activity_level}
-            - Overall Fitness Goal: {fitness_goal_overall}
+            - Current Weight: {health.weight_kg} kg
+            - Current Height: {health.height_cm} cm
+            - Age: {health.age} years
+            - Gender: {health.gender}
+            - Activity Level: {health.activity_level}
+            - Overall Fitness Goal: {health.fitness_goal}
             - Stated Fitness Level (from Workout Planner): {fitness_level_from_planner}
             - Primary Workout Goal (from Workout Planner): {workout_goal_from_planner}
             - Available Equipment (from Workout Planner): {', '.join(available_equipment_from_planner) if available_equipment_from_planner else 'None'}
@@ -144,11 +143,11 @@ def app():
             Format your response clearly using bullet points or a numbered list.
             Ensure safety and effectiveness are prioritized based on their fitness level and available equipment.
             """
-            with st.spinner("Finding personalized exercise suggestions..."):
-                # Use asyncio.run to execute the async method
-                st.session_state.ai_suggestions_output = asyncio.run(
-                    backend.get_ai_response(system_prompt_exercise, ai_exercise_query)
-                )
+            # Stream the suggestions as they are written; the stored copy is rendered after the rerun
+            st.session_state.ai_suggestions_output = write_ai_stream(
+                backend, system_prompt_exercise, ai_exercise_query, transient=True, use_cache=not regenerate_clicked,
+                feature="exercise_suggestions",
+            )
             # Rerun the app to display the updated session state
             st.rerun()
         else:
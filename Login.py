@@ -1,5 +1,5 @@
 import streamlit as st
-import asyncio
+from async_runtime import run_async
 
 def app():
     st.header("🔐 Welcome to the Enterprise Wellness Agent")
@@ -12,7 +12,7 @@ def app():
 
     # --- Load Organizations for the dropdown ---
     if 'organizations' not in st.session_state:
-        st.session_state.organizations = asyncio.run(backend.get_all_organizations())
+        st.session_state.organizations = run_async(backend.get_all_organizations())
     
     organizations = st.session_state.get('organizations', [])
     if not organizations:
@@ -34,11 +34,11 @@ def app():
                 org_id = org_map[selected_org_name]
                 with st.spinner("Checking your credentials..."):
                     # Check if user exists in Firebase Auth
-                    user = asyncio.run(backend.get_user_by_email(email))
+                    user = run_async(backend.get_user_by_email(email))
                     
                     if user:
                         # User exists, log them in and get their profile
-                        profile = asyncio.run(backend.get_user_profile(user.uid, org_id))
+                        profile = run_async(backend.get_user_profile(user.uid, org_id))
                         if profile:
                             is_admin = profile.get('is_admin', False)
                             st.success(f"Welcome back, {user.display_name}!")
@@ -57,7 +57,7 @@ def app():
                             org_users_ref = backend.db.collection('organizations').document(org_id).collection('users')
                             is_first_user = not org_users_ref.limit(1).get()
 
-                            uid, is_admin = asyncio.run(backend.create_user_in_auth_and_firestore(org_id, name, email, is_admin=is_first_user))
+                            uid, is_admin = run_async(backend.create_user_in_auth_and_firestore(org_id, name, email, is_admin=is_first_user))
                             
                             if uid:
                                 st.success("Account created successfully! Logging you in.")
@@ -2,7 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import plotly.express as px
-import asyncio
+from async_runtime import run_async
+from page_helpers import write_ai_stream
+from log_summary import summarize_logs
 # import pandas as pd # This import is duplicated, removed in final output
 
 def app():
@@ -23,22 +25,19 @@ def app():
     user_id = user_info['uid']
     org_id = user_info['org_id']
 
-    # --- 2. Load Data from Firestore ---
-    # Use a unique key for the dataframe to prevent conflicts
-    if 'progress_data_df' not in st.session_state:
-        with st.spinner("Loading your progress history..."):
-            logs = asyncio.run(backend.get_daily_logs(org_id, user_id))
-            if logs:
-                st.session_state.progress_data_df = pd.DataFrame(logs)
-                # Ensure date column is in datetime format for charting
-                # Localize to None to handle potential timezone issues from Firestore Timestamps
-                st.session_state.progress_data_df['date'] = pd.to_datetime(st.session_state.progress_data_df['date']).dt.tz_localize(None)
-                # Sort by date for proper time-series plotting
-                st.session_state.progress_data_df = st.session_state.progress_data_df.sort_values('date').reset_index(drop=True)
-            else:
-                st.session_state.progress_data_df = pd.DataFrame(columns=['date', 'weight_kg', 'bmi', 'body_fat_percent', 'workout_duration_min', 'calories_burned'])
-
-    progress_df = st.session_state.progress_data_df
+    # --- 2. Load Data from the shared log cache ---
+    # Read on every rerun: the backend cache serves it from memory and reflects writes from any page
+    with st.spinner("Loading your progress history..."):
+        logs = run_async(backend.get_daily_logs(org_id, user_id))
+    if logs:
+        progress_df = pd.DataFrame(logs)
+        # Ensure date column is in datetime format for charting
+        # Localize to None to handle potential timezone issues from Firestore Timestamps
+        progress_df['date'] = pd.to_datetime(progress_df['date']).dt.tz_localize(None)
+        # Sort by date for proper time-series plotting
+        progress_df = progress_df.sort_values('date').reset_index(drop=True)
+    else:
+        progress_df = pd.DataFrame(columns=['date', 'weight_kg', 'bmi', 'body_fat_percent', 'workout_duration_min', 'calories_burned'])
 
     # --- 3. Log New Entry Form ---
     st.subheader("Log New Entry")
@@ -60,7 +59,7 @@ def app():
             st.error("Weight must be a positive value to calculate metrics.")
         else:
             with st.spinner("Saving your entry..."):
-                profile = asyncio.run(backend.get_user_profile(user_id, org_id))
+                profile = run_async(backend.get_user_profile(user_id, org_id))
                 if profile:
                     metrics = profile.get('body_metrics', {})
                     height = metrics.get('height_cm', 175.0)
@@ -84,15 +83,11 @@ def app():
                         'calories_burned': entry_calories_burned
                     }
                     
-                    success = asyncio.run(backend.save_daily_log(user_id, org_id, new_log))
+                    success = run_async(backend.save_daily_log(user_id, org_id, new_log))
 
                     if success:
                         st.success("Entry saved!")
-                        # Manually update the dataframe in session state for instant UI refresh
-                        new_log_df = pd.DataFrame([new_log])
-                        # Use concat and sort to add new data and maintain order
-                        st.session_state.progress_data_df = pd.concat([st.session_state.progress_data_df, new_log_df], ignore_index=True)
-                        st.session_state.progress_data_df = st.session_state.progress_data_df.sort_values('date').reset_index(drop=True)
+                        # save_daily_log wrote through to the shared cache, so a rerun shows the new entry
                         st.rerun() # Rerun to update charts and table
                     else:
                         st.error("Failed to save entry.")
@@ -135,8 +130,8 @@ def app():
         if progress_df.empty:
             st.warning("No progress data to analyze.")
         else:
-            summary = progress_df.to_markdown(index=False)
-            profile = asyncio.run(backend.get_user_profile(user_id, org_id))
+            summary = summarize_logs(progress_df.to_dict('records'))
+            profile = run_async(backend.get_user_profile(user_id, org_id))
             
             # Get current body metrics for more precise AI analysis
             current_metrics = profile.get('body_metrics', {})
@@ -154,11 +149,9 @@ User's current body metrics:
 - Age: {current_age} years
 - Gender: {current_gender}
 
-The user's fitness goal is {profile.get('fitness_goal', 'not set')}.
+The user's fitness goal is {current_metrics.get('fitness_goal', 'not set')}.
 Analyze the data to identify trends, strengths, and areas for improvement. Provide actionable advice. Be encouraging and insightful.
 If there's very little data, mention that more data is needed for a comprehensive analysis."""
             user_prompt = "Analyze my progress and give me some advice."
             
-            with st.spinner("Analyzing your progress..."):
-                response = asyncio.run(backend.get_ai_response(system_prompt, user_prompt))
-                st.markdown(response)
\ No newline at end of file
+            write_ai_stream(backend, system_prompt, user_prompt, feature="progress_analysis")
\ No newline at end of file
@@ -1,32 +1,34 @@
 import streamlit as st
-import asyncio
+from async_runtime import run_async
+from page_helpers import current_health_profile, follow_plan_job, reuse_library_plan
+from plan_library import profile_inputs, workout_inputs, plan_key
+from health_profile import HealthProfile
 
 # No need for Lottie helper functions if not used.
 
+# Body_Metrics fitness goals that name a workout goal differently
+BODY_METRICS_GOALS = {"Lose Weight": "Weight Loss", "Gain Muscle": "Muscle Gain", "Improve Endurance": "Endurance"}
+
 def app():
     backend = st.session_state.backend # Get the backend instance
+    user_info = st.session_state.user_info
+
+    # Plans are stored in the user's account: restore the latest one in a new session
+    if 'last_generated_workout_plan' not in st.session_state:
+        latest_plan = run_async(backend.get_latest_plan(user_info['org_id'], user_info['uid'], "workout_plan"))
+        st.session_state.last_generated_workout_plan = latest_plan.get('content') if latest_plan else None
 
     st.header("🗓️ AI-Powered Workout Planner")
     st.write("Generate custom workout plans tailored to your fitness level, goals, and available equipment.")
 
     st.subheader("Your Workout Preferences")
 
-    # Retrieve user name from session state
-    user_name = st.session_state.get('user_name', 'Fitness Enthusiast')
+    # The signed-in user's name: only addressed on the page, never sent in the (shareable) plan prompt
+    user_name = user_info.get('name') or 'Fitness Enthusiast'
 
-    # --- Retrieve User Metrics from Body_Metrics via Session State ---
-    # These values should be set and updated by the Body_Metrics.py page
-    weight_kg = st.session_state.get('weight_kg', 70.0)
-    height_cm = st.session_state.get('height_cm', 175.0)
-    age = st.session_state.get('age', 30)
-    gender = st.session_state.get('gender', "Male")
-    activity_level = st.session_state.get('activity_level', "Moderately Active")
-    fitness_goal_overall = st.session_state.get('fitness_goal', "Maintain Fitness") # Renamed to avoid clash with workout_goal
-
-    # Calculated metrics from Body_Metrics (or recalculated here if needed, but safer to assume Body_Metrics sets them)
-    bmi = st.session_state.get('bmi', backend.calculate_bmi(weight_kg, height_cm))
-    bmr = st.session_state.get('bmr', backend.calculate_bmr(weight_kg, height_cm, age, gender))
-    tdee = st.session_state.get('tdee', bmr * 1.55) # Placeholder if TDEE isn't consistently passed
+    # --- User Metrics: the shared snapshot of the stored body metrics ---
+    health = current_health_profile(backend)
+    fitness_goal_overall = health.fitness_goal # Named to avoid clash with workout_goal
 
     col1, col2 = st.columns(2)
     fitness_level = col1.selectbox("Your Current Fitness Level", 
@@ -37,6 +39,8 @@ def app():
     workout_goal_options = ["Strength", "Endurance", "Weight Loss", "Muscle Gain", "Flexibility & Mobility"]
     if fitness_goal_overall in workout_goal_options:
         default_workout_goal_index = workout_goal_options.index(fitness_goal_overall)
+    elif fitness_goal_overall in BODY_METRICS_GOALS: # Goal names used by Body_Metrics
+        default_workout_goal_index = workout_goal_options.index(BODY_METRICS_GOALS[fitness_goal_overall])
     elif fitness_goal_overall == "Maintain Fitness": # Specific mapping
         default_workout_goal_index = workout_goal_options.index("Endurance") # or "Strength", depends on interpretation
     elif fitness_goal_overall == "General Health":
@@ -68,26 +72,36 @@ def app():
         key="ai_workout_prompt_text_area" # Unique key
     )
 
-    if st.button("✨ Generate Workout Plan", key="generate_workout_plan_btn"):
+    gen_col, regen_col = st.columns([3, 1])
+    generate_clicked = gen_col.button("✨ Generate Workout Plan", key="generate_workout_plan_btn")
+    # Identical requests are answered from the AI response cache; Regenerate skips it
+    regenerate_clicked = regen_col.button("🔄 Regenerate", key="regenerate_workout_plan_btn", help="Ignore the saved answer and generate a fresh plan")
+    if generate_clicked or regenerate_clicked:
         if not ai_workout_prompt:
             st.warning("Please provide a prompt for your workout plan.")
         else:
+            # Plans for the same inputs are shared across the org, so the prompt describes the
+            # user's bucketed stats (see plan_library.profile_inputs) rather than their exact ones
+            library_profile = profile_inputs(health.inputs())
+            library_inputs = workout_inputs(library_profile, fitness_level, workout_goal, available_equipment, workout_duration, days_per_week, ai_workout_prompt)
+            library_key = plan_key("workout_plan", library_inputs)
+            stats = HealthProfile.from_metrics(library_profile)
+
             # --- Construct a comprehensive system prompt for the AI with ALL relevant data ---
             system_prompt_workout = f"""
             You are an AI personal trainer specializing in creating workout plans.
             Generate a detailed workout plan based on the user's complete profile and specific request.
 
             User Profile:
-            - Name: {user_name}
-            - Current Weight: {weight_kg} kg
-            - Current Height: {height_cm} cm
-            - Age: {age} years
-            - Gender: {gender}
-            - Activity Level: {activity_level}
-            - Overall Fitness Goal: {fitness_goal_overall}
-            - Current BMI: {bmi:.1f}
-            - Current BMR: {bmr:.0f} calories/day
-            - Current TDEE: {tdee:.0f} calories/day
+            - Current Weight: about {stats.weight_kg:.0f} kg
+            - Current Height: about {stats.height_cm:.0f} cm
+            - Age: about {stats.age} years
+            - Gender: {stats.gender}
+            - Activity Level: {stats.activity_level}
+            - Overall Fitness Goal: {stats.fitness_goal}
+            - Current BMI: about {stats.bmi:.1f}
+            - Current BMR: about {stats.bmr:.0f} calories/day
+            - Current TDEE: about {stats.tdee:.0f} calories/day
             - User's Stated Fitness Level: {fitness_level}
             - Primary Workout Goal: {workout_goal}
             - Available Equipment: {', '.join(available_equipment) if available_equipment else 'None'}
@@ -109,21 +123,40 @@ def app():
             Provide a realistic, actionable, and safe plan. If the user asks for a specific workout split (e.g., 3-day full body, 4-day upper/lower), adhere to that.
             """
             
-            with st.spinner("Generating your personalized workout plan..."):
-                generated_plan = asyncio.run(backend.get_ai_response(system_prompt_workout, ai_workout_prompt))
-                # generated_plan = backend.get_ai_response(system_prompt_workout, ai_workout_prompt)
-                
-                if generated_plan:
-                    st.session_state.last_generated_workout_plan = generated_plan
-                    # Store a summary for Dashboard to display
-                    st.session_state.generated_workout_plan_summary = \
-                        f"{days_per_week} days/week, {workout_duration} min/session. Goal: {workout_goal}." \
-                        f" Equipment: {', '.join(available_equipment) if available_equipment else 'None'}."
-                    st.success("Workout plan generated successfully!")
+            # Summary for the Dashboard, applied once the plan is ready
+            plan_summary = f"{days_per_week} days/week, {workout_duration} min/session. Goal: {workout_goal}." \
+                           f" Equipment: {', '.join(available_equipment) if available_equipment else 'None'}."
+            # Regenerate always makes a new plan
+            library_plan = None if regenerate_clicked else reuse_library_plan(backend, "workout_plan", library_key, user_info.get('name'))
+            if library_plan:
+                st.session_state.last_generated_workout_plan = library_plan
+                st.session_state.generated_workout_plan_summary = plan_summary
+                st.session_state.workout_plan_from_library = True
+            else:
+                # Generated in the background and saved to the user's account; progress is shown below
+                job_id = run_async(backend.plan_jobs.submit(
+                    backend, user_info['org_id'], user_info['uid'], "workout_plan", system_prompt_workout, ai_workout_prompt,
+                    use_cache=not regenerate_clicked,
+                    metadata={'summary': plan_summary, 'library_key': library_key, 'library_inputs': library_inputs, 'user_name': user_info.get('name')},
+                ))
+                if job_id:
+                    st.session_state.workout_plan_job = job_id
+                else:
+                    st.error("The plan generator is busy right now. Please try again in a minute.")
+
+    finished_job = follow_plan_job(backend, "workout_plan_job")
+    if finished_job and finished_job['status'] == "done" and finished_job.get('content'):
+        st.session_state.last_generated_workout_plan = finished_job['content']
+        # Store a summary for Dashboard to display
+        st.session_state.generated_workout_plan_summary = finished_job.get('metadata', {}).get('summary')
+        st.session_state.workout_plan_from_library = False
+        st.success("Workout plan generated successfully!")
 
     # Display the last generated workout plan
     if 'last_generated_workout_plan' in st.session_state and st.session_state.last_generated_workout_plan:
         st.subheader("Your Generated Workout Plan")
+        if st.session_state.get('workout_plan_from_library'):
+            st.caption("📚 Previously generated for this profile. Press 🔄 Regenerate for a fresh plan.")
         st.markdown(st.session_state.last_generated_workout_plan)
     else:
         st.info("Your personalized workout plan will appear here once generated.")
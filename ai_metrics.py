@@ -0,0 +1,204 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+class AICallSpan:
+    """Timing and usage of one AI call, filled in by Backend.stream_ai_response."""
+    def __init__(self, feature: str, model: str, priority: str, tenant: str | None):
+        self.feature = feature
+        self.model = model
+        self.priority = priority
+        self.tenant = tenant
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.ttft_seconds = None
+        self.latency_seconds = None
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.cached = False
+        self.outcome = "ok"
+        self.error = None
+
+    def mark_first_token(self):
+        if self.ttft_seconds is None:
+            self.ttft_seconds = time.monotonic() - self._start
+
+    def fail(self, error: BaseException):
+        self.outcome = "error"
+        self.error = f"{type(error).__name__}: {error}"[:300]
+
+    def finish(self):
+        self.latency_seconds = time.monotonic() - self._start
+        if self.cached and self.outcome == "ok":
+            self.outcome = "cache_hit"
+
+    def as_dict(self) -> dict:
+        return {
+            'ts': self.started_at, 'feature': self.feature, 'model': self.model, 'priority': self.priority,
+            'tenant': self.tenant, 'outcome': self.outcome, 'ttft_s': self.ttft_seconds,
+            'latency_s': self.latency_seconds, 'tokens_in': self.tokens_in, 'tokens_out': self.tokens_out,
+            'error': self.error,
+        }
+
+class AIMetrics:
+    """
+    In-process metrics for AI calls. Every finished span updates cumulative counters and
+    latency histograms per (feature, model, outcome), and a bounded window of recent
+    (time, ttft, latency) samples per (feature, model) for p50/p95. Spans are appended to a JSONL file and a
+    Prometheus text snapshot is rewritten every `flush_every` spans (or `flush_seconds`).
+    """
+    def __init__(self, jsonl_path: str | None = None, prometheus_path: str | None = None, window: int = 500,
+                 flush_every: int = 20, flush_seconds: float = 30.0):
+        self.jsonl_path = jsonl_path
+        self.prometheus_path = prometheus_path
+        self.window = window
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._calls = defaultdict(int)              # (feature, model, outcome) -> count
+        self._tokens = defaultdict(lambda: [0, 0])  # (feature, model) -> [in, out]
+        self._histograms = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self._latency_sums = defaultdict(float)
+        self._recent = defaultdict(lambda: deque(maxlen=window))  # (feature, model) -> (time, ttft, latency)
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def start(self, feature: str, model: str, priority: str = "interactive", tenant: str | None = None) -> AICallSpan:
+        return AICallSpan(feature, model, priority, tenant)
+
+    def record(self, span: AICallSpan):
+        span.finish()
+        with self._lock:
+            self._calls[(span.feature, span.model, span.outcome)] += 1
+            tokens = self._tokens[(span.feature, span.model)]
+            tokens[0] += span.tokens_in
+            tokens[1] += span.tokens_out
+            # Cache hits and failures would skew the model latency figures
+            if span.outcome == "ok":
+                key = (span.feature, span.model)
+                self._histograms[key][self._bucket_index(span.latency_seconds)] += 1
+                self._latency_sums[key] += span.latency_seconds
+                self._recent[key].append((time.monotonic(), span.ttft_seconds, span.latency_seconds))
+            self._pending.append(span.as_dict())
+            due = len(self._pending) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Appends pending spans to the JSONL file and rewrites the Prometheus snapshot."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.monotonic()
+            text = self._prometheus_text()
+        try:
+            if self.jsonl_path and pending:
+                self._ensure_dir(self.jsonl_path)
+                with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(row) + "\n" for row in pending)
+            if self.prometheus_path:
+                self._ensure_dir(self.prometheus_path)
+                tmp_path = self.prometheus_path + ".tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, self.prometheus_path)
+        except OSError as e:
+            logger.error("Error exporting AI metrics: %s", e)
+
+    def summary(self) -> list:
+        """One row per feature: call counts and p50/p95 of time to first token and total latency."""
+        with self._lock:
+            calls = defaultdict(lambda: defaultdict(int))
+            for (feature, _, outcome), count in self._calls.items():
+                calls[feature][outcome] += count
+            tokens = defaultdict(lambda: [0, 0])
+            for (feature, _), (tokens_in, tokens_out) in self._tokens.items():
+                tokens[feature][0] += tokens_in
+                tokens[feature][1] += tokens_out
+            recent = defaultdict(lambda: {'ttft': [], 'latency': []})
+            for (feature, _), samples in self._recent.items():
+                for _, ttft, latency in samples:
+                    if ttft is not None:
+                        recent[feature]['ttft'].append(ttft)
+                    recent[feature]['latency'].append(latency)
+        rows = []
+        for feature in sorted(calls):
+            outcomes = calls[feature]
+            total = sum(outcomes.values())
+            series = recent[feature]
+            rows.append({
+                'feature': feature,
+                'calls': total,
+                'errors': outcomes.get('error', 0),
+                'cache_hits': outcomes.get('cache_hit', 0),
+                'ttft_p50_s': _percentile(series['ttft'], 50),
+                'ttft_p95_s': _percentile(series['ttft'], 95),
+                'latency_p50_s': _percentile(series['latency'], 50),
+                'latency_p95_s': _percentile(series['latency'], 95),
+                'avg_tokens_in': round(tokens[feature][0] / total) if total else 0,
+                'avg_tokens_out': round(tokens[feature][1] / total) if total else 0,
+            })
+        return rows
+
+    def percentile(self, feature: str, model: str, metric: str = 'latency', q: float = 95,
+                   since: float | None = None) -> tuple[float | None, int]:
+        """
+        Recent p`q` of 'latency' or 'ttft' for one feature on one model, optionally only over
+        samples taken after the time.monotonic() value `since`. Returns (value, sample count).
+        """
+        index = 1 if metric == 'ttft' else 2
+        with self._lock:
+            samples = list(self._recent.get((feature, model), ()))
+        values = [sample[index] for sample in samples if sample[index] is not None and (since is None or sample[0] >= since)]
+        return _percentile(values, q), len(values)
+
+    def _prometheus_text(self) -> str:
+        lines = [
+            "# HELP ai_calls_total AI calls by feature, model and outcome.",
+            "# TYPE ai_calls_total counter",
+        ]
+        for (feature, model, outcome), count in sorted(self._calls.items()):
+            lines.append(f'ai_calls_total{{feature="{feature}",model="{model}",outcome="{outcome}"}} {count}')
+        lines += ["# HELP ai_tokens_total Prompt and completion tokens.", "# TYPE ai_tokens_total counter"]
+        for (feature, model), (tokens_in, tokens_out) in sorted(self._tokens.items()):
+            lines.append(f'ai_tokens_total{{feature="{feature}",model="{model}",direction="in"}} {tokens_in}')
+            lines.append(f'ai_tokens_total{{feature="{feature}",model="{model}",direction="out"}} {tokens_out}')
+        lines += ["# HELP ai_latency_seconds Latency of successful uncached AI calls.", "# TYPE ai_latency_seconds histogram"]
+        for (feature, model), counts in sorted(self._histograms.items()):
+            labels = f'feature="{feature}",model="{model}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'ai_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'ai_latency_seconds_sum{{{labels}}} {self._latency_sums[(feature, model)]:.3f}')
+            lines.append(f'ai_latency_seconds_count{{{labels}}} {cumulative}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _bucket_index(seconds: float) -> int:
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                return i
+        return len(LATENCY_BUCKETS)
+
+    @staticmethod
+    def _ensure_dir(path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+def _percentile(values: list, q: float) -> float | None:
+    """Nearest-rank percentile, rounded to milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(q / 100 * len(ordered))))
+    return round(ordered[rank - 1], 3)
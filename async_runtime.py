@@ -0,0 +1,93 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+# Messages (level, text) raised by backend coroutines while serving one run_async call.
+# The background loop thread has no Streamlit script context, so they are replayed
+# on the calling page once the coroutine finishes.
+_ui_messages = contextvars.ContextVar("ui_messages", default=None)
+
+# --- One long-lived event loop per server process ---
+@st.cache_resource
+def get_background_loop():
+    """Starts (once) and returns the event loop that all pages submit backend coroutines to."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="backend-event-loop", daemon=True)
+    thread.start()
+    return loop
+
+def run_async(coro, timeout=None):
+    """
+    Runs a coroutine on the shared background loop and blocks until it returns.
+    This is the sync bridge pages use instead of asyncio.run().
+    """
+    loop = get_background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_async() cannot be called from the background loop itself; await the coroutine instead.")
+
+    messages = []
+
+    async def _runner():
+        _ui_messages.set(messages)
+        return await coro
+
+    future = asyncio.run_coroutine_threadsafe(_runner(), loop)
+    try:
+        return future.result(timeout)
+    finally:
+        for level, text in messages:
+            getattr(st, level)(text)
+
+def iterate_async(agen, timeout=None):
+    """
+    Sync generator over an async generator that runs on the shared background loop,
+    e.g. to feed st.write_stream. Messages raised along the way are shown at the end.
+    """
+    loop = get_background_loop()
+    messages = []
+    finished = False
+    done = object()
+
+    async def _next():
+        _ui_messages.set(messages)
+        try:
+            return await agen.__anext__()
+        except StopAsyncIteration:
+            return done
+
+    try:
+        while True:
+            item = asyncio.run_coroutine_threadsafe(_next(), loop).result(timeout)
+            if item is done:
+                finished = True
+                return
+            yield item
+    finally:
+        if not finished:
+            # The consumer stopped early (or failed): let the generator clean up its stream
+            asyncio.run_coroutine_threadsafe(agen.aclose(), loop)
+        for level, text in messages:
+            getattr(st, level)(text)
+
+def notify_ui(level: str, message: str):
+    """
+    Shows an st.<level> message from backend code. Inside run_async the message is
+    queued for the calling page; anywhere else (script thread, the agent) it is shown
+    or logged directly.
+    """
+    sink = _ui_messages.get()
+    if sink is not None:
+        sink.append((level, message))
+        return
+    if level == "error":
+        logger.error(message)
+    getattr(st, level)(message)
@@ -4,12 +4,54 @@ from dotenv import load_dotenv
 from groq import AsyncGroq
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import asyncio
+from async_runtime import notify_ui
+from caching import DailyLogCache, TTLCache
+from llm_cache import LLMResponseCache
+from groq_scheduler import GroqScheduler
+from ai_metrics import AIMetrics
+from model_routing import ModelRouter
+from plan_jobs import PlanJobQueue
+from cohort_analytics import CohortAnalytics
+import fitness_calcs
+from health_profile import HealthProfile
+from rollups import apply_log_to_rollup, build_rollup, activity_markers, week_key
+import counters
+import leaderboards
 
 # Load local .env environment variables for local development
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Alternative API endpoint, e.g. the local fake_groq_server.py for offline load tests
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+# Max number of blocking Firestore / Firebase Auth calls in flight at once
+FIRESTORE_IO_WORKERS = int(os.getenv("FIRESTORE_IO_WORKERS", "16"))
+# Process-wide daily-log cache: entry lifetime and max number of users kept
+DAILY_LOG_CACHE_TTL_SECONDS = float(os.getenv("DAILY_LOG_CACHE_TTL_SECONDS", "300"))
+DAILY_LOG_CACHE_MAX_USERS = int(os.getenv("DAILY_LOG_CACHE_MAX_USERS", "1000"))
+# Process-wide cache of users' HealthProfile snapshots
+HEALTH_PROFILE_CACHE_TTL_SECONDS = float(os.getenv("HEALTH_PROFILE_CACHE_TTL_SECONDS", "900"))
+HEALTH_PROFILE_CACHE_MAX_USERS = int(os.getenv("HEALTH_PROFILE_CACHE_MAX_USERS", "5000"))
+# AI response cache: SQLite file, entry lifetime and size caps of the memory and disk tiers
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_DISK_ENTRIES = int(os.getenv("LLM_CACHE_MAX_DISK_ENTRIES", "5000"))
+# Groq account limits enforced by the shared request scheduler
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", "30000"))
+# AI call metrics: per-call JSONL log and Prometheus text snapshot
+AI_METRICS_JSONL_PATH = os.getenv("AI_METRICS_JSONL_PATH", os.path.join(".cache", "ai_calls.jsonl"))
+AI_METRICS_PROMETHEUS_PATH = os.getenv("AI_METRICS_PROMETHEUS_PATH", os.path.join(".cache", "ai_metrics.prom"))
+# Background plan generation: concurrent jobs and max queued jobs per process
+PLAN_JOB_WORKERS = int(os.getenv("PLAN_JOB_WORKERS", "4"))
+PLAN_JOB_MAX_PENDING = int(os.getenv("PLAN_JOB_MAX_PENDING", "100"))
+# Admin Panel population health: frame lifetime per org and how many days of logs it covers
+COHORT_CACHE_TTL_SECONDS = float(os.getenv("COHORT_CACHE_TTL_SECONDS", "600"))
+COHORT_WINDOW_DAYS = int(os.getenv("COHORT_WINDOW_DAYS", "28"))
 
 # --- Cached Firestore client loader (runs once per session) ---
 @st.cache_resource
@@ -28,6 +70,69 @@ def get_firestore_client():
         st.error(f"Failed to initialize Firebase: {e}")
         return None, None
 
+# --- Shared thread pool for blocking Firebase I/O (one per process) ---
+@st.cache_resource
+def get_io_executor():
+    """Returns the thread pool that runs the synchronous Firestore and Auth SDK calls."""
+    return ThreadPoolExecutor(max_workers=FIRESTORE_IO_WORKERS, thread_name_prefix="firestore-io")
+
+# --- Daily-log cache shared by all sessions (one per process) ---
+@st.cache_resource
+def get_daily_log_cache():
+    """Returns the read-through / write-through cache of users' daily logs."""
+    return DailyLogCache(DAILY_LOG_CACHE_MAX_USERS, DAILY_LOG_CACHE_TTL_SECONDS)
+
+# --- HealthProfile snapshots shared by all sessions (one per process) ---
+@st.cache_resource
+def get_health_profile_cache():
+    """Returns the (org_id, uid) -> HealthProfile cache the pages read their metrics from."""
+    return TTLCache(HEALTH_PROFILE_CACHE_MAX_USERS, HEALTH_PROFILE_CACHE_TTL_SECONDS)
+
+# --- AI response cache (one per process, backed by a local SQLite file) ---
+@st.cache_resource
+def get_llm_cache():
+    """Returns the memory + SQLite cache of AI responses."""
+    return LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_MAX_DISK_ENTRIES, LLM_CACHE_TTL_SECONDS)
+
+# --- Shared Groq client (one per process, so its HTTP connections are reused) ---
+@st.cache_resource
+def get_groq_client():
+    """Returns the AsyncGroq client, or None when no API key is configured."""
+    if not GROQ_API_KEY:
+        return None
+    # Retries (including 429 backoff) are owned by the scheduler, not the SDK
+    return AsyncGroq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, max_retries=0)
+
+# --- Shared Groq request scheduler (one per process) ---
+@st.cache_resource
+def get_groq_scheduler():
+    """Returns the rate-limit-aware, priority and per-org fair scheduler in front of Groq."""
+    return GroqScheduler(GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE)
+
+# --- AI call instrumentation (one per process) ---
+@st.cache_resource
+def get_ai_metrics():
+    """Returns the latency / token / error metrics shared by every AI call in the process."""
+    return AIMetrics(AI_METRICS_JSONL_PATH, AI_METRICS_PROMETHEUS_PATH)
+
+# --- Per-feature model routing (one per process, fed by the AI metrics) ---
+@st.cache_resource
+def get_model_router():
+    """Returns the router that picks model, max_tokens and temperature per feature."""
+    return ModelRouter(get_ai_metrics())
+
+# --- Background plan generation queue (one per process, runs on the shared loop) ---
+@st.cache_resource
+def get_plan_job_queue():
+    """Returns the queue that generates workout and meal plans in the background."""
+    return PlanJobQueue(PLAN_JOB_WORKERS, PLAN_JOB_MAX_PENDING)
+
+# --- Org population-health frames (one cache per process) ---
+@st.cache_resource
+def get_cohort_analytics():
+    """Returns the engine that builds and caches each org's per-user analytics frame."""
+    return CohortAnalytics(COHORT_CACHE_TTL_SECONDS, window_days=COHORT_WINDOW_DAYS)
+
 class Backend:
     """
     Manages all backend logic: Firebase, Groq AI, and fitness calculations.
@@ -40,36 +145,131 @@ class Backend:
 
             if not GROQ_API_KEY:
                 st.error("GROQ_API_KEY not found.")
-                st.session_state.groq_client = None
-            else:
-                st.session_state.groq_client = AsyncGroq(api_key=GROQ_API_KEY)
             
             st.session_state.backend_initialized = True
         
         self.db = st.session_state.db
         self.auth = st.session_state.auth
-        self.groq_client = st.session_state.groq_client
+        self.groq_client = get_groq_client()
+        self.groq_scheduler = get_groq_scheduler()
+        self.io_executor = get_io_executor()
+        self.log_cache = get_daily_log_cache()
+        self.health_profiles = get_health_profile_cache()
+        self.llm_cache = get_llm_cache()
+        self.ai_metrics = get_ai_metrics()
+        self.model_router = get_model_router()
+        self.plan_jobs = get_plan_job_queue()
+        self.cohort_analytics = get_cohort_analytics()
 
-    # --- AI Method ---
-    async def get_ai_response(self, system_prompt, user_prompt, model="llama3-8b-8192", max_tokens=2000, temperature=0.7):
+    async def _run_io(self, fn, *args, **kwargs):
+        """Runs a blocking call (Firebase SDK, SQLite) on the I/O pool so the event loop stays free."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, functools.partial(fn, *args, **kwargs))
+
+    # --- AI Methods ---
+    async def stream_ai_response(self, system_prompt, user_prompt, model=None, max_tokens=None, temperature=None, use_cache=True,
+                                 priority="interactive", tenant=None, feature="general"):
+        """
+        Async generator yielding the model's answer piece by piece as tokens arrive.
+        A cached answer is yielded in one piece. API errors (and a missing API key) propagate
+        to the caller; the full answer is cached once the stream has been consumed to the end.
+        Requests go through the shared scheduler: `priority` is "interactive" or "batch",
+        and `tenant` (the org id) is the unit of fair sharing. Every call is recorded in
+        the AI metrics under `feature` (e.g. "workout_plan", "nudge").
+        Model, max_tokens and temperature default to the feature's route (see model_routing).
+        """
         if not self.groq_client:
-            return "AI service is unavailable."
-        
-        full_response = ""
-        try:
-            stream = await self.groq_client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                model=model, max_tokens=max_tokens, temperature=temperature, stream=True
+            raise RuntimeError("AI service is unavailable.")
+
+        route = self.model_router.route(feature)
+        model = model or route["model"]
+        max_tokens = max_tokens or route["max_tokens"]
+        temperature = route["temperature"] if temperature is None else temperature
+
+        span = self.ai_metrics.start(feature, model, priority=priority, tenant=tenant)
+        try:
+            cache_key = LLMResponseCache.make_key(model, temperature, max_tokens, system_prompt, user_prompt)
+            if use_cache:
+                cached = self.llm_cache.get_memory(cache_key)
+                if cached is None:
+                    try:
+                        cached = await self._run_io(self.llm_cache.get_disk, cache_key)
+                    except Exception as e:
+                        notify_ui("warning", f"Could not read AI response cache: {e}")
+                if cached is not None:
+                    span.cached = True
+                    span.mark_first_token()
+                    yield cached
+                    return
+
+            pieces = []
+            usage = None
+            reserved_tokens = GroqScheduler.estimate_tokens(system_prompt, user_prompt, max_tokens)
+            stream = await self.groq_scheduler.submit(
+                lambda: self.groq_client.chat.completions.create(
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt},
+                    ],
+                    model=model, max_tokens=max_tokens, temperature=temperature, stream=True
+                ),
+                priority=priority, tenant=tenant, tokens=reserved_tokens, model=model,
             )
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    full_response += chunk.choices[0].delta.content
-            return full_response.strip()
+            try:
+                async for chunk in stream:
+                    # Groq reports the real token usage on the last chunk
+                    x_groq = getattr(chunk, 'x_groq', None)
+                    usage = getattr(x_groq, 'usage', None) or getattr(chunk, 'usage', None) or usage
+                    if not chunk.choices:
+                        continue
+                    piece = chunk.choices[0].delta.content
+                    if piece:
+                        span.mark_first_token()
+                        pieces.append(piece)
+                        yield piece
+            finally:
+                if usage is not None:
+                    span.tokens_in, span.tokens_out = usage.prompt_tokens, usage.completion_tokens
+                else:
+                    span.tokens_in = GroqScheduler.estimate_tokens(system_prompt, user_prompt)
+                    span.tokens_out = len("".join(pieces)) // 4
+                self.groq_scheduler.settle(reserved_tokens, span.tokens_in + span.tokens_out, model=model)
+
+            # Fresh answers are stored even when the cache was bypassed, replacing the old one
+            full_response = "".join(pieces).strip()
+            if full_response:
+                try:
+                    await self._run_io(self.llm_cache.set, cache_key, full_response)
+                except Exception as e:
+                    notify_ui("warning", f"Could not cache AI response: {e}")
+        except (GeneratorExit, asyncio.CancelledError):
+            # The consumer stopped reading (page rerun, early exit)
+            span.outcome = "cancelled"
+            raise
+        except Exception as e:
+            span.fail(e)
+            raise
+        finally:
+            self.ai_metrics.record(span)
+
+    async def get_ai_response(self, system_prompt, user_prompt, model=None, max_tokens=None, temperature=None, use_cache=True,
+                              priority="interactive", tenant=None, feature="general", raise_errors=False):
+        """
+        Returns the model's full answer. Identical requests are served from the response cache;
+        pass use_cache=False to force a fresh generation (e.g. a "Regenerate" button).
+        Errors are shown and replaced by an apology, unless `raise_errors` (background callers
+        that must not deliver that text, e.g. the agent's nudges).
+        """
+        try:
+            pieces = [piece async for piece in self.stream_ai_response(
+                system_prompt, user_prompt, model=model, max_tokens=max_tokens, temperature=temperature, use_cache=use_cache,
+                priority=priority, tenant=tenant, feature=feature,
+            )]
+            return "".join(pieces).strip()
         except Exception as e:
-            st.error(f"Error with AI API: {e}")
+            if raise_errors:
+                raise
+            notify_ui("error", f"Error with AI API: {e}")
             return "An error occurred with the AI service."
 
     # --- Organization & Team Methods ---
@@ -77,27 +277,189 @@ class Backend:
         if not self.db: return None
         try:
             org_ref = self.db.collection('organizations').document()
-            org_ref.set({'name': org_name, 'created_at': firestore.SERVER_TIMESTAMP, 'created_by': created_by_uid})
+            await self._run_io(org_ref.set, {'name': org_name, 'created_at': firestore.SERVER_TIMESTAMP, 'created_by': created_by_uid})
             return org_ref.id
         except Exception as e:
-            st.error(f"Error creating organization: {e}"); return None
+            notify_ui("error", f"Error creating organization: {e}"); return None
 
     async def get_all_organizations(self) -> list:
         if not self.db: return []
         try:
-            docs = self.db.collection('organizations').stream()
+            docs = await self._run_io(lambda: list(self.db.collection('organizations').stream()))
             return [{'id': doc.id, **doc.to_dict()} for doc in docs]
         except Exception as e:
-            st.error(f"Error getting organizations: {e}"); return []
+            notify_ui("error", f"Error getting organizations: {e}"); return []
 
     async def add_team_to_organization(self, org_id: str, team_name: str) -> bool:
         if not self.db: return False
         try:
-            self.db.collection('organizations').document(org_id).collection('teams').add({'name': team_name, 'created_at': firestore.SERVER_TIMESTAMP})
+            teams_ref = self.db.collection('organizations').document(org_id).collection('teams')
+            await self._run_io(teams_ref.add, {'name': team_name, 'created_at': firestore.SERVER_TIMESTAMP})
             return True
         except Exception as e:
-            st.error(f"Error adding team: {e}"); return False
+            notify_ui("error", f"Error adding team: {e}"); return False
             
+    async def assign_user_to_team(self, org_id: str, user_uid: str, team_id: str | None) -> bool:
+        """Sets (or with None, clears) the team a user belongs to, moving them between team counters."""
+        if not self.db: return False
+        try:
+            user_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid)
+            old_team_id = ((await self._run_io(user_ref.get)).to_dict() or {}).get('team_id')
+        except Exception as e:
+            notify_ui("error", f"Error reading user profile: {e}"); return False
+        if old_team_id == team_id:
+            return True
+        if not await self.update_user_profile(user_uid, org_id, {'team_id': team_id}):
+            return False
+        if old_team_id:
+            await self.increment_counters(org_id, [counters.team_scope(old_team_id)], {'members': -1})
+        if team_id:
+            await self.increment_counters(org_id, [counters.team_scope(team_id)], {'members': 1})
+        return True
+
+    # --- Leaderboards ---
+    def _leaderboards_ref(self, org_id: str):
+        return self.db.collection('organizations').document(org_id).collection('leaderboards')
+
+    async def get_leaderboards(self, org_id: str, scopes: list) -> dict:
+        """Each scope's board document (None if it has none yet): one read per scope."""
+        if not self.db: return {scope: None for scope in scopes}
+        try:
+            refs = [self._leaderboards_ref(org_id).document(scope) for scope in scopes]
+            docs = await self._run_io(lambda: list(self.db.get_all(refs)))
+            boards = {doc.id: doc.to_dict() for doc in docs if doc.exists}
+            return {scope: boards.get(scope) for scope in scopes}
+        except Exception as e:
+            notify_ui("error", f"Error reading leaderboards: {e}"); return {scope: None for scope in scopes}
+
+    async def update_leaderboards(self, org_id: str, user_uid: str, team_id: str | None, rollup: dict) -> bool:
+        """
+        Offers a user's current values (from their rollup) to the org's and their team's
+        boards, each in a small transaction that only writes when the ranking changes.
+        """
+        if not self.db: return False
+        member = leaderboards.member_key(org_id, user_uid)
+        values = leaderboards.member_values(rollup)
+
+        @firestore.transactional
+        def offer_to_board(transaction, board_ref):
+            snapshot = board_ref.get(transaction=transaction)
+            board = snapshot.to_dict() if snapshot.exists else {}
+            if leaderboards.apply_member(board, member, values):
+                transaction.set(board_ref, board | {'updated_at': firestore.SERVER_TIMESTAMP})
+
+        try:
+            for scope in counters.scopes_for(team_id):
+                await self._run_io(offer_to_board, self.db.transaction(), self._leaderboards_ref(org_id).document(scope))
+            return True
+        except Exception as e:
+            notify_ui("error", f"Error updating leaderboards: {e}"); return False
+
+    async def rebuild_leaderboards(self, page_size: int = 500) -> int:
+        """
+        Rebuilds every org's and team's board from two paged collection-group scans (all
+        profiles, all activity rollups), ranking each with a bounded heap. Returns the
+        number of boards written.
+        """
+        if not self.db: return 0
+        teams = {}
+        async for page in self.scan_collection_group('users', page_size=page_size):
+            for doc in page:
+                teams[(doc.reference.parent.parent.id, doc.id)] = doc.to_dict().get('team_id')
+        members = {}  # (org_id, scope) -> {member key: member values}
+        async for page in self.scan_collection_group('rollups', page_size=page_size):
+            for doc in page:
+                user_ref = doc.reference.parent.parent
+                key = (user_ref.parent.parent.id, user_ref.id)
+                if doc.id != 'activity' or key not in teams:
+                    continue
+                values = leaderboards.member_values(doc.to_dict())
+                for scope in counters.scopes_for(teams[key]):
+                    members.setdefault((key[0], scope), {})[leaderboards.member_key(*key)] = values
+
+        items = list(members.items())
+        for start in range(0, len(items), 500):
+            batch = self.db.batch()
+            for (org_id, scope), scope_members in items[start:start + 500]:
+                board = leaderboards.build_board(scope_members)
+                batch.set(self._leaderboards_ref(org_id).document(scope), board | {'updated_at': firestore.SERVER_TIMESTAMP})
+            await self._run_io(batch.commit)
+        return len(items)
+
+    # --- Participation Counters ---
+    def _counters_ref(self, org_id: str):
+        return self.db.collection('organizations').document(org_id).collection('counters')
+
+    @staticmethod
+    def _counter_increments(deltas: dict) -> dict:
+        """Counter deltas as Firestore Increment transforms (for set(..., merge=True))."""
+        return {
+            field: {key: firestore.Increment(value) for key, value in delta.items()} if isinstance(delta, dict)
+            else firestore.Increment(delta)
+            for field, delta in deltas.items()
+        }
+
+    async def increment_counters(self, org_id: str, scopes: list, deltas: dict) -> bool:
+        """Adds `deltas` (see counters.py) to one random shard of each scope's counter."""
+        if not self.db or not deltas: return False
+        try:
+            batch = self.db.batch()
+            for scope in scopes:
+                batch.set(self._counters_ref(org_id).document(counters.random_shard_id(scope)), self._counter_increments(deltas), merge=True)
+            await self._run_io(batch.commit)
+            return True
+        except Exception as e:
+            notify_ui("error", f"Error updating counters: {e}"); return False
+
+    async def get_counters(self, org_id: str, scopes: list) -> dict:
+        """Each scope's counter summed over its shards: COUNTER_SHARDS reads per scope."""
+        if not self.db: return {scope: counters.merge_shards([]) for scope in scopes}
+        try:
+            refs = [self._counters_ref(org_id).document(counters.shard_id(scope, shard))
+                    for scope in scopes for shard in range(counters.COUNTER_SHARDS)]
+            docs = await self._run_io(lambda: list(self.db.get_all(refs)))
+            shards = {}
+            for doc in docs:
+                if doc.exists:
+                    shards.setdefault(doc.id.rsplit('-', 1)[0], []).append(doc.to_dict())
+            return {scope: counters.merge_shards(shards.get(scope, [])) for scope in scopes}
+        except Exception as e:
+            notify_ui("error", f"Error reading counters: {e}")
+            return {scope: counters.merge_shards([]) for scope in scopes}
+
+    async def reconcile_counters(self, org_id: str) -> dict:
+        """
+        Rebuilds the org's and its teams' counters from the profiles and the last
+        COUNTER_WEEKS weeks of logs, fixing any drift: each scope's exact values go to shard
+        0 and its other shards (and those of scopes that no longer exist) are cleared.
+        Increments landing during the rebuild can be lost, so run it off-peak.
+        """
+        if not self.db: return {}
+        profiles = []
+        async for page in self.scan_org_users(org_id):
+            profiles.extend((doc.id, doc.to_dict().get('team_id')) for doc in page)
+        logs = []
+        since = datetime.now(timezone.utc) - timedelta(weeks=counters.COUNTER_WEEKS)
+        async for page in self.scan_org_daily_logs(org_id, since):
+            for doc in page:
+                log = doc.to_dict()
+                logs.append((doc.reference.parent.parent.id, log['date'], log.get('workout_duration_min') or 0))
+        rebuilt = counters.build_counters(profiles, logs)
+
+        counters_ref = self._counters_ref(org_id)
+        existing = await self._run_io(lambda: [doc.id for doc in counters_ref.select([]).stream()])
+        writes = {counters.shard_id(scope, 0): values for scope, values in rebuilt.items()}
+        for scope in rebuilt:
+            writes |= {counters.shard_id(scope, shard): {} for shard in range(1, counters.COUNTER_SHARDS)}
+        writes |= {doc_id: {} for doc_id in existing if doc_id not in writes}
+        items = list(writes.items())
+        for start in range(0, len(items), 500):
+            batch = self.db.batch()
+            for doc_id, values in items[start:start + 500]:
+                batch.set(counters_ref.document(doc_id), values)
+            await self._run_io(batch.commit)
+        return rebuilt
+
     def get_teams_for_organization(self, org_id: str) -> list:
         """Synchronous method to get teams, easier to call inside loops in Streamlit."""
         if not self.db: return []
@@ -105,78 +467,239 @@ class Backend:
             teams_ref = self.db.collection("organizations").document(org_id).collection("teams")
             return [doc.to_dict() | {'id': doc.id} for doc in teams_ref.stream()]
         except Exception as e:
-            st.error(f"Error getting teams: {e}"); return []
+            notify_ui("error", f"Error getting teams: {e}"); return []
 
     async def rename_team(self, org_id: str, team_id: str, new_name: str) -> bool:
         if not self.db: return False
         try:
-            self.db.collection("organizations").document(org_id).collection("teams").document(team_id).update({"name": new_name})
+            team_ref = self.db.collection("organizations").document(org_id).collection("teams").document(team_id)
+            await self._run_io(team_ref.update, {"name": new_name})
             return True
         except Exception as e:
-            st.error(f"Error renaming team: {e}"); return False
+            notify_ui("error", f"Error renaming team: {e}"); return False
 
     async def delete_team(self, org_id: str, team_id: str) -> bool:
         if not self.db: return False
         try:
-            self.db.collection("organizations").document(org_id).collection("teams").document(team_id).delete()
+            team_ref = self.db.collection("organizations").document(org_id).collection("teams").document(team_id)
+            await self._run_io(team_ref.delete)
             return True
         except Exception as e:
-            st.error(f"Error deleting team: {e}"); return False
+            notify_ui("error", f"Error deleting team: {e}"); return False
 
     # --- User Management Methods ---
     async def get_user_by_email(self, email: str):
         if not self.auth: return None
         try:
-            return self.auth.get_user_by_email(email)
+            return await self._run_io(self.auth.get_user_by_email, email)
         except auth.UserNotFoundError:
             return None
         except Exception as e:
-            st.error(f"Error getting user by email: {e}"); return None
+            notify_ui("error", f"Error getting user by email: {e}"); return None
 
     async def create_user_in_auth_and_firestore(self, org_id: str, name: str, email: str, is_admin: bool = False) -> tuple[str | None, bool]:
         if not self.auth or not self.db: return None, False
         try:
-            new_user = self.auth.create_user(email=email, display_name=name)
+            new_user = await self._run_io(self.auth.create_user, email=email, display_name=name)
             uid = new_user.uid
             profile_data = {
                 'uid': uid, 'org_id': org_id, 'name': name, 'email': email, 'is_admin': is_admin,
                 'created_at': firestore.SERVER_TIMESTAMP,
-                'body_metrics': {'weight_kg': 70, 'height_cm': 175, 'age': 30, 'gender': 'Male'}
+                'body_metrics': {'weight_kg': 70, 'height_cm': 175, 'age': 30, 'gender': 'Male'},
+                'last_workout_at': None, 'last_log_at': None
             }
             await self.update_user_profile(uid, org_id, profile_data)
+            await self.increment_counters(org_id, [counters.ORG_SCOPE], {'members': 1})
             return uid, is_admin
         except Exception as e:
-            st.error(f"Error creating new user: {e}"); return None, False
+            notify_ui("error", f"Error creating new user: {e}"); return None, False
+
+    async def get_users_in_organization(self, org_id: str) -> list:
+        """Returns every user profile stored under an organization."""
+        if not self.db: return []
+        try:
+            users_ref = self.db.collection('organizations').document(org_id).collection('users')
+            docs = await self._run_io(lambda: list(users_ref.stream()))
+            return [doc.to_dict() for doc in docs]
+        except Exception as e:
+            notify_ui("error", f"Error getting users: {e}"); return []
+
+    async def get_inactive_users(self, org_id: str, inactive_since: datetime) -> list:
+        """
+        Returns profiles whose last_workout_at is older than `inactive_since` or who never
+        worked out, using two indexed queries instead of reading every user's logs.
+        """
+        if not self.db: return []
+        try:
+            users_ref = self.db.collection('organizations').document(org_id).collection('users')
+            stale_query = users_ref.where('last_workout_at', '<', inactive_since)
+            never_query = users_ref.where('last_workout_at', '==', None)
+            stale, never = await asyncio.gather(
+                self._run_io(lambda: list(stale_query.stream())),
+                self._run_io(lambda: list(never_query.stream())),
+            )
+            return [doc.to_dict() for doc in stale + never]
+        except Exception as e:
+            notify_ui("error", f"Error querying inactive users: {e}"); return []
+
+    async def scan_collection_group(self, group: str, filters=(), order_field: str | None = None, page_size: int = 500):
+        """
+        Async generator over every document in a collection group (e.g. all orgs' 'users'),
+        yielding snapshot pages. Each page resumes from the previous page's last document,
+        so large scans are a handful of big reads instead of many small ones.
+        `filters` are (field, op, value) tuples; an inequality field must be `order_field`.
+        """
+        if not self.db: return
+        query = self.db.collection_group(group)
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        if order_field:
+            query = query.order_by(order_field)
+        async for page in self._scan_pages(query, page_size):
+            yield page
+
+    async def scan_org_users(self, org_id: str, page_size: int = 500):
+        """Async generator over an org's user-profile snapshots, a page at a time."""
+        if not self.db: return
+        users_ref = self.db.collection('organizations').document(org_id).collection('users')
+        async for page in self._scan_pages(users_ref, page_size):
+            yield page
+
+    async def scan_org_daily_logs(self, org_id: str, since: datetime, page_size: int = 500):
+        """
+        Async generator over the org's daily-log snapshots dated `since` or later, from the
+        daily_logs collection group. Needs the (org_id, date) index in firestore.indexes.json.
+        """
+        async for page in self.scan_collection_group('daily_logs', filters=[('org_id', '==', org_id), ('date', '>=', since)],
+                                                     order_field='date', page_size=page_size):
+            yield page
+
+    async def scan_daily_logs(self, org_id: str, user_uid: str, page_size: int = 500):
+        """Async generator over one user's daily-log snapshots, a page at a time."""
+        if not self.db: return
+        async for page in self._scan_pages(self._logs_ref(org_id, user_uid), page_size):
+            yield page
+
+    async def update_daily_logs_batch(self, org_id: str, user_uid: str, updates: list) -> int:
+        """
+        Applies (log_id, fields) partial updates with write batches of at most 500 and
+        drops the user's cached logs. Returns how many logs were written.
+        """
+        if not self.db or not updates: return 0
+        logs_ref = self._logs_ref(org_id, user_uid)
+        written = 0
+        try:
+            for start in range(0, len(updates), 500):
+                batch = self.db.batch()
+                chunk = updates[start:start + 500]
+                for log_id, fields in chunk:
+                    batch.update(logs_ref.document(log_id), fields)
+                await self._run_io(batch.commit)
+                written += len(chunk)
+        except Exception as e:
+            notify_ui("error", f"Error updating daily logs: {e}")
+        finally:
+            self.log_cache.invalidate((org_id, user_uid))
+        return written
+
+    def _logs_ref(self, org_id: str, user_uid: str):
+        return self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('daily_logs')
+
+    async def _scan_pages(self, query, page_size: int):
+        """Pages through a query in document-name order, each page starting after the last."""
+        query = query.order_by('__name__').limit(page_size)
+        cursor = None
+        while True:
+            page_query = query.start_after(cursor) if cursor is not None else query
+            page = await self._run_io(lambda: list(page_query.stream()))
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            cursor = page[-1]
+
+    async def backfill_activity_markers(self, org_id: str) -> int:
+        """
+        One-off migration for profiles created before last_workout_at existed (the
+        inactivity query cannot see documents missing the field). Returns how many were set.
+        """
+        updated = 0
+        for profile in await self.get_users_in_organization(org_id):
+            user_uid = profile.get('uid')
+            if not user_uid or 'last_workout_at' in profile:
+                continue
+            logs = await self.get_daily_logs(org_id, user_uid, descending=True)
+            workouts = [log['date'] for log in logs if (log.get('workout_duration_min', 0) or 0) > 0]
+            markers = {
+                'last_log_at': logs[0]['date'] if logs else None,
+                'last_workout_at': workouts[0] if workouts else None,
+            }
+            if await self.update_user_profile(user_uid, org_id, markers):
+                updated += 1
+        return updated
+
+    async def backfill_log_org_ids(self, org_id: str) -> int:
+        """
+        One-off migration for daily logs saved before they carried org_id (the org-wide
+        analytics query cannot see them). Returns how many logs were stamped.
+        """
+        updated = 0
+        for profile in await self.get_users_in_organization(org_id):
+            user_uid = profile.get('uid')
+            if not user_uid:
+                continue
+            async for page in self.scan_daily_logs(org_id, user_uid):
+                missing = [(doc.id, {'org_id': org_id}) for doc in page if doc.to_dict().get('org_id') is None]
+                updated += await self.update_daily_logs_batch(org_id, user_uid, missing)
+        return updated
 
     async def get_user_profile(self, user_uid: str, org_id: str) -> dict | None:
         if not self.db: return None
         try:
             user_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid)
-            user_doc = user_ref.get()
+            user_doc = await self._run_io(user_ref.get)
             if user_doc.exists:
                 return user_doc.to_dict()
             else:
-                st.info("Creating a default profile for you in this organization...")
-                user_auth_record = self.auth.get_user(user_uid)
+                notify_ui("info", "Creating a default profile for you in this organization...")
+                user_auth_record = await self._run_io(self.auth.get_user, user_uid)
                 default_profile = {
                     'uid': user_uid, 'org_id': org_id, 'name': user_auth_record.display_name or "New User",
                     'email': user_auth_record.email, 'is_admin': False,
                     'created_at': firestore.SERVER_TIMESTAMP,
-                    'body_metrics': {'weight_kg': 70, 'height_cm': 175, 'age': 30, 'gender': 'Male'}
+                    'body_metrics': {'weight_kg': 70, 'height_cm': 175, 'age': 30, 'gender': 'Male'},
+                    'last_workout_at': None, 'last_log_at': None
                 }
                 await self.update_user_profile(user_uid, org_id, default_profile)
+                await self.increment_counters(org_id, [counters.ORG_SCOPE], {'members': 1})
                 return default_profile
         except Exception as e:
-            st.error(f"Error getting user profile: {e}"); return None
+            notify_ui("error", f"Error getting user profile: {e}"); return None
 
     async def update_user_profile(self, user_uid: str, org_id: str, data: dict) -> bool:
         if not self.db: return False
         try:
             user_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid)
-            user_ref.set(data, merge=True)
+            await self._run_io(user_ref.set, data, merge=True)
+            if 'body_metrics' in data:
+                # Same inputs give back the same memoized snapshot; changed ones build a new one
+                cached = self.health_profiles.get((org_id, user_uid))
+                if cached is not None:
+                    self.health_profiles.set((org_id, user_uid), HealthProfile.from_metrics({**cached.inputs(), **data['body_metrics']}))
             return True
         except Exception as e:
-            st.error(f"Error updating user profile: {e}"); return False
+            notify_ui("error", f"Error updating user profile: {e}"); return False
+
+    async def get_health_profile(self, user_uid: str, org_id: str) -> HealthProfile:
+        """The user's HealthProfile, built from the stored body_metrics on first use."""
+        health = self.health_profiles.get((org_id, user_uid))
+        if health is None:
+            profile = await self.get_user_profile(user_uid, org_id)
+            health = HealthProfile.from_metrics((profile or {}).get('body_metrics'))
+            if profile is not None:
+                self.health_profiles.set((org_id, user_uid), health)
+        return health
 
     # --- Fitness Data Methods ---
     async def save_daily_log(self, user_uid: str, org_id: str, log_data: dict) -> bool:
@@ -188,51 +711,271 @@ class Backend:
             
             date_str = log_date.strftime('%Y-%m-%d')
             log_data['date'] = log_date
+            # Lets org-wide analytics find the org's logs with one collection-group query
+            log_data['org_id'] = org_id
 
-            log_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('daily_logs').document(date_str)
-            log_ref.set(log_data)
-            return True
+            user_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid)
+            logs_ref = user_ref.collection('daily_logs')
+            log_ref = logs_ref.document(date_str)
+            rollup_ref = user_ref.collection('rollups').document('activity')
+
+            # The log, the rollup it feeds and the profile's activity markers change together;
+            # reading the previous version of the day lets an overwrite replace its contribution.
+            @firestore.transactional
+            def write_log_and_rollup(transaction):
+                old_snapshot = log_ref.get(transaction=transaction)
+                rollup_snapshot = rollup_ref.get(transaction=transaction)
+                profile_snapshot = user_ref.get(transaction=transaction)
+                old_log = old_snapshot.to_dict() if old_snapshot.exists else None
+                if rollup_snapshot.exists:
+                    rollup = rollup_snapshot.to_dict()
+                else:
+                    # Users who logged before rollups existed: start from their full history
+                    # (which includes old_log, so the overwrite below still replaces it)
+                    rollup = build_rollup([doc.to_dict() for doc in logs_ref.stream(transaction=transaction)])
+                profile = profile_snapshot.to_dict() or {}
+                week = week_key(log_date)
+                was_active = rollup.get('weeks', {}).get(week, {}).get('workout_days', 0) > 0
+                apply_log_to_rollup(rollup, old_log, log_data)
+                is_active = rollup.get('weeks', {}).get(week, {}).get('workout_days', 0) > 0
+                markers = activity_markers(profile, old_log, log_data, rollup)
+                rollup['updated_at'] = firestore.SERVER_TIMESTAMP
+                transaction.set(log_ref, log_data)
+                transaction.set(rollup_ref, rollup)
+                if markers:
+                    transaction.set(user_ref, markers, merge=True)
+                # Org / team participation counters, on one random shard each
+                deltas = counters.log_deltas(old_log, log_data, was_active, is_active)
+                if deltas:
+                    for scope in counters.scopes_for(profile.get('team_id')):
+                        shard_ref = self._counters_ref(org_id).document(counters.random_shard_id(scope))
+                        transaction.set(shard_ref, self._counter_increments(deltas), merge=True)
+                return rollup, profile.get('team_id')
+
+            rollup, team_id = await self._run_io(write_log_and_rollup, self.db.transaction())
+            self.log_cache.put_log((org_id, user_uid), log_data)
         except Exception as e:
-            st.error(f"Error saving daily log: {e}"); return False
+            notify_ui("error", f"Error saving daily log: {e}"); return False
+        # Best effort: the nightly rebuild corrects any board a failed update leaves behind
+        await self.update_leaderboards(org_id, user_uid, team_id, rollup)
+        return True
 
-    async def get_daily_logs(self, org_id: str, user_uid: str) -> list:
+    async def get_daily_logs(self, org_id: str, user_uid: str, since: datetime | None = None, until: datetime | None = None,
+                             descending: bool = False, limit: int | None = None) -> list:
+        """
+        Returns a user's daily logs ordered by date. The since/until bounds (inclusive),
+        sort order and limit are pushed down to Firestore so only matching documents are read.
+        Results come from the shared log cache whenever its window covers the request.
+        """
         if not self.db: return []
+        cache_key = (org_id, user_uid)
+        cached = self.log_cache.lookup(cache_key, since=since, until=until, descending=descending, limit=limit)
+        if cached is not None:
+            return cached
         try:
             logs_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('daily_logs')
-            docs = logs_ref.stream()
-            return [doc.to_dict() for doc in docs]
+            query = logs_ref
+            if since is not None:
+                query = query.where('date', '>=', since)
+            if until is not None:
+                query = query.where('date', '<=', until)
+            direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+            query = query.order_by('date', direction=direction)
+            if limit:
+                query = query.limit(limit)
+            docs = await self._run_io(lambda: list(query.stream()))
+            logs = [doc.to_dict() for doc in docs]
+            # Only an open-ended [since, now] read describes a whole window worth caching
+            if until is None and not limit:
+                self.log_cache.store(cache_key, logs, since=since)
+            return logs
+        except Exception as e:
+            notify_ui("error", f"Error getting daily logs: {e}"); return []
+
+    async def get_activity_rollup(self, org_id: str, user_uid: str) -> dict | None:
+        """
+        Returns the user's weekly/monthly activity rollup (one small document), building
+        it from the raw logs once for users who logged before rollups existed.
+        """
+        if not self.db: return None
+        try:
+            rollup_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('rollups').document('activity')
+            snapshot = await self._run_io(rollup_ref.get)
+            if snapshot.exists:
+                return snapshot.to_dict()
+            return await self.rebuild_activity_rollup(org_id, user_uid)
+        except Exception as e:
+            notify_ui("error", f"Error getting activity summary: {e}"); return None
+
+    async def rebuild_activity_rollup(self, org_id: str, user_uid: str) -> dict | None:
+        """Recomputes the rollup document from the user's full log history."""
+        if not self.db: return None
+        try:
+            logs = await self.get_daily_logs(org_id, user_uid)
+            rollup = build_rollup(logs)
+            rollup_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('rollups').document('activity')
+            await self._run_io(rollup_ref.set, rollup | {'updated_at': firestore.SERVER_TIMESTAMP})
+            return rollup
         except Exception as e:
-            st.error(f"Error getting daily logs: {e}"); return []
+            notify_ui("error", f"Error rebuilding activity summary: {e}"); return None
 
     async def save_notification(self, org_id: str, user_uid: str, message: str) -> bool:
         if not self.db: return False
         try:
             ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('notifications').document()
-            ref.set({'message': message, 'timestamp': firestore.SERVER_TIMESTAMP, 'read': False})
+            await self._run_io(ref.set, {'message': message, 'timestamp': firestore.SERVER_TIMESTAMP, 'read': False})
             return True
         except Exception as e:
-            st.error(f"Error saving notification: {e}"); return False
+            notify_ui("error", f"Error saving notification: {e}"); return False
             
+    async def save_notifications_batch(self, notifications: list, mark_nudged: bool = False) -> int:
+        """
+        Saves (org_id, user_uid, message, ...) tuples with Firestore write batches
+        (at most 500 writes each) instead of one round trip per notification.
+        With mark_nudged, each user's nudge cooldown fields are updated in the same batch.
+        Blank messages are skipped, so no user is marked nudged without getting a nudge.
+        Returns how many were written.
+        """
+        notifications = [item for item in notifications if (item[2] or "").strip()]
+        if not self.db or not notifications: return 0
+        saved = 0
+        chunk_size = 250 if mark_nudged else 500
+        try:
+            for start in range(0, len(notifications), chunk_size):
+                chunk = notifications[start:start + chunk_size]
+                batch = self.db.batch()
+                for org_id, user_uid, message, *_ in chunk:
+                    user_ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid)
+                    ref = user_ref.collection('notifications').document()
+                    batch.set(ref, {'message': message, 'timestamp': firestore.SERVER_TIMESTAMP, 'read': False})
+                    if mark_nudged:
+                        batch.set(user_ref, {'last_nudged_at': firestore.SERVER_TIMESTAMP, 'nudges_ignored': firestore.Increment(1)}, merge=True)
+                await self._run_io(batch.commit)
+                saved += len(chunk)
+            return saved
+        except Exception as e:
+            notify_ui("error", f"Error saving notifications: {e}"); return saved
+
+    # --- Generated Plans (background jobs) ---
+    def _plans_ref(self, org_id: str, user_uid: str):
+        return self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('plans')
+
+    async def create_plan_job(self, org_id: str, user_uid: str, data: dict) -> str | None:
+        """Creates the plan document for a new job and returns its id (the job id)."""
+        if not self.db: return None
+        try:
+            ref = self._plans_ref(org_id, user_uid).document()
+            await self._run_io(ref.set, data | {'created_at': firestore.SERVER_TIMESTAMP})
+            return ref.id
+        except Exception as e:
+            notify_ui("error", f"Error creating plan job: {e}"); return None
+
+    async def update_plan_job(self, org_id: str, user_uid: str, job_id: str, data: dict, completed: bool = False) -> bool:
+        if not self.db: return False
+        try:
+            if completed:
+                data = data | {'completed_at': firestore.SERVER_TIMESTAMP}
+            await self._run_io(self._plans_ref(org_id, user_uid).document(job_id).update, data)
+            return True
+        except Exception as e:
+            notify_ui("error", f"Error updating plan job: {e}"); return False
+
+    async def get_plan_job(self, org_id: str, user_uid: str, job_id: str) -> dict | None:
+        if not self.db: return None
+        try:
+            doc = await self._run_io(self._plans_ref(org_id, user_uid).document(job_id).get)
+            return doc.to_dict() | {'id': doc.id} if doc.exists else None
+        except Exception as e:
+            notify_ui("error", f"Error getting plan: {e}"); return None
+
+    async def get_latest_plan(self, org_id: str, user_uid: str, kind: str) -> dict | None:
+        """
+        The user's most recently completed plan of a kind ("workout_plan", "meal_plan").
+        Needs the plans composite index in firestore.indexes.json.
+        """
+        if not self.db: return None
+        try:
+            query = (self._plans_ref(org_id, user_uid).where('kind', '==', kind).where('status', '==', "done")
+                     .order_by('completed_at', direction=firestore.Query.DESCENDING).limit(1))
+            docs = await self._run_io(lambda: list(query.stream()))
+            return docs[0].to_dict() | {'id': docs[0].id} if docs else None
+        except Exception as e:
+            notify_ui("error", f"Error getting latest plan: {e}"); return None
+
+    # --- Org-shared Plan Library (keyed by plan_library.plan_key) ---
+    async def get_library_plan(self, org_id: str, key: str) -> dict | None:
+        if not self.db: return None
+        try:
+            doc = await self._run_io(self.db.collection('organizations').document(org_id).collection('plan_library').document(key).get)
+            return doc.to_dict() if doc.exists else None
+        except Exception as e:
+            notify_ui("error", f"Error reading plan library: {e}"); return None
+
+    async def save_library_plan(self, org_id: str, key: str, data: dict) -> bool:
+        """Stores (or replaces, after a regenerate) the org's plan for one set of inputs."""
+        if not self.db: return False
+        try:
+            ref = self.db.collection('organizations').document(org_id).collection('plan_library').document(key)
+            await self._run_io(ref.set, data | {'created_at': firestore.SERVER_TIMESTAMP, 'uses': 0})
+            return True
+        except Exception as e:
+            notify_ui("error", f"Error saving to plan library: {e}"); return False
+
+    async def reuse_library_plan(self, org_id: str, user_uid: str, key: str, kind: str, content: str) -> bool:
+        """Counts a reuse and records the plan in the user's own plans, in one batch."""
+        if not self.db: return False
+        try:
+            batch = self.db.batch()
+            library_ref = self.db.collection('organizations').document(org_id).collection('plan_library').document(key)
+            batch.update(library_ref, {'uses': firestore.Increment(1), 'last_used_at': firestore.SERVER_TIMESTAMP})
+            batch.set(self._plans_ref(org_id, user_uid).document(), {
+                'kind': kind, 'status': "done", 'content': content, 'source': "library", 'library_key': key,
+                'created_at': firestore.SERVER_TIMESTAMP, 'completed_at': firestore.SERVER_TIMESTAMP,
+            })
+            await self._run_io(batch.commit)
+            return True
+        except Exception as e:
+            notify_ui("error", f"Error recording plan reuse: {e}"); return False
+
+    # --- Nudge Template Pool ---
+    async def get_nudge_templates(self) -> dict:
+        """Returns every nudge_pool segment document, keyed by segment id."""
+        if not self.db: return {}
+        try:
+            docs = await self._run_io(lambda: list(self.db.collection('nudge_pool').stream()))
+            return {doc.id: doc.to_dict() for doc in docs}
+        except Exception as e:
+            notify_ui("error", f"Error loading nudge templates: {e}"); return {}
+
+    async def save_nudge_templates(self, segment_id: str, data: dict) -> bool:
+        if not self.db: return False
+        try:
+            ref = self.db.collection('nudge_pool').document(segment_id)
+            await self._run_io(ref.set, data | {'generated_at': firestore.SERVER_TIMESTAMP})
+            return True
+        except Exception as e:
+            notify_ui("error", f"Error saving nudge templates: {e}"); return False
+
     async def get_notifications(self, org_id: str, user_uid: str) -> list:
         """Retrieves all unread notifications for a user."""
         if not self.db: return []
         try:
             ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('notifications')
             query = ref.where('read', '==', False)
-            docs = query.stream()
+            docs = await self._run_io(lambda: list(query.stream()))
             # --- FIX: Include the document ID with the data ---
             return [doc.to_dict() | {'id': doc.id} for doc in docs]
         except Exception as e:
-            st.error(f"Error getting notifications: {e}"); return []
+            notify_ui("error", f"Error getting notifications: {e}"); return []
             
     async def mark_notification_as_read(self, org_id: str, user_uid: str, notification_id: str) -> bool:
         if not self.db: return False
         try:
             ref = self.db.collection('organizations').document(org_id).collection('users').document(user_uid).collection('notifications').document(notification_id)
-            ref.update({'read': True})
+            await self._run_io(ref.update, {'read': True})
             return True
         except Exception as e:
-            st.error(f"Error updating notification: {e}"); return False
+            notify_ui("error", f"Error updating notification: {e}"); return False
     
     # In backend_logic.py, add this function inside the Backend class
 
@@ -240,24 +983,23 @@ class Backend:
         """Renames an existing organization."""
         if not self.db: return False
         try:
-            self.db.collection("organizations").document(org_id).update({"name": new_name})
+            org_ref = self.db.collection("organizations").document(org_id)
+            await self._run_io(org_ref.update, {"name": new_name})
             return True
         except Exception as e:
-            st.error(f"Error renaming organization: {e}"); return False
+            notify_ui("error", f"Error renaming organization: {e}"); return False
 
     # --- Calculation & Utility Methods ---
     def get_todays_tip(self):
         tips = ["Stay hydrated!", "Rest is crucial for muscle growth.", "Consistency beats intensity."]
         return tips[datetime.now().day % len(tips)]
 
+    # Scalar wrappers over the vectorized calculators in fitness_calcs
     def calculate_bmi(self, weight_kg, height_cm):
-        if height_cm > 0: return round(weight_kg / ((height_cm / 100) ** 2), 2)
-        return 0.0
+        return float(fitness_calcs.bmi(weight_kg, height_cm))
 
     def calculate_body_fat(self, bmi, age, gender):
-        if gender == "Male": return round((1.20 * bmi) + (0.23 * age) - 16.2, 1)
-        return round((1.20 * bmi) + (0.23 * age) - 5.4, 1)
+        return float(fitness_calcs.body_fat(bmi, age, gender))
 
     def calculate_bmr(self, weight_kg, height_cm, age, gender):
-        if gender == "Male": return int(10 * weight_kg + 6.25 * height_cm - 5 * age + 5)
-        return int(10 * weight_kg + 6.25 * height_cm - 5 * age - 161)
+        return int(fitness_calcs.bmr(weight_kg, height_cm, age, gender))
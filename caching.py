@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU mapping whose entries expire ttl_seconds after they were stored.
+    """
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+def as_utc(value: datetime) -> datetime:
+    """Firestore stores naive datetimes as UTC; normalize so cached and fetched dates compare."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+class DailyLogCache:
+    """
+    Per-user cache of daily logs, shared by every session in the server process.
+
+    Each entry remembers the earliest date it covers ('since', or None for the whole
+    history), so a range query is served from memory whenever the cached window
+    contains it. Writes update the entry in place instead of invalidating it.
+    """
+    def __init__(self, max_users: int, ttl_seconds: float):
+        self._entries = TTLCache(max_users, ttl_seconds)
+        self._lock = threading.Lock()
+
+    def lookup(self, key, since=None, until=None, descending=False, limit=None):
+        """Returns the matching logs, or None if the cached window does not cover `since`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            covered = entry['since']
+            if covered is not None and (since is None or as_utc(since) < covered):
+                return None
+            logs = list(entry['logs'].values())
+        if since is not None:
+            logs = [log for log in logs if log['date'] >= as_utc(since)]
+        if until is not None:
+            logs = [log for log in logs if log['date'] <= as_utc(until)]
+        logs.sort(key=lambda log: log['date'], reverse=descending)
+        if limit:
+            logs = logs[:limit]
+        return [dict(log) for log in logs]
+
+    def store(self, key, logs, since=None):
+        """Caches the complete result of a query for [since, now]."""
+        entry = {
+            'since': as_utc(since) if since is not None else None,
+            'logs': {},
+        }
+        for log in logs:
+            self._put(entry, log)
+        self._entries.set(key, entry)
+
+    def put_log(self, key, log):
+        """Write-through for a saved log; a no-op when the user has nothing cached."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self._put(entry, log)
+
+    def invalidate(self, key):
+        self._entries.pop(key)
+
+    def _put(self, entry, log):
+        log = dict(log)
+        log['date'] = as_utc(log['date'])
+        entry['logs'][log['date'].strftime('%Y-%m-%d')] = log
@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+import fitness_calcs
+from caching import TTLCache
+
+PERCENTILES = (10, 25, 50, 75, 90)
+# Per-user columns summarised as percentiles in the population view
+DISTRIBUTION_COLUMNS = {
+    'bmi': "BMI", 'body_fat_percent': "Body fat %", 'health_score': "Health score",
+    'weekly_active_minutes': "Weekly active minutes",
+}
+NO_TEAM = "(no team)"
+
+class CohortAnalytics:
+    """
+    Population health of an org, for the Admin Panel.
+
+    `org_frame` reads the org's profiles and its last `window_days` of daily logs with
+    paged bulk scans (no per-user reads) and returns one row per user with the body
+    metrics, every derived metric and the activity totals. Frames are cached per org for
+    `ttl_seconds`; concurrent requests for the same org share one build.
+    """
+    def __init__(self, ttl_seconds: float = 600.0, max_orgs: int = 100, window_days: int = 28, page_size: int = 1000):
+        self.window_days = window_days
+        self.page_size = page_size
+        self._frames = TTLCache(max_orgs, ttl_seconds)
+        self._building = {}  # org_id -> future of the frame being built
+
+    async def org_frame(self, backend, org_id: str, refresh: bool = False) -> pd.DataFrame:
+        if not refresh:
+            frame = self._frames.get(org_id)
+            if frame is not None:
+                return frame
+        if org_id in self._building:
+            return await asyncio.shield(self._building[org_id])
+        building = asyncio.get_running_loop().create_future()
+        self._building[org_id] = building
+        try:
+            frame = await self._build(backend, org_id)
+            self._frames.set(org_id, frame)
+            building.set_result(frame)
+            return frame
+        except Exception as e:
+            building.set_exception(e)
+            building.exception()  # Marks it retrieved, in case no other request was waiting
+            raise
+        finally:
+            del self._building[org_id]
+
+    def invalidate(self, org_id: str):
+        self._frames.pop(org_id)
+
+    async def _build(self, backend, org_id: str) -> pd.DataFrame:
+        now = datetime.now(timezone.utc)
+        since = now - timedelta(days=self.window_days)
+        profiles = {'uid': [], 'name': [], 'team_id': [], 'weight_kg': [], 'height_cm': [], 'age': [], 'gender': []}
+        async for page in backend.scan_org_users(org_id, self.page_size):
+            for doc in page:
+                profile = doc.to_dict()
+                metrics = profile.get('body_metrics') or {}
+                profiles['uid'].append(doc.id)
+                profiles['name'].append(profile.get('name'))
+                profiles['team_id'].append(profile.get('team_id'))
+                for key in ('weight_kg', 'height_cm', 'age', 'gender'):
+                    profiles[key].append(metrics.get(key))
+        logs = {'uid': [], 'date': [], 'workout_duration_min': []}
+        async for page in backend.scan_org_daily_logs(org_id, since, self.page_size):
+            for doc in page:
+                log = doc.to_dict()
+                logs['uid'].append(doc.reference.parent.parent.id)
+                logs['date'].append(log.get('date'))
+                logs['workout_duration_min'].append(log.get('workout_duration_min'))
+        frame = build_frame(pd.DataFrame(profiles), pd.DataFrame(logs), now, self.window_days)
+        frame.attrs['built_at'] = now
+        return frame
+
+def build_frame(profiles: pd.DataFrame, logs: pd.DataFrame, now: datetime, window_days: int) -> pd.DataFrame:
+    """
+    One row per profile (uid, name, team_id, body metrics): the fitness_calcs derived
+    metrics (NaN without valid metrics), window workout minutes, weekly_active_minutes,
+    active_minutes_7d and active_7d (worked out in the last 7 days).
+    """
+    frame = profiles.astype({'uid': str})
+    for key in ('weight_kg', 'height_cm', 'age'):
+        frame[key] = pd.to_numeric(frame[key], errors='coerce').fillna(0.0)
+    valid = (frame['weight_kg'] > 0) & (frame['height_cm'] > 0) & (frame['age'] > 0)
+    frame = fitness_calcs.body_metrics_frame(frame)
+    derived = ['bmi', 'body_fat_percent', 'bmr', 'lean_mass_kg', 'muscle_mass_kg', 'body_water_percent', 'ideal_weight_kg', 'health_score']
+    frame[derived] = frame[derived].astype(float)
+    frame.loc[~valid, derived] = np.nan
+
+    minutes = pd.to_numeric(logs['workout_duration_min'], errors='coerce').fillna(0.0)
+    recent = pd.to_datetime(logs['date'], utc=True) >= pd.Timestamp(now) - pd.Timedelta(days=7)
+    activity = pd.DataFrame({
+        'workout_minutes': minutes, 'active_minutes_7d': minutes.where(recent, 0.0),
+    }).groupby(logs['uid'].astype(str)).sum()
+    frame = frame.join(activity, on='uid')
+    frame[['workout_minutes', 'active_minutes_7d']] = frame[['workout_minutes', 'active_minutes_7d']].fillna(0.0)
+    frame['weekly_active_minutes'] = frame['workout_minutes'] / (window_days / 7)
+    frame['active_7d'] = frame['active_minutes_7d'] > 0
+    return frame
+
+def distributions(frame: pd.DataFrame, percentiles=PERCENTILES) -> pd.DataFrame:
+    """Percentiles of each DISTRIBUTION_COLUMNS metric over the users who have it."""
+    rows = []
+    for column, label in DISTRIBUTION_COLUMNS.items():
+        values = frame[column].dropna().to_numpy(dtype=float) if column in frame else np.array([])
+        row = {'metric': label, 'users': len(values)}
+        points = np.percentile(values, percentiles) if len(values) else [np.nan] * len(percentiles)
+        row |= {f"p{q}": round(float(point), 1) for q, point in zip(percentiles, points)}
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def participation_by_team(frame: pd.DataFrame, teams: list) -> pd.DataFrame:
+    """
+    Members, users active in the last 7 days, participation rate (%) and median weekly
+    active minutes per team; users without a (known) team are grouped under NO_TEAM.
+    """
+    names = {team['id']: team.get('name', "Unnamed Team") for team in teams if team.get('id')}
+    grouped = frame.groupby(frame['team_id'].map(names).fillna(NO_TEAM).rename('team'))
+    table = pd.DataFrame({
+        'members': grouped.size(),
+        'active_7d': grouped['active_7d'].sum(),
+        'median_weekly_minutes': grouped['weekly_active_minutes'].median(),
+    })
+    table['participation_rate'] = (table['active_7d'] / table['members'] * 100).round(1)
+    table = table.reindex(columns=['members', 'active_7d', 'participation_rate', 'median_weekly_minutes'])
+    return table.reset_index().sort_values('participation_rate', ascending=False, ignore_index=True)
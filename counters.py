@@ -0,0 +1,107 @@
+import random
+from datetime import datetime, timedelta, timezone
+from rollups import week_key
+
+# Each counter is split over this many shard documents; writers pick one at random, so a
+# busy org's increments do not contend on a single document (~1 write/s per document)
+COUNTER_SHARDS = 10
+# How many recent weeks / days of per-period counts the counters keep
+COUNTER_WEEKS = 8
+COUNTER_DAYS = 14
+ORG_SCOPE = "org"
+
+# Counter documents (organizations/{org}/counters/{scope}-{shard}) hold:
+#   members                    users in the scope
+#   workout_minutes.{week}     workout minutes logged for days in that ISO week
+#   active_users.{week}        users with at least one workout day in that week
+#   loggers.{YYYY-MM-DD}       users who logged that day
+
+def team_scope(team_id: str) -> str:
+    return f"team-{team_id}"
+
+def scopes_for(team_id: str | None) -> list:
+    """The counters a user's activity feeds: the org's, and their team's if they have one."""
+    return [ORG_SCOPE, team_scope(team_id)] if team_id else [ORG_SCOPE]
+
+def shard_id(scope: str, shard: int) -> str:
+    return f"{scope}-{shard}"
+
+def random_shard_id(scope: str) -> str:
+    return shard_id(scope, random.randrange(COUNTER_SHARDS))
+
+def log_deltas(old_log: dict | None, new_log: dict, was_active: bool, is_active: bool) -> dict:
+    """
+    Counter changes for saving `new_log` over `old_log` (None for a new day), as a nested
+    dict of non-zero deltas. `was_active` / `is_active`: whether the user had a workout day
+    in the log's week before and after the save.
+    """
+    day = new_log['date']
+    week = week_key(day)
+    deltas = {}
+    minutes = (new_log.get('workout_duration_min', 0) or 0) - ((old_log or {}).get('workout_duration_min', 0) or 0)
+    if minutes:
+        deltas['workout_minutes'] = {week: minutes}
+    if is_active != was_active:
+        deltas['active_users'] = {week: 1 if is_active else -1}
+    if old_log is None:
+        deltas['loggers'] = {day.strftime('%Y-%m-%d'): 1}
+    return deltas
+
+def merge_shards(shards: list) -> dict:
+    """Sums shard documents (dicts, possibly empty) field by field, one level of nesting deep."""
+    total = {'members': 0, 'workout_minutes': {}, 'active_users': {}, 'loggers': {}}
+    for shard in shards:
+        for field, value in (shard or {}).items():
+            if isinstance(value, dict):
+                bucket = total.setdefault(field, {})
+                for key, count in value.items():
+                    bucket[key] = bucket.get(key, 0) + (count or 0)
+            elif isinstance(value, (int, float)):
+                total[field] = total.get(field, 0) + value
+    return total
+
+def summarize(counters: dict, today=None) -> dict:
+    """The live numbers for a scope: members, this week's active users and minutes, today's loggers."""
+    today = today or datetime.now(timezone.utc).date()
+    week = week_key(today)
+    return {
+        'members': counters.get('members', 0),
+        'active_this_week': counters.get('active_users', {}).get(week, 0),
+        'workout_minutes_this_week': counters.get('workout_minutes', {}).get(week, 0),
+        'loggers_today': counters.get('loggers', {}).get(today.strftime('%Y-%m-%d'), 0),
+    }
+
+def build_counters(profiles: list, logs: list, today=None) -> dict:
+    """
+    Exact counters per scope rebuilt from source data, for reconciliation: `profiles` are
+    (uid, team_id) pairs and `logs` (uid, date, workout_duration_min) tuples covering at
+    least the last COUNTER_WEEKS weeks. Periods older than the kept window are dropped.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    kept_weeks = {week_key(today - timedelta(weeks=offset)) for offset in range(COUNTER_WEEKS)}
+    kept_days = {(today - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(COUNTER_DAYS)}
+    teams = dict(profiles)
+    counters = {scope: {'members': 0, 'workout_minutes': {}, 'active_users': {}, 'loggers': {}}
+                for team_id in set(teams.values()) | {None} for scope in scopes_for(team_id)}
+    for uid, team_id in profiles:
+        for scope in scopes_for(team_id):
+            counters[scope]['members'] += 1
+
+    active = set()
+    for uid, date, minutes in logs:
+        if uid not in teams:
+            continue
+        week, day = week_key(date), date.strftime('%Y-%m-%d')
+        for scope in scopes_for(teams[uid]):
+            if week in kept_weeks and minutes:
+                bucket = counters[scope]['workout_minutes']
+                bucket[week] = bucket.get(week, 0) + minutes
+            if day in kept_days:
+                bucket = counters[scope]['loggers']
+                bucket[day] = bucket.get(day, 0) + 1
+        if week in kept_weeks and minutes and (uid, week) not in active:
+            active.add((uid, week))
+            for scope in scopes_for(teams[uid]):
+                bucket = counters[scope]['active_users']
+                bucket[week] = bucket.get(week, 0) + 1
+    return counters
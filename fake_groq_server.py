@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Groq chat-completions API, for load and latency tests without network.
+
+    python fake_groq_server.py --port 8765 --first-token-ms 300 --tokens-per-second 200 --rate-limit-rate 0.05
+
+then point the app or the agent at it:
+
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=fake streamlit run streamlit_app.py
+
+It serves POST /openai/v1/chat/completions in both plain and streaming (SSE) form, with
+the same chunk shape AsyncGroq parses, including the x_groq usage report on the last
+chunk. Latency, throughput, errors and 429s are configurable and reproducible (--seed).
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+DEFAULT_REPLY = (
+    "Here is a balanced plan for {name}. Start with a ten minute warm up, then three rounds of "
+    "squats, push ups and rows. Finish with light stretching and drink plenty of water."
+)
+
+class FakeGroqConfig:
+    """
+    Behaviour of the fake server.
+
+    `replies` is a list of (pattern, template) pairs tried in order against the user prompt
+    (case-insensitive regex); templates may use {model}, {name} (first capitalised word after
+    "name" in the prompt, or "there") and {prompt}. `max_requests_per_minute` makes the server
+    return 429s with retry-after like the real account limit would.
+    """
+    def __init__(self, first_token_ms: float = 200.0, tokens_per_second: float = 150.0, jitter: float = 0.1,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after_seconds: float = 1.0,
+                 max_requests_per_minute: int | None = None, replies: list | None = None,
+                 default_reply: str = DEFAULT_REPLY, seed: int = 0):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.max_requests_per_minute = max_requests_per_minute
+        self.replies = [(re.compile(pattern, re.IGNORECASE), template) for pattern, template in (replies or [])]
+        self.default_reply = default_reply
+        self.seed = seed
+
+class FakeGroqServer:
+    """ThreadingHTTPServer wrapper that can run in the background of a test or benchmark."""
+    def __init__(self, config: FakeGroqConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeGroqConfig()
+        self.stats = {'requests': 0, 'streams': 0, 'errors': 0, 'rate_limited': 0}
+        self._lock = threading.Lock()
+        self._request_times = []
+        self._httpd = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-groq", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self) -> tuple[str, random.Random]:
+        """Counts the request and decides its fate: 'ok', 'error' or 'rate_limited'."""
+        with self._lock:
+            index = self.stats['requests']
+            self.stats['requests'] += 1
+            rng = random.Random(self.config.seed * 1_000_003 + index)
+            now = time.monotonic()
+            limit = self.config.max_requests_per_minute
+            if limit is not None:
+                self._request_times = [t for t in self._request_times if now - t < 60]
+                if len(self._request_times) >= limit:
+                    self.stats['rate_limited'] += 1
+                    return 'rate_limited', rng
+                self._request_times.append(now)
+            roll = rng.random()
+            if roll < self.config.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 'rate_limited', rng
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                self.stats['errors'] += 1
+                return 'error', rng
+            return 'ok', rng
+
+    def _reply_for(self, model: str, messages: list) -> str:
+        prompt = " ".join(m.get('content', '') for m in messages if m.get('role') == 'user')
+        everything = " ".join(m.get('content', '') for m in messages)
+        name_match = re.search(r"name(?:\s+is)?[:\s]+([A-Z][\w-]*)", everything)
+        values = {'model': model, 'name': name_match.group(1) if name_match else "there", 'prompt': prompt}
+        for pattern, template in self.config.replies:
+            if pattern.search(prompt):
+                return template.format(**values)
+        return self.config.default_reply.format(**values)
+
+def _tokens(text: str) -> list:
+    """Splits text into word-sized pieces that join back to the original."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+def _make_handler(server: FakeGroqServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if self.path.rstrip("/") != COMPLETIONS_PATH:
+                return self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                return self._send_json(400, {'error': {'message': "Invalid JSON body", 'type': 'invalid_request_error'}})
+
+            config = server.config
+            fate, rng = server._admit()
+            if fate == 'rate_limited':
+                return self._send_json(429, {'error': {'message': "Rate limit reached (fake)", 'type': 'requests', 'code': 'rate_limit_exceeded'}},
+                                       headers={'retry-after': f"{config.retry_after_seconds:g}"})
+            if fate == 'error':
+                return self._send_json(500, {'error': {'message': "Injected server error (fake)", 'type': 'internal_server_error'}})
+
+            model = body.get('model', 'fake-model')
+            messages = body.get('messages', [])
+            pieces = _tokens(server._reply_for(model, messages))
+            max_tokens = body.get('max_tokens')
+            finish_reason = "stop"
+            if max_tokens and len(pieces) > max_tokens:
+                pieces, finish_reason = pieces[:max_tokens], "length"
+            usage = {
+                'prompt_tokens': sum(len(_tokens(m.get('content', ''))) for m in messages),
+                'completion_tokens': len(pieces),
+            }
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+
+            def jittered(seconds):
+                return max(0.0, seconds * (1 + rng.uniform(-config.jitter, config.jitter)))
+
+            time.sleep(jittered(config.first_token_ms / 1000))
+            completion_id = f"chatcmpl-{uuid.UUID(int=rng.getrandbits(128))}"
+            created = int(time.time())
+            if body.get('stream'):
+                with server._lock:
+                    server.stats['streams'] += 1
+                self._stream(completion_id, created, model, pieces, finish_reason, usage, jittered)
+            else:
+                time.sleep(jittered(len(pieces) / config.tokens_per_second))
+                self._send_json(200, {
+                    'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': "".join(pieces)},
+                                 'logprobs': None, 'finish_reason': finish_reason}],
+                    'usage': usage, 'system_fingerprint': 'fp_fake', 'x_groq': {'id': completion_id},
+                })
+
+        def _stream(self, completion_id, created, model, pieces, finish_reason, usage, jittered):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+
+            def chunk(delta, finish=None, x_groq=None):
+                payload = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'system_fingerprint': 'fp_fake',
+                    'choices': [{'index': 0, 'delta': delta, 'logprobs': None, 'finish_reason': finish}],
+                }
+                if x_groq:
+                    payload['x_groq'] = x_groq
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            try:
+                chunk({'role': 'assistant', 'content': ''}, x_groq={'id': completion_id})
+                interval = 1 / server.config.tokens_per_second
+                for piece in pieces:
+                    chunk({'content': piece})
+                    time.sleep(jittered(interval))
+                chunk({}, finish=finish_reason, x_groq={'id': completion_id, 'usage': usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading (cancelled stream)
+                pass
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq chat-completions server for offline load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=150.0, help="Streaming speed after the first token")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Relative +/- jitter applied to every delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after seconds sent with 429s")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before the server returns 429s")
+    parser.add_argument("--replies", help="JSON file of [[regex, template], ...] matched against the user prompt")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    replies = None
+    if args.replies:
+        with open(args.replies, encoding='utf-8') as f:
+            replies = json.load(f)
+    config = FakeGroqConfig(
+        first_token_ms=args.first_token_ms, tokens_per_second=args.tokens_per_second, jitter=args.jitter,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, retry_after_seconds=args.retry_after,
+        max_requests_per_minute=args.rpm, replies=replies, seed=args.seed,
+    )
+    server = FakeGroqServer(config, args.host, args.port)
+    print(f"Fake Groq API listening on {server.base_url} (set GROQ_BASE_URL to this)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {server.stats}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Vectorized fitness calculators. Every function takes scalars, lists, NumPy arrays or pandas
+# Series (broadcast together) and returns a NumPy array; gender branches are np.where on
+# gender == "Male", as in the scalar formulas. The scalar helpers on Backend, Body_Metrics and
+# Diet_Planner wrap these, so both paths give the same numbers.
+
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary": 1.2,
+    "Lightly Active": 1.375,
+    "Moderately Active": 1.55,
+    "Very Active": 1.725,
+    "Extremely Active": 1.9
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.55
+
+PROTEIN_MULTIPLIERS = {
+    "Lose Weight": 1.6,
+    "Gain Muscle": 2.2,
+    "Maintain Fitness": 1.2,
+    "Improve Endurance": 1.4,
+    "General Health": 1.0
+}
+DEFAULT_PROTEIN_MULTIPLIER = 1.2
+
+def _float(values) -> np.ndarray:
+    return np.asarray(values, dtype=float)
+
+def _is_male(gender) -> np.ndarray:
+    return np.asarray(gender, dtype=object) == "Male"
+
+def _round(values: np.ndarray, digits: int) -> np.ndarray:
+    """np.round that agrees with Python's round(): values near a tie are rounded by round() itself."""
+    rounded = np.round(values, digits)
+    scaled = values * 10 ** digits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded = np.array(rounded, dtype=float)
+        flat, source = rounded.reshape(-1), np.broadcast_to(values, rounded.shape).reshape(-1)
+        for i in np.flatnonzero(near_tie):
+            flat[i] = round(float(source[i]), digits)
+    return rounded
+
+def bmi(weight_kg, height_cm) -> np.ndarray:
+    weight, height = _float(weight_kg), _float(height_cm)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = _round(weight / (height / 100) ** 2, 2)
+    return np.where(height > 0, values, 0.0)
+
+def body_fat(bmi_values, age, gender) -> np.ndarray:
+    """Deurenberg estimate from BMI and age, in percent."""
+    base = 1.20 * _float(bmi_values) + 0.23 * _float(age)
+    return _round(base - np.where(_is_male(gender), 16.2, 5.4), 1)
+
+def bmr(weight_kg, height_cm, age, gender) -> np.ndarray:
+    """Mifflin-St Jeor basal metabolic rate, truncated to whole kcal like int()."""
+    base = 10 * _float(weight_kg) + 6.25 * _float(height_cm) - 5 * _float(age)
+    return np.trunc(base + np.where(_is_male(gender), 5, -161)).astype(np.int64)
+
+def tdee(bmr_values, activity_level) -> np.ndarray:
+    return _float(bmr_values) * _multipliers(activity_level, ACTIVITY_MULTIPLIERS, DEFAULT_ACTIVITY_MULTIPLIER)
+
+def protein_needs(weight_kg, goal) -> np.ndarray:
+    """Daily protein in grams; the diet goal "Maintain Weight" counts as "Maintain Fitness"."""
+    goal = np.where(np.asarray(goal, dtype=object) == "Maintain Weight", "Maintain Fitness", np.asarray(goal, dtype=object))
+    return _float(weight_kg) * _multipliers(goal, PROTEIN_MULTIPLIERS, DEFAULT_PROTEIN_MULTIPLIER)
+
+def ideal_weight(height_cm, gender) -> np.ndarray:
+    """Devine formula."""
+    height_inches = _float(height_cm) / 2.54
+    return np.where(_is_male(gender), 50.0, 45.5) + 2.3 * (height_inches - 60)
+
+def muscle_mass(lean_mass, gender) -> np.ndarray:
+    """Skeletal muscle as 45% (men) or 40% (women) of lean mass."""
+    return _float(lean_mass) * np.where(_is_male(gender), 0.45, 0.40)
+
+def body_water(weight_kg, age, gender, height_cm) -> np.ndarray:
+    """Watson total body water as a percentage of body weight (0 for zero weight)."""
+    weight, height = _float(weight_kg), _float(height_cm)
+    male_tbw = 2.447 - 0.09156 * _float(age) + 0.1074 * height + 0.3362 * weight
+    female_tbw = -2.097 + 0.1069 * height + 0.2466 * weight
+    tbw = np.where(_is_male(gender), male_tbw, female_tbw)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = tbw / weight * 100
+    return np.where(weight > 0, values, 0.0)
+
+def health_score(bmi_values, body_fat_values, age) -> np.ndarray:
+    """Simple 0-100 score with penalties for BMI, body fat and age."""
+    bmi_values, body_fat_values, age = _float(bmi_values), _float(body_fat_values), _float(age)
+    score = 100 - np.select([(bmi_values < 18.5) | (bmi_values >= 30), bmi_values >= 25], [30, 15], 0)
+    score = score - np.select([body_fat_values > 35, body_fat_values > 25], [25, 10], 0)
+    # As in the scalar version, age > 50 is checked first, so the > 65 penalty never applies
+    score = score - np.select([age > 50, age > 65], [5, 10], 0)
+    return np.clip(score, 0, 100)
+
+def body_metrics_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds every derived metric to a frame with weight_kg, height_cm, age and gender columns
+    (plus activity_level and fitness_goal, when present, for tdee and protein_g).
+    """
+    out = df.copy()
+    out['bmi'] = bmi(out['weight_kg'], out['height_cm'])
+    out['body_fat_percent'] = body_fat(out['bmi'], out['age'], out['gender'])
+    out['bmr'] = bmr(out['weight_kg'], out['height_cm'], out['age'], out['gender'])
+    fat_mass = out['body_fat_percent'] / 100 * out['weight_kg']
+    out['lean_mass_kg'] = out['weight_kg'] - fat_mass
+    out['muscle_mass_kg'] = muscle_mass(out['lean_mass_kg'], out['gender'])
+    out['body_water_percent'] = body_water(out['weight_kg'], out['age'], out['gender'], out['height_cm'])
+    out['ideal_weight_kg'] = ideal_weight(out['height_cm'], out['gender'])
+    out['health_score'] = health_score(out['bmi'], out['body_fat_percent'], out['age'])
+    if 'activity_level' in out:
+        out['tdee'] = tdee(out['bmr'], out['activity_level'])
+    if 'fitness_goal' in out:
+        out['protein_g'] = protein_needs(out['weight_kg'], out['fitness_goal'])
+    return out
+
+def _multipliers(labels, table: dict, default: float) -> np.ndarray:
+    labels = np.asarray(labels, dtype=object)
+    values = pd.Series(labels.ravel()).map(table).fillna(default).to_numpy(dtype=float)
+    return values.reshape(labels.shape)
@@ -0,0 +1,189 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import time
+import groq
+
+# Priority classes: lower is served first
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`, holding at most `capacity`."""
+    def __init__(self, rate_per_minute: float, capacity: float | None = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving at least `floor` tokens behind."""
+        now = time.monotonic()
+        self._refill(now)
+        # A request larger than the bucket is let through once the bucket is full
+        needed = min(amount + floor, self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill(time.monotonic())
+        self.tokens -= amount
+
+    def give_back(self, amount: float):
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class GroqScheduler:
+    """
+    Single admission point for every Groq request in a process.
+
+    - Requests-per-minute and tokens-per-minute token buckets keep us under the account limits.
+      Groq enforces limits per model, so each model gets its own pair of buckets and a request
+      for one model never waits behind another model's exhausted budget.
+    - Interactive requests always go before batch ones; batch requests may not drain the
+      buckets below `batch_headroom` of their capacity, which stays free for interactive use.
+    - Within a priority class, tenants (orgs) share capacity by weighted fair queuing on
+      virtual finish times, so one org's burst cannot starve the others.
+    - A 429 pauses admissions for that model for its retry-after, then the request is re-queued after a
+      jittered exponential backoff. Connection errors and 5xx responses are retried the same way.
+
+    Asyncio state is created lazily, so the scheduler binds to the loop that first uses it.
+    """
+    RETRYABLE = (groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError)
+
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 30000, batch_headroom: float = 0.2,
+                 max_retries: int = 4, base_backoff: float = 1.0, max_backoff: float = 30.0, tenant_weights: dict | None = None,
+                 model_limits: dict | None = None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        # model -> (requests_per_minute, tokens_per_minute) for models whose limits differ
+        self.model_limits = dict(model_limits or {})
+        self._buckets = {}
+        self.batch_headroom = batch_headroom
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.tenant_weights = dict(tenant_weights or {})
+        self._queue = []
+        self._seq = itertools.count()
+        self._virtual_time = {INTERACTIVE: 0.0, BATCH: 0.0}
+        self._last_finish = {}
+        self._paused_until = {}
+        self._wakeup = None
+        self._dispatcher = None
+
+    @staticmethod
+    def estimate_tokens(system_prompt: str, user_prompt: str, max_tokens: int = 0) -> int:
+        """Rough prompt size (~4 characters per token) plus the output reservation."""
+        return (len(system_prompt) + len(user_prompt)) // 4 + max_tokens
+
+    def set_tenant_weight(self, tenant: str, weight: float):
+        self.tenant_weights[tenant] = weight
+
+    def buckets(self, model: str | None = None) -> tuple:
+        """The (requests, tokens) buckets of a model, created on first use."""
+        if model not in self._buckets:
+            rpm, tpm = self.model_limits.get(model, (self.requests_per_minute, self.tokens_per_minute))
+            self._buckets[model] = (TokenBucket(rpm), TokenBucket(tpm))
+        return self._buckets[model]
+
+    async def submit(self, make_request, priority: str = "interactive", tenant: str | None = None, tokens: int = 0,
+                     model: str | None = None):
+        """
+        Awaits admission, then awaits `make_request()` (a zero-argument coroutine factory),
+        retrying rate-limit and transient errors. Returns whatever the request returns.
+        """
+        level = PRIORITIES.get(priority, INTERACTIVE)
+        for attempt in range(self.max_retries + 1):
+            await self._admit(level, tenant or "default", tokens, model)
+            try:
+                return await make_request()
+            except self.RETRYABLE as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                if isinstance(e, groq.RateLimitError):
+                    retry_after = self._retry_after(e)
+                    delay = max(delay, retry_after)
+                    self._paused_until[model] = max(self._paused_until.get(model, 0.0), time.monotonic() + retry_after)
+                await asyncio.sleep(delay)
+
+    def settle(self, reserved_tokens: int, used_tokens: int, model: str | None = None):
+        """Returns the unused part of a token reservation once the real usage is known."""
+        if used_tokens < reserved_tokens:
+            self.buckets(model)[1].give_back(reserved_tokens - used_tokens)
+
+    async def _admit(self, level: int, tenant: str, tokens: int, model: str | None):
+        loop = asyncio.get_running_loop()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        weight = self.tenant_weights.get(tenant, 1.0)
+        start = max(self._virtual_time[level], self._last_finish.get((level, tenant), 0.0))
+        finish = start + max(tokens, 1) / weight
+        self._last_finish[(level, tenant)] = finish
+
+        admitted = loop.create_future()
+        heapq.heappush(self._queue, (level, finish, next(self._seq), tokens, model, admitted))
+        if self._dispatcher is None or self._dispatcher.done():
+            # Not in the caller's context: the dispatcher outlives the request that starts it
+            self._dispatcher = loop.create_task(self._dispatch(), context=contextvars.Context())
+        self._wakeup.set()
+        await admitted
+
+    async def _dispatch(self):
+        while self._queue:
+            self._wakeup.clear()
+            # Serve the first request (in priority / fair order) whose model has capacity;
+            # a model with no capacity only holds back later requests for the same model
+            wait = None
+            blocked = set()
+            for entry in sorted(self._queue):
+                level, finish, _, tokens, model, admitted = entry
+                if admitted.cancelled():
+                    self._remove(entry)
+                    wait = 0.0
+                    break
+                if model in blocked:
+                    continue
+                requests_bucket, tokens_bucket = self.buckets(model)
+                headroom = self.batch_headroom if level == BATCH else 0.0
+                entry_wait = max(
+                    self._paused_until.get(model, 0.0) - time.monotonic(),
+                    requests_bucket.wait_time(1, floor=headroom * requests_bucket.capacity),
+                    tokens_bucket.wait_time(tokens, floor=headroom * tokens_bucket.capacity),
+                )
+                if entry_wait <= 0:
+                    self._remove(entry)
+                    requests_bucket.take(1)
+                    tokens_bucket.take(tokens)
+                    self._virtual_time[level] = max(self._virtual_time[level], finish)
+                    admitted.set_result(None)
+                    wait = 0.0
+                    break
+                blocked.add(model)
+                wait = entry_wait if wait is None else min(wait, entry_wait)
+            if wait:
+                # Re-check early if a new (possibly higher-priority) request arrives
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _remove(self, entry):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+
+    @staticmethod
+    def _retry_after(error) -> float:
+        try:
+            return float(error.response.headers.get("retry-after", 0))
+        except (AttributeError, TypeError, ValueError):
+            return 0.0
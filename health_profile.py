@@ -0,0 +1,67 @@
+import functools
+import fitness_calcs
+
+ACTIVITY_LEVELS = list(fitness_calcs.ACTIVITY_MULTIPLIERS)
+FITNESS_GOALS = list(fitness_calcs.PROTEIN_MULTIPLIERS)
+# Used for whatever a profile's body_metrics leave out, as the pages always have
+DEFAULT_METRICS = {
+    'weight_kg': 70.0, 'height_cm': 175.0, 'age': 30, 'gender': "Male",
+    'activity_level': "Moderately Active", 'fitness_goal': "Maintain Fitness",
+}
+
+class HealthProfile:
+    """
+    Immutable snapshot of a user's body metrics and every metric derived from them.
+
+    Build it with `HealthProfile.from_metrics(profile['body_metrics'])`: snapshots are
+    memoized on their inputs, so pages and prompts rendering the same metrics share one
+    object and nothing is recomputed on reruns.
+    """
+    __slots__ = (
+        'weight_kg', 'height_cm', 'age', 'gender', 'activity_level', 'fitness_goal',
+        'bmi', 'body_fat_percent', 'bmr', 'tdee', 'protein_g', 'ideal_weight_kg', 'body_water_percent',
+    )
+
+    def __init__(self, weight_kg: float, height_cm: float, age: int, gender: str, activity_level: str, fitness_goal: str):
+        bmi = float(fitness_calcs.bmi(weight_kg, height_cm))
+        bmr = int(fitness_calcs.bmr(weight_kg, height_cm, age, gender))
+        values = {
+            'weight_kg': weight_kg, 'height_cm': height_cm, 'age': age, 'gender': gender,
+            'activity_level': activity_level, 'fitness_goal': fitness_goal,
+            'bmi': bmi,
+            'body_fat_percent': float(fitness_calcs.body_fat(bmi, age, gender)),
+            'bmr': bmr,
+            'tdee': float(fitness_calcs.tdee(bmr, activity_level)),
+            'protein_g': float(fitness_calcs.protein_needs(weight_kg, fitness_goal)),
+            'ideal_weight_kg': float(fitness_calcs.ideal_weight(height_cm, gender)),
+            'body_water_percent': float(fitness_calcs.body_water(weight_kg, age, gender, height_cm)),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("HealthProfile is immutable; build a new one with from_metrics")
+
+    def __delattr__(self, name):
+        raise AttributeError("HealthProfile is immutable")
+
+    def __repr__(self):
+        return (f"HealthProfile(weight_kg={self.weight_kg}, height_cm={self.height_cm}, age={self.age}, "
+                f"gender={self.gender!r}, bmi={self.bmi}, tdee={self.tdee:.0f})")
+
+    @staticmethod
+    def from_metrics(body_metrics: dict | None) -> "HealthProfile":
+        """The (shared) snapshot for a profile's body_metrics, defaults filling any gaps."""
+        metrics = {**DEFAULT_METRICS, **{key: value for key, value in (body_metrics or {}).items() if value is not None}}
+        return _build(
+            float(metrics['weight_kg']), float(metrics['height_cm']), int(metrics['age']), str(metrics['gender']),
+            str(metrics['activity_level']), str(metrics['fitness_goal']),
+        )
+
+    def inputs(self) -> dict:
+        """The body_metrics this snapshot was built from."""
+        return {name: getattr(self, name) for name in DEFAULT_METRICS}
+
+@functools.lru_cache(maxsize=4096)
+def _build(weight_kg, height_cm, age, gender, activity_level, fitness_goal) -> HealthProfile:
+    return HealthProfile(weight_kg, height_cm, age, gender, activity_level, fitness_goal)
@@ -0,0 +1,132 @@
+import hashlib
+import heapq
+from datetime import date, datetime, timedelta, timezone
+from rollups import week_key
+
+# Ranked metrics: weekly totals for the current ISO week, and the current workout streak
+METRICS = {
+    'workout_minutes': "Workout minutes this week",
+    'calories_burned': "Calories burned this week",
+    'streak_days': "Workout streak (days)",
+}
+WEEKLY_METRICS = ('workout_minutes', 'calories_burned')
+# Entries shown, and entries kept per board: the spare ones let a leader's total drop
+# (an overwritten log) without a full re-rank; the nightly rebuild restores exactness
+TOP_K = 10
+KEEP = 2 * TOP_K
+
+ADJECTIVES = [
+    "Swift", "Brave", "Calm", "Bold", "Bright", "Steady", "Mighty", "Nimble", "Keen", "Lively", "Quiet", "Sunny",
+    "Clever", "Daring", "Gentle", "Happy", "Jolly", "Loyal", "Proud", "Rapid", "Sharp", "Strong", "Witty", "Zesty",
+    "Agile", "Eager", "Fierce", "Grand", "Hardy", "Noble", "Plucky", "Vivid",
+]
+ANIMALS = [
+    "Otter", "Falcon", "Panda", "Tiger", "Dolphin", "Fox", "Eagle", "Koala", "Lynx", "Heron", "Bison", "Gecko",
+    "Puma", "Raven", "Moose", "Badger", "Cheetah", "Orca", "Hawk", "Ibex", "Jaguar", "Lemur", "Marmot", "Newt",
+    "Owl", "Pelican", "Quail", "Salmon", "Stoat", "Walrus", "Yak", "Zebra",
+]
+
+def member_key(org_id: str, user_uid: str) -> str:
+    """Pseudonymous id of a user on their org's boards (boards never store uids or names)."""
+    return hashlib.sha256(f"{org_id}:{user_uid}".encode('utf-8')).hexdigest()[:16]
+
+def alias(member: str) -> str:
+    """Stable display name for a member key, e.g. 'Swift Otter 42'."""
+    value = int(member, 16)
+    return f"{ADJECTIVES[value % len(ADJECTIVES)]} {ANIMALS[value // len(ADJECTIVES) % len(ANIMALS)]} {value % 97 + 1}"
+
+def current_streak(rollup: dict, today: date | None = None) -> tuple[int, str | None]:
+    """
+    Consecutive days with workout minutes ending today or yesterday (so a day not yet
+    logged does not break it), from the rollup's per-day map; with the streak's last day.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    workout_days = {
+        date_str for bucket in rollup.get('weeks', {}).values()
+        for date_str, values in bucket.get('days', {}).items() if values.get('workout_minutes', 0) > 0
+    }
+    day = today if today.strftime('%Y-%m-%d') in workout_days else today - timedelta(days=1)
+    last_day = day.strftime('%Y-%m-%d')
+    streak = 0
+    while day.strftime('%Y-%m-%d') in workout_days:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak, (last_day if streak else None)
+
+def member_values(rollup: dict, today: date | None = None) -> dict:
+    """A member's value for every metric from their rollup: {metric: (value, last_day or None)}."""
+    today = today or datetime.now(timezone.utc).date()
+    week = rollup.get('weeks', {}).get(week_key(today), {})
+    streak, last_day = current_streak(rollup, today)
+    return {
+        'workout_minutes': (week.get('workout_minutes', 0), None),
+        'calories_burned': (week.get('calories_burned', 0), None),
+        'streak_days': (streak, last_day),
+    }
+
+def offer(entries: list, member: str, value, last_day: str | None = None, keep: int = KEEP) -> bool:
+    """
+    Updates a board's ranked entries (best first) with a member's new value through a
+    bounded min-heap of `keep` entries. Returns whether the board changed.
+    """
+    heap = [(entry['value'], entry['member'], entry) for entry in entries if entry['member'] != member]
+    previous = len(heap) != len(entries)
+    heapq.heapify(heap)
+    entry = {'member': member, 'alias': alias(member), 'value': value}
+    if last_day:
+        entry['last_day'] = last_day
+    if value > 0:
+        if len(heap) < keep:
+            heapq.heappush(heap, (value, member, entry))
+        elif (value, member) > heap[0][:2]:
+            heapq.heapreplace(heap, (value, member, entry))
+        elif not previous:
+            return False
+    elif not previous:
+        return False
+    entries[:] = [item[2] for item in sorted(heap, key=lambda item: item[:2], reverse=True)]
+    return True
+
+def apply_member(board: dict, member: str, values: dict, today: date | None = None) -> bool:
+    """
+    Offers a member's values to every metric of a board document. Weekly metrics are
+    reset when the board is from an earlier week. Returns whether anything changed.
+    """
+    week = week_key(today or datetime.now(timezone.utc).date())
+    changed = False
+    if board.get('week') != week:
+        board['week'] = week
+        for metric in WEEKLY_METRICS:
+            board[metric] = []
+        changed = True
+    for metric, (value, last_day) in values.items():
+        changed |= offer(board.setdefault(metric, []), member, value, last_day)
+    return changed
+
+def build_board(members: dict, today: date | None = None) -> dict:
+    """A board from scratch (the batch rebuild): `members` maps member key -> member_values()."""
+    today = today or datetime.now(timezone.utc).date()
+    board = {'week': week_key(today)}
+    for metric in METRICS:
+        ranked = heapq.nlargest(KEEP, (
+            (values[metric][0], member, values[metric][1]) for member, values in members.items() if values[metric][0] > 0
+        ))
+        board[metric] = [
+            {'member': member, 'alias': alias(member), 'value': value} | ({'last_day': last_day} if last_day else {})
+            for value, member, last_day in ranked
+        ]
+    return board
+
+def top(board: dict | None, metric: str, k: int = TOP_K, today: date | None = None) -> list:
+    """
+    The best `k` entries of a metric as shown, with rank: weekly metrics only for the current
+    week, and streaks only while still alive (last workout today or yesterday).
+    """
+    today = today or datetime.now(timezone.utc).date()
+    if not board:
+        return []
+    if metric in WEEKLY_METRICS and board.get('week') != week_key(today):
+        return []
+    yesterday = (today - timedelta(days=1)).strftime('%Y-%m-%d')
+    entries = [entry for entry in board.get(metric, []) if entry.get('last_day', yesterday) >= yesterday]
+    return [{'rank': rank} | entry for rank, entry in enumerate(entries[:k], start=1)]
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from caching import TTLCache
+
+class LLMResponseCache:
+    """
+    Content-addressed cache of AI responses with two tiers: an in-memory LRU in front of
+    an on-disk SQLite table. Both tiers honour the same TTL; the disk tier is capped at
+    `max_disk_entries`, evicting the least recently used rows.
+
+    The SQLite calls block, so Backend runs the disk methods on its I/O pool.
+    """
+    def __init__(self, path: str, memory_entries: int = 256, max_disk_entries: int = 5000, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.memory = TTLCache(memory_entries, ttl_seconds)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes_since_trim = 0
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: int, system_prompt: str, user_prompt: str) -> str:
+        payload = json.dumps([model, float(temperature), int(max_tokens), system_prompt, user_prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_memory(self, key: str) -> str | None:
+        return self.memory.get(key)
+
+    def get_disk(self, key: str) -> str | None:
+        """Reads the disk tier and promotes a hit into memory."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            now = time.time()
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+        self.memory.set(key, response)
+        return response
+
+    def set(self, key: str, response: str):
+        """Stores a response in both tiers."""
+        self.memory.set(key, response)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._writes_since_trim += 1
+            # Enforcing the cap on every insert would mean a COUNT(*) per write
+            if self._writes_since_trim >= 50:
+                self._trim(conn, now)
+            conn.commit()
+
+    def clear(self):
+        self.memory.clear()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM responses")
+            conn.commit()
+
+    def _trim(self, conn, now):
+        self._writes_since_trim = 0
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        return self._conn
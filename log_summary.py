@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Roughly 4 characters per token for English text and markdown tables
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 900
+
+METRIC_COLUMNS = ['weight_kg', 'bmi', 'body_fat_percent', 'workout_duration_min', 'calories_burned']
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _frame(logs) -> pd.DataFrame:
+    df = pd.DataFrame(logs)
+    if df.empty or 'date' not in df:
+        return pd.DataFrame(columns=['date'] + METRIC_COLUMNS)
+    df['date'] = pd.to_datetime(df['date'], utc=True).dt.tz_localize(None).dt.normalize()
+    for column in METRIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce') if column in df else np.nan
+    # One row per day (the latest save wins), oldest first
+    return df.sort_values('date').drop_duplicates('date', keep='last').reset_index(drop=True)[['date'] + METRIC_COLUMNS]
+
+def _streaks(workout_dates: pd.Series, today) -> tuple[int, int]:
+    """(current, longest) runs of consecutive workout days."""
+    if workout_dates.empty:
+        return 0, 0
+    days = workout_dates.values.astype('datetime64[D]')
+    breaks = np.diff(days).astype(int) != 1
+    run_ids = np.concatenate([[0], np.cumsum(breaks)])
+    run_lengths = np.bincount(run_ids)
+    # The latest run only counts as current if it reaches today or yesterday
+    gap = (np.datetime64(today, 'D') - days[-1]).astype(int)
+    current = int(run_lengths[-1]) if gap <= 1 else 0
+    return current, int(run_lengths.max())
+
+def _slope_per_week(df: pd.DataFrame, column: str) -> float | None:
+    points = df[['date', column]].dropna()
+    points = points[points[column] > 0]
+    if len(points) < 2:
+        return None
+    days = (points['date'] - points['date'].iloc[0]).dt.days.to_numpy(dtype=float)
+    if np.ptp(days) == 0:
+        return None
+    return float(np.polyfit(days, points[column].to_numpy(dtype=float), 1)[0] * 7)
+
+def _weekly(df: pd.DataFrame, weeks: int) -> pd.DataFrame:
+    weekly = df.set_index('date').resample('W-SUN').agg({
+        'workout_duration_min': 'sum', 'calories_burned': 'sum', 'weight_kg': 'mean',
+    })
+    weekly['workout_days'] = df.set_index('date')['workout_duration_min'].gt(0).resample('W-SUN').sum()
+    weekly = weekly.tail(weeks).round(1)
+    weekly.index = weekly.index.strftime('week ending %Y-%m-%d')
+    return weekly.rename_axis('week').reset_index()
+
+def _outliers(df: pd.DataFrame, limit: int) -> pd.DataFrame:
+    """Days whose minutes, calories or weight change sit more than 2.5 standard deviations from the mean."""
+    signals = pd.DataFrame({
+        'workout_duration_min': df['workout_duration_min'],
+        'calories_burned': df['calories_burned'],
+        'weight_change_kg': df['weight_kg'].where(df['weight_kg'] > 0).diff(),
+    })
+    z = (signals - signals.mean()) / signals.std(ddof=0).replace(0, np.nan)
+    flagged = z.abs().gt(2.5).any(axis=1)
+    return df.loc[flagged, ['date', 'weight_kg', 'workout_duration_min', 'calories_burned']].tail(limit)
+
+def summarize_logs(logs, token_budget: int = DEFAULT_TOKEN_BUDGET, recent_days: int = 7, weeks: int = 8,
+                   max_outliers: int = 5, today=None) -> str:
+    """
+    Reduces any amount of daily-log history to a fixed-size markdown summary for an AI
+    prompt: overall totals, weekly aggregates, trend slopes, streaks, the most recent days
+    and outlier days. If the result is over `token_budget`, the tables are trimmed until it fits.
+    """
+    df = _frame(logs)
+    if df.empty:
+        return "No logged data yet."
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+
+    workouts = df[df['workout_duration_min'] > 0]
+    current_streak, longest_streak = _streaks(workouts['date'], today)
+    weight_slope = _slope_per_week(df.tail(weeks * 7), 'weight_kg')
+    minutes_slope = _slope_per_week(df.tail(weeks * 7), 'workout_duration_min')
+    latest = df.iloc[-1]
+
+    overview = [
+        f"- Logged days: {len(df)} ({df['date'].iloc[0]:%Y-%m-%d} to {df['date'].iloc[-1]:%Y-%m-%d})",
+        f"- Workout days: {len(workouts)}, total {df['workout_duration_min'].sum():.0f} min, {df['calories_burned'].sum():.0f} kcal burned",
+        f"- Current workout streak: {current_streak} day(s); longest: {longest_streak} day(s)",
+    ]
+    latest_weight = df['weight_kg'].where(df['weight_kg'] > 0).dropna()
+    if not latest_weight.empty:
+        line = f"- Latest weight: {latest_weight.iloc[-1]:.1f} kg"
+        if pd.notna(latest['bmi']) and pd.notna(latest['body_fat_percent']):
+            line += f", BMI {latest['bmi']:.1f}, body fat {latest['body_fat_percent']:.1f}%"
+        overview.append(line)
+    if weight_slope is not None:
+        overview.append(f"- Weight trend (last {weeks} weeks): {weight_slope:+.2f} kg/week")
+    if minutes_slope is not None:
+        overview.append(f"- Workout duration trend (last {weeks} weeks): {minutes_slope:+.1f} min/day per week")
+
+    while True:
+        sections = ["Overview:\n" + "\n".join(overview)]
+        if weeks:
+            sections.append("Weekly totals:\n" + _weekly(df, weeks).to_markdown(index=False))
+        if recent_days:
+            recent = df.tail(recent_days).assign(date=lambda d: d['date'].dt.strftime('%Y-%m-%d'))
+            sections.append(f"Last {len(recent)} logged days:\n" + recent.to_markdown(index=False))
+        if max_outliers:
+            outliers = _outliers(df, max_outliers)
+            if not outliers.empty:
+                outliers = outliers.assign(date=outliers['date'].dt.strftime('%Y-%m-%d'))
+                sections.append("Unusual days:\n" + outliers.to_markdown(index=False))
+        summary = "\n\n".join(sections)
+        if estimate_tokens(summary) <= token_budget or not (weeks or recent_days or max_outliers):
+            return summary
+        # Shrink the largest optional section first
+        if max_outliers:
+            max_outliers = 0
+        elif weeks > recent_days:
+            weeks = weeks // 2
+        else:
+            recent_days = recent_days // 2
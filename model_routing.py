@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama3-8b-8192"
+FAST_MODEL = "llama-3.1-8b-instant"
+
+# Per-feature generation settings. `slo_seconds` bounds the recent p95 of `slo_metric`
+# ("ttft" for streamed pages, where the first words matter; "latency" for whole answers);
+# past it, the feature is routed to `fallback_model` for a while.
+ROUTES = {
+    "workout_plan":         {"model": DEFAULT_MODEL, "max_tokens": 2000, "temperature": 0.7, "slo_metric": "ttft", "slo_seconds": 4.0, "fallback_model": FAST_MODEL},
+    "meal_plan":            {"model": DEFAULT_MODEL, "max_tokens": 2000, "temperature": 0.7, "slo_metric": "ttft", "slo_seconds": 4.0, "fallback_model": FAST_MODEL},
+    "recipe":               {"model": DEFAULT_MODEL, "max_tokens": 900,  "temperature": 0.7, "slo_metric": "ttft", "slo_seconds": 3.0, "fallback_model": FAST_MODEL},
+    "swaps":                {"model": DEFAULT_MODEL, "max_tokens": 600,  "temperature": 0.6, "slo_metric": "ttft", "slo_seconds": 3.0, "fallback_model": FAST_MODEL},
+    "exercise_suggestions": {"model": DEFAULT_MODEL, "max_tokens": 900,  "temperature": 0.7, "slo_metric": "ttft", "slo_seconds": 3.0, "fallback_model": FAST_MODEL},
+    "weekly_analysis":      {"model": DEFAULT_MODEL, "max_tokens": 500,  "temperature": 0.5, "slo_metric": "ttft", "slo_seconds": 3.0, "fallback_model": FAST_MODEL},
+    "progress_analysis":    {"model": DEFAULT_MODEL, "max_tokens": 900,  "temperature": 0.5, "slo_metric": "ttft", "slo_seconds": 3.0, "fallback_model": FAST_MODEL},
+    # 2-3 sentences: a small output reservation on the fast model, judged on the whole answer
+    "nudge":                {"model": FAST_MODEL,    "max_tokens": 150,  "temperature": 0.8, "slo_metric": "latency", "slo_seconds": 2.0, "fallback_model": None},
+    # Off-peak batch of reusable nudge templates (see nudge_pool)
+    "nudge_templates":      {"model": DEFAULT_MODEL, "max_tokens": 900,  "temperature": 0.9, "slo_metric": "latency", "slo_seconds": 30.0, "fallback_model": None},
+    "general":              {"model": DEFAULT_MODEL, "max_tokens": 2000, "temperature": 0.7, "slo_metric": "latency", "slo_seconds": 20.0, "fallback_model": None},
+}
+
+class ModelRouter:
+    """
+    Picks model, max_tokens and temperature for a feature from ROUTES, watching the
+    feature's recent p95 in AIMetrics. When the primary model breaches the SLO (over at
+    least `min_samples` calls), the feature moves to its fallback model for
+    `fallback_seconds`; afterwards the primary is tried again and judged only on new samples.
+    """
+    def __init__(self, metrics, routes: dict | None = None, min_samples: int = 10, fallback_seconds: float = 300.0):
+        self.metrics = metrics
+        self.routes = routes or ROUTES
+        self.min_samples = min_samples
+        self.fallback_seconds = fallback_seconds
+        self._lock = threading.Lock()
+        self._fallback_until = {}  # feature -> monotonic time the fallback ends
+        self._judged_since = {}    # feature -> monotonic time the primary's samples count from
+
+    def route(self, feature: str) -> dict:
+        """The effective settings for `feature`: model, max_tokens, temperature (and the SLO fields)."""
+        route = dict(self.routes.get(feature, self.routes["general"]))
+        fallback = route.get("fallback_model")
+        if not fallback:
+            return route
+        now = time.monotonic()
+        with self._lock:
+            until = self._fallback_until.get(feature)
+            if until is not None:
+                if now < until:
+                    route["model"] = fallback
+                    return route
+                # Fallback period over: give the primary a fresh window
+                del self._fallback_until[feature]
+                self._judged_since[feature] = now
+            since = self._judged_since.get(feature)
+        p95, samples = self.metrics.percentile(feature, route["model"], route["slo_metric"], 95, since=since)
+        if samples >= self.min_samples and p95 is not None and p95 > route["slo_seconds"]:
+            with self._lock:
+                self._fallback_until[feature] = now + self.fallback_seconds
+            logger.warning("AI route '%s': p95 %s %.2fs over the %.1fs SLO, using %s", feature, route["slo_metric"], p95, route["slo_seconds"], fallback)
+            route["model"] = fallback
+        return route
+
+    def status(self) -> dict:
+        """feature -> model currently in use, for display."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                feature: route["fallback_model"] if self._fallback_until.get(feature, 0) > now else route["model"]
+                for feature, route in self.routes.items()
+            }
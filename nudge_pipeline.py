@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+_DONE = object()
+
+class NudgePipeline:
+    """
+    Three-stage pipeline for one agent run:
+
+    producer  - awaits the inactive-user finder and feeds (org_id, profile) pairs into a bounded queue
+    workers   - `concurrency` tasks that each generate one nudge at a time (the slow LLM stage)
+    writer    - collects finished nudges and saves them in batches of `batch_size`
+
+    Users for whom the cooldown `policy` says a nudge is not yet due are dropped by the
+    producer, before any LLM work.
+
+    Once `budget_seconds` has elapsed the producer stops feeding new users, so a run
+    always ends inside the agent's interval; skipped users are picked up next run.
+    """
+    def __init__(self, backend, generate_nudge, concurrency=8, queue_size=100, batch_size=100,
+                 flush_seconds=2.0, budget_seconds=None, policy=None, logger=None):
+        self.backend = backend
+        self.generate_nudge = generate_nudge
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.budget_seconds = budget_seconds
+        self.policy = policy
+        self.logger = logger
+
+    async def run(self, find_inactive_users) -> dict:
+        """Runs the pipeline over the users returned by the `find_inactive_users` coroutine."""
+        started = time.monotonic()
+        stats = {'found': 0, 'cooling_down': 0, 'queued': 0, 'skipped': 0, 'generated': 0, 'failed': 0, 'saved': 0}
+        users = asyncio.Queue(maxsize=self.queue_size)
+        results = asyncio.Queue(maxsize=self.queue_size)
+
+        async def producer():
+            try:
+                inactive = await find_inactive_users
+                stats['found'] = len(inactive)
+                for org_id, profile in inactive:
+                    if not profile.get('uid'):
+                        continue
+                    if self.policy and not self.policy.is_due(profile):
+                        stats['cooling_down'] += 1
+                        continue
+                    if self.budget_seconds and time.monotonic() - started > self.budget_seconds:
+                        stats['skipped'] = stats['found'] - stats['queued'] - stats['cooling_down']
+                        self._log("warning", f"Run budget of {self.budget_seconds:.0f}s reached; {stats['skipped']} user(s) deferred to the next run.")
+                        break
+                    await users.put((org_id, profile))
+                    stats['queued'] += 1
+            finally:
+                for _ in range(self.concurrency):
+                    await users.put(_DONE)
+
+        async def worker():
+            while True:
+                item = await users.get()
+                if item is _DONE:
+                    await results.put(_DONE)
+                    return
+                org_id, profile = item
+                try:
+                    message = (await self.generate_nudge(profile) or "").strip()
+                    if not message:
+                        raise ValueError("empty nudge")
+                    stats['generated'] += 1
+                    await results.put((org_id, profile['uid'], message, profile))
+                except Exception as e:
+                    stats['failed'] += 1
+                    self._log("error", f"Failed to generate nudge for {profile.get('name', 'User')}: {e}")
+
+        async def writer():
+            batch, finished_workers = [], 0
+            while finished_workers < self.concurrency:
+                try:
+                    item = await asyncio.wait_for(results.get(), timeout=self.flush_seconds)
+                except asyncio.TimeoutError:
+                    item = None
+                if item is _DONE:
+                    finished_workers += 1
+                elif item is not None:
+                    batch.append(item)
+                if batch and (len(batch) >= self.batch_size or item is None or finished_workers == self.concurrency):
+                    stats['saved'] += await self.backend.save_notifications_batch(batch, mark_nudged=True)
+                    batch = []
+
+        await asyncio.gather(producer(), writer(), *(worker() for _ in range(self.concurrency)))
+
+        elapsed = time.monotonic() - started
+        stats['elapsed_seconds'] = round(elapsed, 2)
+        stats['nudges_per_second'] = round(stats['generated'] / elapsed, 2) if elapsed else 0.0
+        stats['writes_per_second'] = round(stats['saved'] / elapsed, 2) if elapsed else 0.0
+        self._log("info", f"Nudge pipeline finished: {stats}")
+        return stats
+
+    def _log(self, level, message):
+        if self.logger:
+            getattr(self.logger, level)(message)
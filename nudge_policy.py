@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+from caching import as_utc
+
+class NudgeCooldownPolicy:
+    """
+    Decides whether an inactive user is due another nudge.
+
+    Profiles carry `last_nudged_at` and `nudges_ignored` (nudges sent since the user's last
+    workout; save_daily_log resets it). The first follow-up waits `base_hours`, and each
+    further ignored nudge multiplies the wait by `backoff_factor`, up to `max_hours`.
+    """
+    def __init__(self, base_hours: float = 24, backoff_factor: float = 2.0, max_hours: float = 168):
+        self.base_hours = base_hours
+        self.backoff_factor = backoff_factor
+        self.max_hours = max_hours
+
+    def cooldown_for(self, nudges_ignored: int) -> timedelta:
+        hours = self.base_hours * self.backoff_factor ** max(nudges_ignored - 1, 0)
+        return timedelta(hours=min(hours, self.max_hours))
+
+    def is_due(self, profile: dict, now: datetime | None = None) -> bool:
+        last_nudged = profile.get('last_nudged_at')
+        if last_nudged is None:
+            return True
+        now = now or datetime.now(timezone.utc)
+        return now - as_utc(last_nudged) >= self.cooldown_for(profile.get('nudges_ignored', 0) or 0)
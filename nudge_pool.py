@@ -0,0 +1,133 @@
+import json
+import re
+import zlib
+from datetime import datetime, timedelta, timezone
+from caching import as_utc
+
+# Goals with their own templates; anything else free-typed gets a custom LLM nudge
+GOALS = {
+    "weight loss": "Weight Loss", "muscle gain": "Muscle Gain", "strength": "Strength", "endurance": "Endurance",
+    "flexibility & mobility": "Flexibility & Mobility", "maintain fitness": "Maintain Fitness", "general health": "General Health",
+    # The goal names Body_Metrics saves
+    "lose weight": "Weight Loss", "gain muscle": "Muscle Gain", "improve endurance": "Endurance",
+}
+DEFAULT_GOAL = "General Health"
+# (minimum days without a workout, label) - the first bucket starts at the agent's inactivity threshold
+INACTIVITY_BUCKETS = [(30, "a month or more"), (14, "two to four weeks"), (7, "one to two weeks"), (0, "a few days")]
+# Tone by how many nudges in a row the user has ignored
+TONES = [(0, "upbeat"), (1, "gentle")]
+# From this many ignored nudges on, templates have evidently stopped working: write a custom one
+CUSTOM_AFTER_IGNORED = 3
+TEMPLATES_PER_SEGMENT = 8
+TEMPLATE_MAX_AGE_DAYS = 7
+
+class NudgePool:
+    """
+    Pre-written nudge templates per (goal, inactivity, tone) segment, so the agent can
+    render most nudges instead of making one LLM call per user.
+
+    Templates are generated in off-peak batches (`refill`) and stored one document per
+    segment in the Firestore `nudge_pool` collection; `load` reads them all at the start of a
+    run. `render` fills in the user's name, rotating through a segment's templates per user
+    and day, and returns None when the user should get a custom LLM nudge instead: a goal
+    outside GOALS, CUSTOM_AFTER_IGNORED or more ignored nudges, or an empty segment.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.templates = {}
+        self.stats = {'rendered': 0, 'custom': 0}
+
+    @staticmethod
+    def segment_id(goal: str, inactivity: str, tone: str) -> str:
+        return "__".join(re.sub(r"[^a-z0-9]+", "-", part.lower()).strip("-") for part in (goal, inactivity, tone))
+
+    @staticmethod
+    def all_segments() -> list:
+        return [(goal, inactivity, tone) for goal in dict.fromkeys(GOALS.values()) for _, inactivity in INACTIVITY_BUCKETS for _, tone in TONES]
+
+    @staticmethod
+    def segment_for(profile: dict, now: datetime | None = None) -> tuple | None:
+        """The user's (goal, inactivity, tone) segment, or None if they need a custom nudge."""
+        ignored = profile.get('nudges_ignored', 0) or 0
+        if ignored >= CUSTOM_AFTER_IGNORED:
+            return None
+        raw_goal = (profile.get('body_metrics', {}).get('fitness_goal') or "").strip()
+        goal = GOALS.get(raw_goal.lower()) if raw_goal and raw_goal.lower() != "not set" else DEFAULT_GOAL
+        if goal is None:
+            return None
+        last_workout = profile.get('last_workout_at')
+        if last_workout is None:
+            # Never worked out (new user): keep it light
+            inactivity = INACTIVITY_BUCKETS[-1][1]
+        else:
+            days = ((now or datetime.now(timezone.utc)) - as_utc(last_workout)).days
+            inactivity = next(label for minimum, label in INACTIVITY_BUCKETS if days >= minimum)
+        tone = next(label for minimum, label in reversed(TONES) if ignored >= minimum)
+        return goal, inactivity, tone
+
+    async def load(self) -> int:
+        """Reads every segment's templates; returns how many segments have some."""
+        self.templates = {
+            segment_id: doc.get('templates', [])
+            for segment_id, doc in (await self.backend.get_nudge_templates()).items()
+        }
+        return sum(1 for templates in self.templates.values() if templates)
+
+    def render(self, profile: dict, now: datetime | None = None) -> str | None:
+        segment = self.segment_for(profile, now)
+        templates = self.templates.get(self.segment_id(*segment)) if segment else None
+        if not templates:
+            self.stats['custom'] += 1
+            return None
+        # Same user, same day -> same template; the next nudge (days later) gets another one
+        day = (now or datetime.now(timezone.utc)).toordinal()
+        template = templates[(zlib.crc32(profile.get('uid', '').encode('utf-8')) + day) % len(templates)]
+        self.stats['rendered'] += 1
+        return template.replace("{name}", profile.get('name') or "there")
+
+    async def refill(self, generate, force: bool = False, logger=None) -> int:
+        """
+        Regenerates segments that are empty or older than TEMPLATE_MAX_AGE_DAYS (all of them
+        with `force`). `generate(system_prompt, user_prompt)` is the LLM call. Returns the
+        number of segments written.
+        """
+        existing = await self.backend.get_nudge_templates()
+        stale_before = datetime.now(timezone.utc) - timedelta(days=TEMPLATE_MAX_AGE_DAYS)
+        written = 0
+        for goal, inactivity, tone in self.all_segments():
+            segment_id = self.segment_id(goal, inactivity, tone)
+            doc = existing.get(segment_id, {})
+            generated_at = doc.get('generated_at')
+            if not force and doc.get('templates') and generated_at and as_utc(generated_at) > stale_before:
+                continue
+            system_prompt = f"""
+            You are an empathetic and motivating AI wellness coach writing push notifications.
+            The reader's fitness goal is {goal}, and they have not logged a workout in {inactivity}.
+            Write {TEMPLATES_PER_SEGMENT} different short (2-3 sentences), {tone}, actionable nudges to get them back on track,
+            each suggesting one small, concrete step. Write {{name}} wherever the reader's name goes; use no other placeholders.
+            Reply with only a JSON array of strings.
+            """
+            templates = self.parse_templates(await generate(system_prompt, "Write the nudges."))
+            if not templates:
+                if logger:
+                    logger.warning(f"No usable nudge templates generated for {segment_id}.")
+                continue
+            if await self.backend.save_nudge_templates(segment_id, {
+                'goal': goal, 'inactivity': inactivity, 'tone': tone, 'templates': templates,
+            }):
+                self.templates[segment_id] = templates
+                written += 1
+        return written
+
+    @staticmethod
+    def parse_templates(text: str) -> list:
+        """Keeps the generated strings that address the reader by {name} and have no other placeholders."""
+        try:
+            candidates = json.loads(text[text.index('['):text.rindex(']') + 1])
+        except ValueError:
+            candidates = [re.sub(r"^\s*(?:\d+[.)]|[-*])\s*", "", line) for line in text.splitlines()]
+        return [
+            candidate.strip() for candidate in candidates
+            if isinstance(candidate, str) and "{name}" in candidate
+            and not re.search(r"\{(?!name\})[^}]*\}", candidate) and len(candidate) <= 400
+        ][:TEMPLATES_PER_SEGMENT]
@@ -0,0 +1,91 @@
+import streamlit as st
+from async_runtime import iterate_async, run_async
+from plan_library import from_library
+from health_profile import HealthProfile
+
+def write_ai_stream(backend, system_prompt, user_prompt, transient=False, **kwargs) -> str:
+    """
+    Renders an AI answer on the page token by token and returns the final text so the
+    caller can keep it in session state. With transient=True the streamed output is
+    cleared once complete, for pages that render the stored result themselves.
+    """
+    # The user's org is the unit of fair sharing in the Groq scheduler
+    kwargs.setdefault('tenant', st.session_state.get('user_info', {}).get('org_id'))
+    placeholder = st.empty()
+    try:
+        with placeholder.container():
+            response = st.write_stream(iterate_async(backend.stream_ai_response(system_prompt, user_prompt, **kwargs)))
+    except Exception as e:
+        placeholder.empty()
+        st.error(f"Error with AI API: {e}")
+        return "An error occurred with the AI service."
+    if transient:
+        placeholder.empty()
+    if not isinstance(response, str):
+        response = "".join(str(part) for part in response)
+    return response.strip()
+
+def current_health_profile(backend):
+    """The signed-in user's shared HealthProfile (defaults when signed out)."""
+    user_info = st.session_state.get('user_info') or {}
+    if not user_info.get('uid') or not user_info.get('org_id'):
+        return HealthProfile.from_metrics(None)
+    return run_async(backend.get_health_profile(user_info['uid'], user_info['org_id']))
+
+def _plan_job_state(backend, job_id) -> dict:
+    job = backend.plan_jobs.get(job_id)
+    if job:
+        return job
+    user_info = st.session_state.user_info
+    job = run_async(backend.get_plan_job(user_info['org_id'], user_info['uid'], job_id))
+    if not job:
+        return {'id': job_id, 'status': "failed", 'error': "The plan job could not be found."}
+    if job.get('status') in ("queued", "running"):
+        # Not in this process any more (server restart): it will never finish
+        job |= {'status': "failed", 'error': "Plan generation was interrupted. Please try again."}
+    return job
+
+def follow_plan_job(backend, job_key: str, poll_seconds: float = 1.0) -> dict | None:
+    """
+    Tracks the background plan job whose id is in st.session_state[job_key]. While it is
+    queued or running, a fragment polls every `poll_seconds` and shows the text written so
+    far. When it ends the page reruns, and this returns the finished job once ("done", or
+    "failed" after showing the error) and clears the key.
+    """
+    job_id = st.session_state.get(job_key)
+    if not job_id:
+        return None
+    job = _plan_job_state(backend, job_id)
+    if job['status'] in ("done", "failed"):
+        st.session_state.pop(job_key, None)
+        if job['status'] == "failed":
+            st.error(job.get('error') or "Plan generation failed.")
+        return job
+
+    @st.fragment(run_every=poll_seconds)
+    def _progress():
+        current = _plan_job_state(backend, job_id)
+        if current['status'] in ("done", "failed"):
+            st.rerun()
+        if current['status'] == "queued":
+            st.caption("⏳ Waiting for a free slot... You can leave this page; the plan is saved to your account when ready.")
+        else:
+            st.caption("✍️ Writing your plan... You can leave this page; it is saved to your account when ready.")
+        if current.get('partial'):
+            st.markdown(current['partial'])
+
+    _progress()
+    return None
+
+def reuse_library_plan(backend, kind: str, key: str, user_name: str | None) -> str | None:
+    """
+    Returns the org's stored plan for these inputs, personalised for the current user, and
+    records it in the user's plans; None if the inputs have not been generated before.
+    """
+    user_info = st.session_state.user_info
+    stored = run_async(backend.get_library_plan(user_info['org_id'], key))
+    if not stored or not stored.get('content'):
+        return None
+    content = from_library(stored['content'], user_name)
+    run_async(backend.reuse_library_plan(user_info['org_id'], user_info['uid'], key, kind, content))
+    return content
@@ -0,0 +1,150 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import time
+from plan_library import to_library
+
+class PlanJob:
+    """One plan generation: its inputs, status and the text streamed so far."""
+    def __init__(self, job_id, dedup_key, backend, org_id, user_uid, kind, system_prompt, user_prompt, use_cache, metadata):
+        self.job_id = job_id
+        self.dedup_key = dedup_key
+        self.backend = backend
+        self.org_id = org_id
+        self.user_uid = user_uid
+        self.kind = kind
+        self.system_prompt = system_prompt
+        self.user_prompt = user_prompt
+        self.use_cache = use_cache
+        self.metadata = metadata
+        self.status = "queued"
+        self.pieces = []
+        self.content = None
+        self.error = None
+        self.finished_at = None
+
+    @property
+    def partial(self) -> str:
+        return "".join(self.pieces)
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.job_id, 'kind': self.kind, 'status': self.status, 'content': self.content,
+            'partial': self.partial, 'error': self.error, 'metadata': self.metadata,
+        }
+
+class PlanJobQueue:
+    """
+    Background generation of workout and meal plans on the shared event loop.
+
+    `submit` records the job in Firestore (organizations/{org}/users/{uid}/plans/{job_id},
+    status "queued") and returns its id at once. Up to `workers` jobs run concurrently;
+    each streams its answer into memory, so pages can show partial text, and the finished
+    plan (or the error) is written back to the same document. Submitting a job identical
+    to one that is still queued or running returns the existing job's id. At most
+    `max_pending` jobs wait; beyond that `submit` returns None. A finished job whose
+    metadata has a `library_key` is also saved to the org's plan library.
+    """
+    def __init__(self, workers: int = 4, max_pending: int = 100, keep_finished_seconds: float = 600.0):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.keep_finished_seconds = keep_finished_seconds
+        self._jobs = {}     # job_id -> PlanJob, until keep_finished_seconds after it ends
+        self._pending = {}  # dedup key -> PlanJob, while queued or running
+        self._creating = {} # dedup key -> future of the job id, while its document is being created
+        self._queue = None
+        self._worker_tasks = []
+
+    @staticmethod
+    def dedup_key(user_uid: str, kind: str, system_prompt: str, user_prompt: str) -> str:
+        payload = json.dumps([user_uid, kind, system_prompt, user_prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def submit(self, backend, org_id: str, user_uid: str, kind: str, system_prompt: str, user_prompt: str,
+                     use_cache: bool = True, metadata: dict | None = None) -> str | None:
+        """Queues a plan generation (`kind` is the AI feature, e.g. "workout_plan") and returns the job id."""
+        key = self.dedup_key(user_uid, kind, system_prompt, user_prompt)
+        if key in self._pending:
+            return self._pending[key].job_id
+        if key in self._creating:
+            return await asyncio.shield(self._creating[key])
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._queue.qsize() >= self.max_pending:
+            return None
+
+        # Identical submits arriving while the document is being created wait for this one
+        creating = asyncio.get_running_loop().create_future()
+        self._creating[key] = creating
+        job_id = None
+        try:
+            job_id = await backend.create_plan_job(org_id, user_uid, {
+                'kind': kind, 'status': "queued", 'prompt': user_prompt, 'metadata': metadata or {},
+            })
+        finally:
+            del self._creating[key]
+            creating.set_result(job_id)
+        if not job_id:
+            return None
+        job = PlanJob(job_id, key, backend, org_id, user_uid, kind, system_prompt, user_prompt, use_cache, metadata or {})
+        self._jobs[job_id] = job
+        self._pending[key] = job
+        self._queue.put_nowait(job)
+        self._ensure_workers()
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """Live state of a job known to this process (None once forgotten or if never seen)."""
+        job = self._jobs.get(job_id)
+        return job.as_dict() if job else None
+
+    def _ensure_workers(self):
+        self._worker_tasks = [task for task in self._worker_tasks if not task.done()]
+        loop = asyncio.get_running_loop()
+        while len(self._worker_tasks) < self.workers:
+            # A fresh context: workers outlive the run_async call that starts them, so their
+            # notify_ui messages must be logged rather than queued for that call's page
+            self._worker_tasks.append(loop.create_task(self._worker(), context=contextvars.Context()))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+                self._forget_finished()
+
+    async def _run(self, job: PlanJob):
+        job.status = "running"
+        backend = job.backend
+        await backend.update_plan_job(job.org_id, job.user_uid, job.job_id, {'status': "running"})
+        try:
+            async for piece in backend.stream_ai_response(
+                job.system_prompt, job.user_prompt, use_cache=job.use_cache, tenant=job.org_id, feature=job.kind,
+            ):
+                job.pieces.append(piece)
+            job.content = job.partial.strip()
+            job.status = "done"
+        except Exception as e:
+            job.error = f"Error with AI API: {e}"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.monotonic()
+            self._pending.pop(job.dedup_key, None)
+        await backend.update_plan_job(job.org_id, job.user_uid, job.job_id, {
+            'status': job.status, 'content': job.content, 'error': job.error,
+        }, completed=True)
+        # Plans requested with a library key are shared with the org for identical inputs
+        library_key = job.metadata.get('library_key')
+        if job.status == "done" and job.content and library_key:
+            await backend.save_library_plan(job.org_id, library_key, {
+                'kind': job.kind, 'inputs': job.metadata.get('library_inputs', {}),
+                'content': to_library(job.content, job.metadata.get('user_name')),
+            })
+
+    def _forget_finished(self):
+        cutoff = time.monotonic() - self.keep_finished_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
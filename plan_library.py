@@ -0,0 +1,74 @@
+import hashlib
+import json
+import re
+
+# Stands in for the requesting user's name in stored plans, so they can be shared in the org
+NAME_PLACEHOLDER = "{{name}}"
+# Calorie targets within the same 50 kcal step share plans
+CALORIE_STEP = 50
+# Body metrics are rounded to these steps: users in the same buckets share plans, and
+# stored plans are written for the bucket, never for one user's exact stats
+WEIGHT_STEP_KG = 5
+HEIGHT_STEP_CM = 5
+AGE_STEP = 5
+
+def _text(value) -> str:
+    """Lowercase, punctuation-free, single-spaced text."""
+    return " ".join(re.sub(r"[^\w\s&]+", " ", str(value or "")).lower().split())
+
+def _terms(values) -> list:
+    """Sorted unique normalized terms from a list or a comma-separated string."""
+    if isinstance(values, str):
+        values = values.split(",")
+    return sorted({_text(value) for value in values or [] if _text(value)} - {"none"})
+
+def _bucket(value, step):
+    return int(round(float(value) / step) * step)
+
+def profile_inputs(body_metrics: dict) -> dict:
+    """
+    Body metrics (HealthProfile.inputs()) rounded to the library's buckets. Library plans
+    key on these and their prompts are built from them, so a shared plan fits everyone
+    who gets it and carries nobody's exact stats.
+    """
+    return {
+        'weight_kg': float(_bucket(body_metrics['weight_kg'], WEIGHT_STEP_KG)),
+        'height_cm': float(_bucket(body_metrics['height_cm'], HEIGHT_STEP_CM)),
+        'age': max(_bucket(body_metrics['age'], AGE_STEP), AGE_STEP),
+        'gender': body_metrics['gender'], 'activity_level': body_metrics['activity_level'],
+        'fitness_goal': body_metrics['fitness_goal'],
+    }
+
+def workout_inputs(profile, fitness_level, workout_goal, equipment, duration_min, days_per_week, prompt) -> dict:
+    """`profile` is the user's profile_inputs()."""
+    return {
+        'profile': profile, 'fitness_level': _text(fitness_level), 'workout_goal': _text(workout_goal),
+        'equipment': _terms(equipment), 'duration_min': int(duration_min), 'days_per_week': int(days_per_week),
+        'prompt': _text(prompt),
+    }
+
+def meal_inputs(profile, diet_goal, calorie_target, preferences, allergies, prompt) -> dict:
+    """`profile` is the user's profile_inputs()."""
+    return {
+        'profile': profile, 'diet_goal': _text(diet_goal), 'calorie_target': _bucket(calorie_target, CALORIE_STEP),
+        'preferences': _terms(preferences), 'allergies': _terms(allergies), 'prompt': _text(prompt),
+    }
+
+def plan_key(kind: str, inputs: dict) -> str:
+    """Canonical hash of a plan kind and its normalized inputs (the library document id)."""
+    payload = json.dumps([kind, inputs], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def to_library(content: str, user_name: str | None) -> str:
+    """
+    Replaces the user's profile name, and each part of it, with NAME_PLACEHOLDER. Matches are
+    whole words only (so 'Ann' keeps 'Annual'); single-letter initials are left alone.
+    """
+    parts = (user_name or "").split()
+    names = sorted({" ".join(parts), *(part for part in parts if len(part) > 1)} - {""}, key=len, reverse=True)
+    for name in names:
+        content = re.sub(rf"\b{re.escape(name)}\b", NAME_PLACEHOLDER, content)
+    return content
+
+def from_library(content: str, user_name: str | None) -> str:
+    return content.replace(NAME_PLACEHOLDER, user_name or "there")
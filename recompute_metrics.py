@@ -0,0 +1,146 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import fitness_calcs
+
+# Stored columns derived from a log's weight and the profile's body metrics
+DERIVED_FIELDS = ('bmi', 'body_fat_percent')
+# Logs are read and written back this many at a time (a write batch holds at most 500)
+PAGE_SIZE = 500
+
+def changed_metrics(logs: pd.DataFrame, height_cm: float, age: int, gender: str) -> pd.DataFrame:
+    """
+    Recomputes bmi and body_fat_percent for a frame of logs (id, weight_kg and the stored
+    columns) against the given body metrics. Returns the rows whose stored values differ,
+    with the new values; logs without a positive weight or a stored bmi are left alone.
+    """
+    if logs.empty or 'weight_kg' not in logs or 'bmi' not in logs:
+        return pd.DataFrame(columns=['id', *DERIVED_FIELDS])
+    weight = pd.to_numeric(logs['weight_kg'], errors='coerce')
+    logs = logs[(weight > 0) & logs['bmi'].notna()]
+    if logs.empty:
+        return pd.DataFrame(columns=['id', *DERIVED_FIELDS])
+    bmi = fitness_calcs.bmi(logs['weight_kg'], height_cm)
+    body_fat = fitness_calcs.body_fat(bmi, age, gender)
+    stored_bmi = pd.to_numeric(logs['bmi'], errors='coerce').to_numpy(dtype=float)
+    if 'body_fat_percent' in logs:
+        stored_fat = pd.to_numeric(logs['body_fat_percent'], errors='coerce').to_numpy(dtype=float)
+    else:
+        stored_fat = np.full(len(logs), np.nan)
+    # NaN (missing) never compares close, so those rows are rewritten too
+    changed = ~np.isclose(stored_bmi, bmi) | ~np.isclose(stored_fat, body_fat)
+    return pd.DataFrame({
+        'id': logs['id'].to_numpy()[changed],
+        'bmi': bmi[changed],
+        'body_fat_percent': body_fat[changed],
+    })
+
+async def recompute_user_metrics(backend, org_id: str, user_uid: str, body_metrics: dict | None = None,
+                                 page_size: int = PAGE_SIZE) -> dict:
+    """
+    Brings a user's stored bmi / body_fat_percent in line with their body metrics (read
+    from the profile unless given). Logs are read a page at a time and only the changed
+    ones are written back. Returns {'read': n, 'changed': n, 'written': n, 'failed': n},
+    where 'failed' counts changed logs whose write did not go through.
+    """
+    stats = {'read': 0, 'changed': 0, 'written': 0, 'failed': 0}
+    if body_metrics is None:
+        profile = await backend.get_user_profile(user_uid, org_id)
+        body_metrics = (profile or {}).get('body_metrics', {})
+    height = body_metrics.get('height_cm', 175.0)
+    age = body_metrics.get('age', 30)
+    gender = body_metrics.get('gender', 'Male')
+    if not height or height <= 0:
+        return stats
+
+    async for page in backend.scan_daily_logs(org_id, user_uid, page_size):
+        stats['read'] += len(page)
+        logs = pd.DataFrame([{'id': doc.id, **doc.to_dict()} for doc in page])
+        changed = changed_metrics(logs, height, age, gender)
+        if changed.empty:
+            continue
+        stats['changed'] += len(changed)
+        updates = [
+            (row.id, {'bmi': float(row.bmi), 'body_fat_percent': float(row.body_fat_percent)})
+            for row in changed.itertuples(index=False)
+        ]
+        written = await backend.update_daily_logs_batch(org_id, user_uid, updates)
+        stats['written'] += written
+        stats['failed'] += len(updates) - written
+    return stats
+
+def _new_state() -> dict:
+    return {'last_uid': None, 'users': 0, 'read': 0, 'changed': 0, 'written': 0, 'failed': 0, 'done': False}
+
+class RecomputeCheckpoint:
+    """
+    Progress of org-wide recomputations in a JSON file: per org, the last user finished
+    (users are processed in uid order), the running totals and whether the org is done.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.orgs = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.orgs = json.load(f)
+            except (OSError, ValueError):
+                self.orgs = {}
+
+    def get(self, org_id: str) -> dict:
+        return self.orgs.get(org_id) or _new_state()
+
+    def save(self, org_id: str, state: dict):
+        self.orgs[org_id] = state
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write-then-rename, so an interrupted run never leaves a half-written checkpoint
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.orgs, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self, org_id: str):
+        self.save(org_id, _new_state())
+
+async def recompute_org_metrics(backend, org_id: str, checkpoint: RecomputeCheckpoint | None = None,
+                                progress=None, page_size: int = PAGE_SIZE) -> dict:
+    """
+    Runs recompute_user_metrics for every user of an org. With a checkpoint, users up to
+    the last finished one are skipped and progress is saved after each user, so a rerun
+    resumes where an interrupted one stopped. A user with failed writes stops the run
+    before the checkpoint passes them (their logs are retried next run), with the count
+    in state['failed']. `progress(done, total, state)` is called after each user.
+    Returns the org's state (totals included).
+    """
+    state = checkpoint.get(org_id) if checkpoint else None
+    if not state or state.get('done'):
+        state = _new_state()
+    state['failed'] = 0  # Failures of this run; a resumed run retries the earlier ones
+    profiles = sorted(
+        (profile for profile in await backend.get_users_in_organization(org_id) if profile.get('uid')),
+        key=lambda profile: profile['uid'],
+    )
+    done = sum(1 for profile in profiles if state['last_uid'] is not None and profile['uid'] <= state['last_uid'])
+    for profile in profiles[done:]:
+        stats = await recompute_user_metrics(backend, org_id, profile['uid'], profile.get('body_metrics', {}), page_size)
+        if stats['failed']:
+            state['failed'] += stats['failed']
+            if checkpoint:
+                checkpoint.save(org_id, state)
+            return state
+        for key in ('read', 'changed', 'written'):
+            state[key] += stats[key]
+        state['users'] += 1
+        state['last_uid'] = profile['uid']
+        done += 1
+        if checkpoint:
+            checkpoint.save(org_id, state)
+        if progress:
+            progress(done, len(profiles), state)
+    state['done'] = True
+    if checkpoint:
+        checkpoint.save(org_id, state)
+    return state
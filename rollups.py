@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+from caching import as_utc
+
+# How many of the most recent buckets the rollup document keeps
+ROLLUP_MAX_WEEKS = 26
+ROLLUP_MAX_MONTHS = 24
+
+def week_key(day) -> str:
+    """ISO week bucket, e.g. '2025-W07'."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def month_key(day) -> str:
+    return day.strftime('%Y-%m')
+
+def _empty_bucket() -> dict:
+    return {
+        'calories_burned': 0, 'workout_minutes': 0, 'days_logged': 0, 'workout_days': 0,
+        'avg_calories_burned': 0.0, 'avg_workout_minutes': 0.0,
+        'weight_min': None, 'weight_max': None, 'weight_avg': None,
+    }
+
+def _day_values(log: dict) -> dict:
+    return {
+        'calories_burned': log.get('calories_burned', 0) or 0,
+        'workout_minutes': log.get('workout_duration_min', 0) or 0,
+        'weight_kg': log.get('weight_kg', 0) or 0,
+    }
+
+def _apply(bucket: dict, date_str: str, old: dict | None, new: dict):
+    """Moves one day's contribution in a bucket from `old` to `new` and refreshes derived fields."""
+    if old is not None:
+        bucket['calories_burned'] -= old['calories_burned']
+        bucket['workout_minutes'] -= old['workout_minutes']
+        bucket['days_logged'] -= 1
+        bucket['workout_days'] -= 1 if old['workout_minutes'] > 0 else 0
+    bucket['calories_burned'] += new['calories_burned']
+    bucket['workout_minutes'] += new['workout_minutes']
+    bucket['days_logged'] += 1
+    bucket['workout_days'] += 1 if new['workout_minutes'] > 0 else 0
+
+    days = bucket['days_logged']
+    bucket['avg_calories_burned'] = round(bucket['calories_burned'] / days, 1) if days else 0.0
+    bucket['avg_workout_minutes'] = round(bucket['workout_minutes'] / days, 1) if days else 0.0
+
+    # Weight stats are recomputed from the bucket's per-day map, so overwriting a day is exact
+    if 'days' in bucket:
+        bucket['days'][date_str] = new
+        weights = [values['weight_kg'] for values in bucket['days'].values()]
+    else:
+        if new['weight_kg'] > 0:
+            bucket['weights'][date_str] = new['weight_kg']
+        else:
+            bucket['weights'].pop(date_str, None)
+        weights = list(bucket['weights'].values())
+    weights = [w for w in weights if w > 0]
+    bucket['weight_min'] = min(weights) if weights else None
+    bucket['weight_max'] = max(weights) if weights else None
+    bucket['weight_avg'] = round(sum(weights) / len(weights), 2) if weights else None
+
+def apply_log_to_rollup(rollup: dict, old_log: dict | None, new_log: dict) -> dict:
+    """
+    Folds a saved daily log into a rollup document in place. `old_log` is the previous
+    version of the same day (or None), so overwriting a day replaces its contribution.
+
+    Week buckets keep a per-day 'days' map (which also feeds the dashboard's 7-day chart);
+    month buckets keep a per-day 'weights' map for min/max/avg.
+    """
+    day = new_log['date']
+    date_str = day.strftime('%Y-%m-%d')
+    old = _day_values(old_log) if old_log is not None else None
+    new = _day_values(new_log)
+
+    week = rollup.setdefault('weeks', {}).setdefault(week_key(day), _empty_bucket() | {'days': {}})
+    _apply(week, date_str, old, new)
+
+    month = rollup.setdefault('months', {}).setdefault(month_key(day), _empty_bucket() | {'weights': {}})
+    _apply(month, date_str, old, new)
+
+    for period, keep in (('weeks', ROLLUP_MAX_WEEKS), ('months', ROLLUP_MAX_MONTHS)):
+        for stale in sorted(rollup[period])[:-keep]:
+            rollup[period].pop(stale)
+    return rollup
+
+def build_rollup(logs: list) -> dict:
+    """Builds a rollup document from scratch, e.g. for users who logged before rollups existed."""
+    rollup = {}
+    for log in sorted(logs, key=lambda log: log['date']):
+        apply_log_to_rollup(rollup, None, log)
+    return rollup
+
+def daily_series(rollup: dict, days: int = 7, today=None) -> list:
+    """Per-day values for the last `days` days (oldest first), read from the week buckets."""
+    today = today or datetime.now().date()
+    series = []
+    for offset in range(days - 1, -1, -1):
+        day = today - timedelta(days=offset)
+        bucket = rollup.get('weeks', {}).get(week_key(day), {})
+        values = bucket.get('days', {}).get(day.strftime('%Y-%m-%d'), {})
+        series.append({
+            'date': day,
+            'calories_burned': values.get('calories_burned', 0),
+            'workout_duration_min': values.get('workout_minutes', 0),
+            'weight_kg': values.get('weight_kg', 0),
+        })
+    return series
+
+def logged_days(rollup: dict) -> list:
+    """Every day actually present in the week buckets (no zero-filled gaps), oldest first."""
+    rows = []
+    for bucket in rollup.get('weeks', {}).values():
+        for date_str, values in bucket.get('days', {}).items():
+            rows.append({
+                'date': date_str,
+                'calories_burned': values.get('calories_burned', 0),
+                'workout_duration_min': values.get('workout_minutes', 0),
+                'weight_kg': values.get('weight_kg', 0),
+            })
+    return sorted(rows, key=lambda row: row['date'])
+
+def recent_buckets(rollup: dict, period: str = 'weeks', count: int = 8) -> list:
+    """The latest `count` buckets of a period as rows (without the per-day maps), oldest first."""
+    buckets = rollup.get(period, {})
+    rows = []
+    for key in sorted(buckets)[-count:]:
+        bucket = buckets[key]
+        rows.append({'period': key} | {k: v for k, v in bucket.items() if k not in ('days', 'weights')})
+    return rows
+
+def latest_workout_day(rollup: dict) -> str | None:
+    """Most recent 'YYYY-MM-DD' with workout minutes in the rollup's week buckets, if any."""
+    latest = None
+    for bucket in rollup.get('weeks', {}).values():
+        for date_str, values in bucket.get('days', {}).items():
+            if values.get('workout_minutes', 0) > 0 and (latest is None or date_str > latest):
+                latest = date_str
+    return latest
+
+def activity_markers(profile: dict, old_log: dict | None, new_log: dict, rollup: dict) -> dict:
+    """
+    Profile fields to update for a saved log: last_log_at and last_workout_at only move
+    forward, except when a day that held the latest workout is overwritten without one,
+    in which case last_workout_at falls back to the latest workout left in the rollup.
+    """
+    day = as_utc(new_log['date'])
+    markers = {}
+    last_log = profile.get('last_log_at')
+    if last_log is None or as_utc(last_log) < day:
+        markers['last_log_at'] = day
+
+    last_workout = profile.get('last_workout_at')
+    if (new_log.get('workout_duration_min', 0) or 0) > 0:
+        if last_workout is None or as_utc(last_workout) < day:
+            markers['last_workout_at'] = day
+        # A workout answers any outstanding nudges, resetting the agent's cooldown backoff
+        if profile.get('nudges_ignored'):
+            markers['nudges_ignored'] = 0
+    elif (old_log is not None and (old_log.get('workout_duration_min', 0) or 0) > 0
+          and last_workout is not None and as_utc(last_workout).date() == day.date()):
+        latest = latest_workout_day(rollup)
+        markers['last_workout_at'] = as_utc(datetime.strptime(latest, '%Y-%m-%d')) if latest else None
+    return markers
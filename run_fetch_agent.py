@@ -1,24 +1,60 @@
 import asyncio
+import os
+import sys
 from datetime import datetime, timedelta
 import pytz
 from uagents import Agent, Context
 
 # Import the backend class to interact with the database
 from backend_logic import Backend
+from nudge_pipeline import NudgePipeline
+from nudge_policy import NudgeCooldownPolicy
+from nudge_pool import NudgePool
+from recompute_metrics import RecomputeCheckpoint, recompute_org_metrics
 
 # --- Agent Configuration ---
 AGENT_NAME = "autonomous_wellness_agent"
 AGENT_SEED = "a_very_secret_seed_for_the_autonomous_agent" # Change this
 CHECK_INTERVAL_SECONDS = 3600.0 # Check once per hour
+INACTIVITY_DAYS = 3 # Days without a workout before a user is nudged
+# "indexed": one last_workout_at query per org. "collection_group": a few paged
+# collection-group scans over all orgs' users and daily_logs, joined in memory.
+SCAN_MODE = os.getenv("AGENT_SCAN_MODE", "indexed")
+SCAN_PAGE_SIZE = int(os.getenv("AGENT_SCAN_PAGE_SIZE", "500"))
+# Nudge pipeline: concurrent LLM calls, queue depth between stages, notifications per
+# write batch, and how long a run may keep starting new nudges (default: 80% of the interval)
+NUDGE_CONCURRENCY = int(os.getenv("NUDGE_CONCURRENCY", "8"))
+NUDGE_QUEUE_SIZE = int(os.getenv("NUDGE_QUEUE_SIZE", "100"))
+NUDGE_WRITE_BATCH_SIZE = int(os.getenv("NUDGE_WRITE_BATCH_SIZE", "100"))
+NUDGE_RUN_BUDGET_SECONDS = float(os.getenv("NUDGE_RUN_BUDGET_SECONDS", str(CHECK_INTERVAL_SECONDS * 0.8)))
+# Nudge cooldown: hours before a user can be nudged again, doubled (by the backoff factor)
+# for every nudge they ignore, capped at the max
+NUDGE_COOLDOWN_HOURS = float(os.getenv("NUDGE_COOLDOWN_HOURS", "24"))
+NUDGE_BACKOFF_FACTOR = float(os.getenv("NUDGE_BACKOFF_FACTOR", "2"))
+NUDGE_MAX_COOLDOWN_HOURS = float(os.getenv("NUDGE_MAX_COOLDOWN_HOURS", "168"))
+# Hour (UTC) in which stale nudge templates are regenerated, off the app's peak
+NUDGE_POOL_REFILL_HOUR_UTC = int(os.getenv("NUDGE_POOL_REFILL_HOUR_UTC", "3"))
+# Hour (UTC) in which the org and team participation counters and leaderboards are rebuilt from source data
+COUNTER_RECONCILE_HOUR_UTC = int(os.getenv("COUNTER_RECONCILE_HOUR_UTC", "4"))
+# Where --recompute-metrics records its progress, so an interrupted run can resume
+RECOMPUTE_CHECKPOINT_PATH = os.getenv("RECOMPUTE_CHECKPOINT_PATH", ".cache/recompute_checkpoint.json")
 
 # Create the agent
 agent = Agent(name=AGENT_NAME, seed=AGENT_SEED)
 
 # Initialize our application's backend
 backend = Backend()
+cooldown_policy = NudgeCooldownPolicy(NUDGE_COOLDOWN_HOURS, NUDGE_BACKOFF_FACTOR, NUDGE_MAX_COOLDOWN_HOURS)
+nudge_pool = NudgePool(backend)
 
 async def generate_nudge(user_profile: dict) -> str:
-    """Helper function to generate the AI nudge."""
+    """
+    Renders a pooled template for the user's segment, and only calls the LLM for users
+    who need a custom nudge (see NudgePool.render).
+    """
+    message = nudge_pool.render(user_profile)
+    if message:
+        return message
     system_prompt = f"""
     You are an empathetic and motivating AI wellness coach.
     A user, {user_profile.get('name', 'User')}, has not logged a workout in a few days.
@@ -27,7 +63,57 @@ async def generate_nudge(user_profile: dict) -> str:
     Address them by their name.
     """
     user_prompt = "Give me a personalized motivational nudge to get back on track."
-    return await backend.get_ai_response(system_prompt, user_prompt)
+    # Nudges should feel fresh every time, so they never come from the response cache
+    # Batch priority: the scheduler serves interactive page requests first
+    # Errors propagate, so the pipeline counts the user as failed instead of sending them the error
+    return await backend.get_ai_response(system_prompt, user_prompt, use_cache=False, priority="batch",
+                                         tenant=user_profile.get('org_id'), feature="nudge", raise_errors=True)
+
+async def generate_nudge_templates(system_prompt: str, user_prompt: str) -> str:
+    return await backend.get_ai_response(system_prompt, user_prompt, use_cache=False, priority="batch", feature="nudge_templates")
+
+async def find_inactive_users_indexed(ctx: Context, inactive_since: datetime) -> list:
+    """Returns (org_id, profile) pairs using one indexed last_workout_at query per org."""
+    organizations = await backend.get_all_organizations()
+    if not organizations:
+        ctx.logger.info("No organizations found."); return []
+
+    inactive = []
+    for org in organizations:
+        org_id = org['id']
+        org_name = org.get('name', 'Unnamed Org')
+        try:
+            inactive_users = await backend.get_inactive_users(org_id, inactive_since)
+            ctx.logger.info(f"{len(inactive_users)} inactive user(s) in {org_name}.")
+            inactive.extend((org_id, profile) for profile in inactive_users)
+        except Exception as e:
+            ctx.logger.error(f"Failed to process organization {org_name}: {e}")
+    return inactive
+
+async def find_inactive_users_collection_group(ctx: Context, inactive_since: datetime) -> list:
+    """
+    Returns (org_id, profile) pairs from two paged collection-group scans: every
+    profile across all orgs, and every log since `inactive_since`. Results are keyed
+    by (org_id, uid) in memory, so nothing is read per org or per user.
+    Needs the collection-group index on daily_logs.date in firestore.indexes.json.
+    """
+    profiles = {}
+    async for page in backend.scan_collection_group('users', page_size=SCAN_PAGE_SIZE):
+        for doc in page:
+            org_id = doc.reference.parent.parent.id
+            profiles[(org_id, doc.id)] = doc.to_dict()
+    ctx.logger.info(f"Scanned {len(profiles)} user profile(s).")
+
+    active = set()
+    async for page in backend.scan_collection_group('daily_logs', filters=[('date', '>=', inactive_since)],
+                                                     order_field='date', page_size=SCAN_PAGE_SIZE):
+        for doc in page:
+            if (doc.to_dict().get('workout_duration_min') or 0) > 0:
+                user_ref = doc.reference.parent.parent
+                active.add((user_ref.parent.parent.id, user_ref.id))
+    ctx.logger.info(f"{len(active)} user(s) worked out recently.")
+
+    return [(org_id, profile) for (org_id, uid), profile in profiles.items() if (org_id, uid) not in active]
 
 @agent.on_interval(period=CHECK_INTERVAL_SECONDS)
 async def check_for_inactive_users(ctx: Context):
@@ -35,52 +121,109 @@ async def check_for_inactive_users(ctx: Context):
     This is the main function of the agent. It runs on a schedule,
     finds inactive users, and sends them a motivational nudge.
     """
-    ctx.logger.info(f"Agent running check at {datetime.now()}...")
+    ctx.logger.info(f"Agent running check at {datetime.now()} (scan mode: {SCAN_MODE})...")
     if not backend.db:
         ctx.logger.error("Database not initialized. Agent cannot run."); return
 
-    organizations = await backend.get_all_organizations()
-    if not organizations:
-        ctx.logger.info("No organizations found."); return
+    three_days_ago = datetime.now(pytz.utc) - timedelta(days=INACTIVITY_DAYS)
+    if SCAN_MODE == "collection_group":
+        find_inactive = find_inactive_users_collection_group(ctx, three_days_ago)
+    else:
+        find_inactive = find_inactive_users_indexed(ctx, three_days_ago)
 
-    for org in organizations:
-        org_id = org['id']
-        org_name = org.get('name', 'Unnamed Org')
-        ctx.logger.info(f"Checking organization: {org_name}")
+    segments = await nudge_pool.load()
+    nudge_pool.stats = {'rendered': 0, 'custom': 0}
+    ctx.logger.info(f"Nudge pool: {segments} segment(s) with templates.")
+    pipeline = NudgePipeline(
+        backend, generate_nudge,
+        concurrency=NUDGE_CONCURRENCY, queue_size=NUDGE_QUEUE_SIZE, batch_size=NUDGE_WRITE_BATCH_SIZE,
+        budget_seconds=NUDGE_RUN_BUDGET_SECONDS, policy=cooldown_policy, logger=ctx.logger,
+    )
+    try:
+        await pipeline.run(find_inactive)
+        ctx.logger.info(f"Nudges from templates: {nudge_pool.stats['rendered']}, custom: {nudge_pool.stats['custom']}.")
+    except Exception as e:
+        ctx.logger.error(f"Nudge run failed: {e}")
+
+    # Off-peak: regenerate empty or stale template segments (a no-op once they are fresh)
+    if datetime.now(pytz.utc).hour == NUDGE_POOL_REFILL_HOUR_UTC:
         try:
-            users_ref = backend.db.collection('organizations').document(org_id).collection('users')
-            all_users_in_org = [doc.to_dict() for doc in users_ref.stream()]
-
-            for user_profile in all_users_in_org:
-                user_uid = user_profile.get("uid")
-                user_name = user_profile.get("name", "User")
-                if not user_uid: continue
-
-                daily_logs = await backend.get_daily_logs(org_id, user_uid)
-                
-                has_worked_out_recently = False
-                if daily_logs:
-                    three_days_ago = datetime.now(pytz.utc) - timedelta(days=3)
-                    for log in daily_logs:
-                        log_date = log.get('date')
-                        if isinstance(log_date, datetime):
-                            if log_date.tzinfo is None:
-                                log_date = pytz.utc.localize(log_date)
-                            
-                            if log_date > three_days_ago and log.get("workout_duration_min", 0) > 0:
-                                has_worked_out_recently = True
-                                break
-                
-                if not has_worked_out_recently:
-                    ctx.logger.info(f"User {user_name} is inactive. Generating nudge.")
-                    nudge_message = await generate_nudge(user_profile)
-                    await backend.save_notification(org_id, user_uid, nudge_message)
-                    ctx.logger.info(f"Successfully sent nudge to {user_name}.")
-                else:
-                    ctx.logger.info(f"User {user_name} is active. No nudge needed.")
+            written = await nudge_pool.refill(generate_nudge_templates, logger=ctx.logger)
+            ctx.logger.info(f"Nudge pool refill: {written} segment(s) regenerated.")
         except Exception as e:
-            ctx.logger.error(f"Failed to process organization {org_name}: {e}")
+            ctx.logger.error(f"Nudge pool refill failed: {e}")
+
+    # Off-peak: rebuild the participation counters and leaderboards from source data
+    if datetime.now(pytz.utc).hour == COUNTER_RECONCILE_HOUR_UTC:
+        try:
+            await reconcile_counters(ctx.logger)
+        except Exception as e:
+            ctx.logger.error(f"Counter reconciliation failed: {e}")
+        try:
+            boards = await backend.rebuild_leaderboards(SCAN_PAGE_SIZE)
+            ctx.logger.info(f"Rebuilt {boards} leaderboard(s).")
+        except Exception as e:
+            ctx.logger.error(f"Leaderboard rebuild failed: {e}")
+
+async def reconcile_counters(logger=None):
+    """Rebuilds every org's participation counters, fixing drift from lost or partial writes."""
+    for org in await backend.get_all_organizations():
+        rebuilt = await backend.reconcile_counters(org['id'])
+        message = f"{org.get('name', org['id'])}: rebuilt {len(rebuilt)} counter(s)."
+        if logger:
+            logger.info(message)
+        else:
+            print(message)
+
+async def backfill_activity_markers():
+    """Sets last_workout_at / last_log_at on profiles and org_id on logs that predate those fields."""
+    for org in await backend.get_all_organizations():
+        updated = await backend.backfill_activity_markers(org['id'])
+        stamped = await backend.backfill_log_org_ids(org['id'])
+        print(f"{org.get('name', org['id'])}: backfilled {updated} profile(s) and {stamped} log(s).")
+
+async def refill_nudge_pool():
+    """Regenerates every nudge template segment now."""
+    written = await nudge_pool.refill(generate_nudge_templates, force=True)
+    print(f"Regenerated {written} of {len(NudgePool.all_segments())} nudge template segment(s).")
+
+async def recompute_metrics(org_ids: list, restart: bool = False):
+    """
+    Recomputes the stored bmi / body_fat_percent of every daily log from the users' current
+    body metrics, one org at a time, resuming from the checkpoint unless `restart`.
+    """
+    checkpoint = RecomputeCheckpoint(RECOMPUTE_CHECKPOINT_PATH)
+    orgs = await backend.get_all_organizations()
+    if org_ids:
+        orgs = [org for org in orgs if org['id'] in org_ids]
+    for org in orgs:
+        name = org.get('name', org['id'])
+        if restart:
+            checkpoint.reset(org['id'])
+        def progress(done, total, state):
+            print(f"{name}: {done}/{total} users, {state['read']} logs read, {state['written']} updated")
+        state = await recompute_org_metrics(backend, org['id'], checkpoint, progress)
+        if not state['done']:
+            print(f"{name}: stopped - {state['failed']} log update(s) failed after {state['users']} user(s); rerun to retry.")
+            continue
+        print(f"{name}: done - {state['written']} of {state['read']} log(s) updated for {state['users']} user(s).")
 
 if __name__ == "__main__":
+    if "--backfill-activity" in sys.argv:
+        asyncio.run(backfill_activity_markers())
+        sys.exit(0)
+    if "--refill-nudge-pool" in sys.argv:
+        asyncio.run(refill_nudge_pool())
+        sys.exit(0)
+    if "--reconcile-counters" in sys.argv:
+        asyncio.run(reconcile_counters())
+        sys.exit(0)
+    if "--rebuild-leaderboards" in sys.argv:
+        print(f"Rebuilt {asyncio.run(backend.rebuild_leaderboards(SCAN_PAGE_SIZE))} leaderboard(s).")
+        sys.exit(0)
+    if "--recompute-metrics" in sys.argv:
+        org_ids = [arg for arg in sys.argv[sys.argv.index("--recompute-metrics") + 1:] if not arg.startswith("--")]
+        asyncio.run(recompute_metrics(org_ids, restart="--restart" in sys.argv))
+        sys.exit(0)
     print(f"Starting agent '{AGENT_NAME}'. Press Ctrl+C to exit.")
     agent.run()
@@ -2,16 +2,11 @@ import os
 import streamlit as st
 from datetime import datetime, timedelta
 import base64
-import asyncio
-import nest_asyncio
-import pandas as pd
 import pytz
 
-# Apply the patch for nested event loops, required for Streamlit
-nest_asyncio.apply()
-
 # Import your page modules
 from backend_logic import Backend
+from async_runtime import run_async
 import Login
 import Admin_Panel
 import Body_Metrics
@@ -126,7 +121,7 @@ else:
 
         if submitted and nudge_input:
             with st.spinner("Thinking of a motivational nudge..."):
-                profile = asyncio.run(st.session_state.backend.get_user_profile(user_info['uid'], user_info['org_id']))
+                profile = run_async(st.session_state.backend.get_user_profile(user_info['uid'], user_info['org_id']))
                 if profile:
                     response = get_nudge_from_agent(nudge_input, profile, st.session_state.backend)
 
@@ -158,28 +153,19 @@ else:
                 uid = user_info["uid"]
                 org_id = user_info["org_id"]
 
-                recent_logs = asyncio.run(backend.get_daily_logs(org_id, uid))
-                
-                has_worked_out = False
-                if recent_logs:
-                    df_logs = pd.DataFrame(recent_logs)
-                    df_logs['date'] = pd.to_datetime(df_logs['date'])
-                    if df_logs['date'].dt.tz is not None:
-                        df_logs['date'] = df_logs['date'].dt.tz_localize(None)
-                    
-                    three_days_ago = datetime.now() - timedelta(days=3)
-                    recent_workouts = df_logs[df_logs['date'] > three_days_ago]
-                    if not recent_workouts.empty:
-                        has_worked_out = True
+                # A single document read: the newest log within the last 3 days, if any
+                three_days_ago = datetime.now() - timedelta(days=3)
+                recent_logs = run_async(backend.get_daily_logs(org_id, uid, since=three_days_ago, descending=True, limit=1))
+                has_worked_out = bool(recent_logs)
 
                 if not has_worked_out:
                     st.warning("It looks like you haven't logged a workout in the last 3 days. Here's a little nudge!")
-                    profile = asyncio.run(backend.get_user_profile(uid, org_id))
+                    profile = run_async(backend.get_user_profile(uid, org_id))
                     if profile:
                         message = get_nudge_from_agent(
                             "I haven't worked out in a few days and need some motivation.", profile, backend
                         )
-                        asyncio.run(backend.save_notification(org_id, uid, message))
+                        run_async(backend.save_notification(org_id, uid, message))
                         st.success("A motivational nudge has been sent to your dashboard!")
                         st.markdown(f"> {message}")
                 else:
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import fitness_calcs
+
+# The scalar formulas the vectorized calculators replaced, kept as the reference
+def scalar_bmi(weight_kg, height_cm):
+    if height_cm > 0: return round(weight_kg / ((height_cm / 100) ** 2), 2)
+    return 0.0
+
+def scalar_body_fat(bmi, age, gender):
+    if gender == "Male": return round((1.20 * bmi) + (0.23 * age) - 16.2, 1)
+    return round((1.20 * bmi) + (0.23 * age) - 5.4, 1)
+
+def scalar_bmr(weight_kg, height_cm, age, gender):
+    if gender == "Male": return int(10 * weight_kg + 6.25 * height_cm - 5 * age + 5)
+    return int(10 * weight_kg + 6.25 * height_cm - 5 * age - 161)
+
+def scalar_ideal_weight(height_cm, gender):
+    height_inches = height_cm / 2.54
+    if gender == "Male":
+        return 50 + 2.3 * (height_inches - 60)
+    return 45.5 + 2.3 * (height_inches - 60)
+
+def scalar_body_water(weight_kg, age, gender, height_cm):
+    if gender == "Male":
+        tbw = 2.447 - (0.09156 * age) + (0.1074 * height_cm) + (0.3362 * weight_kg)
+    else:
+        tbw = -2.097 + (0.1069 * height_cm) + (0.2466 * weight_kg)
+    if weight_kg > 0:
+        return (tbw / weight_kg) * 100
+    return 0.0
+
+def scalar_health_score(bmi, body_fat, age):
+    score = 100
+    if bmi < 18.5 or bmi >= 30:
+        score -= 30
+    elif bmi >= 25:
+        score -= 15
+    if body_fat > 35:
+        score -= 25
+    elif body_fat > 25:
+        score -= 10
+    if age > 50:
+        score -= 5
+    elif age > 65:
+        score -= 10
+    return max(0, min(100, score))
+
+def random_profiles(rows=5000, seed=7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'weight_kg': np.round(rng.uniform(35, 160, rows), 1),
+        'height_cm': np.round(rng.uniform(140, 210, rows), 1),
+        'age': rng.integers(16, 90, rows),
+        'gender': rng.choice(["Male", "Female", "Other"], rows),
+        'activity_level': rng.choice([*fitness_calcs.ACTIVITY_MULTIPLIERS, "Unknown"], rows),
+        'fitness_goal': rng.choice([*fitness_calcs.PROTEIN_MULTIPLIERS, "Maintain Weight", "Unknown"], rows),
+    })
+    # Edge rows: zero height and zero weight
+    frame.loc[0, 'height_cm'] = 0.0
+    frame.loc[1, 'weight_kg'] = 0.0
+    return frame
+
+def test_vectorized_calculators_match_scalar_formulas():
+    frame = random_profiles()
+    # Plain Python numbers, as the pages passed them: round() on NumPy scalars rounds differently
+    rows = [row._replace(weight_kg=float(row.weight_kg), height_cm=float(row.height_cm), age=int(row.age))
+            for row in frame.itertuples(index=False)]
+    bmi = fitness_calcs.bmi(frame['weight_kg'], frame['height_cm'])
+    body_fat = fitness_calcs.body_fat(bmi, frame['age'], frame['gender'])
+
+    assert bmi.tolist() == [scalar_bmi(row.weight_kg, row.height_cm) for row in rows]
+    assert body_fat.tolist() == [scalar_body_fat(float(b), row.age, row.gender) for b, row in zip(bmi, rows)]
+    assert fitness_calcs.bmr(frame['weight_kg'], frame['height_cm'], frame['age'], frame['gender']).tolist() == [
+        scalar_bmr(row.weight_kg, row.height_cm, row.age, row.gender) for row in rows
+    ]
+    assert fitness_calcs.health_score(bmi, body_fat, frame['age']).tolist() == [
+        scalar_health_score(float(b), float(f), row.age) for b, f, row in zip(bmi, body_fat, rows)
+    ]
+    np.testing.assert_allclose(fitness_calcs.ideal_weight(frame['height_cm'], frame['gender']),
+                               [scalar_ideal_weight(row.height_cm, row.gender) for row in rows])
+    np.testing.assert_allclose(fitness_calcs.body_water(frame['weight_kg'], frame['age'], frame['gender'], frame['height_cm']),
+                               [scalar_body_water(row.weight_kg, row.age, row.gender, row.height_cm) for row in rows])
+
+def test_tdee_and_protein_use_defaults_for_unknown_labels():
+    assert fitness_calcs.tdee(1000, "Sedentary") == 1200.0
+    assert fitness_calcs.tdee(1000, "Unknown") == 1000 * fitness_calcs.DEFAULT_ACTIVITY_MULTIPLIER
+    assert fitness_calcs.protein_needs(80, "Gain Muscle") == 80 * 2.2
+    # The diet goal "Maintain Weight" counts as "Maintain Fitness"
+    assert fitness_calcs.protein_needs(80, "Maintain Weight") == 80 * fitness_calcs.PROTEIN_MULTIPLIERS["Maintain Fitness"]
+    assert fitness_calcs.protein_needs(80, "Unknown") == 80 * fitness_calcs.DEFAULT_PROTEIN_MULTIPLIER
+
+def test_rounding_matches_python_round_near_ties():
+    # 2.675 is stored just below the tie, so round() gives 2.67 where naive half-up gives 2.68
+    assert fitness_calcs._round(np.array([2.675, 0.125, 1.5]), 2).tolist() == [round(2.675, 2), round(0.125, 2), 1.5]
+
+def test_body_metrics_frame_matches_the_single_calculators():
+    frame = fitness_calcs.body_metrics_frame(random_profiles(rows=200))
+    assert frame['bmi'].tolist() == fitness_calcs.bmi(frame['weight_kg'], frame['height_cm']).tolist()
+    np.testing.assert_allclose(frame['tdee'], fitness_calcs.tdee(frame['bmr'], frame['activity_level']))
+    np.testing.assert_allclose(frame['protein_g'], fitness_calcs.protein_needs(frame['weight_kg'], frame['fitness_goal']))
+    np.testing.assert_allclose(frame['lean_mass_kg'], frame['weight_kg'] * (1 - frame['body_fat_percent'] / 100))
@@ -0,0 +1,43 @@
+import plan_library
+from health_profile import HealthProfile
+
+def profile(**metrics) -> dict:
+    return plan_library.profile_inputs(HealthProfile.from_metrics(metrics).inputs())
+
+def test_workout_key_ignores_case_punctuation_and_order():
+    stats = profile(weight_kg=72, height_cm=178, age=33, gender="Female")
+    first = plan_library.workout_inputs(stats, "Beginner", "Strength", ["Dumbbells", "Kettlebell"], 45, 3, "A 3-day split!")
+    second = plan_library.workout_inputs(stats, "beginner", "STRENGTH", ["kettlebell", "dumbbells"], 45, 3, "a 3-day   split")
+    assert plan_library.plan_key("workout_plan", first) == plan_library.plan_key("workout_plan", second)
+    other = plan_library.workout_inputs(stats, "Beginner", "Strength", ["Dumbbells"], 45, 3, "A 3-day split!")
+    assert plan_library.plan_key("workout_plan", first) != plan_library.plan_key("workout_plan", other)
+
+def test_meal_key_buckets_calorie_targets():
+    stats = profile()
+    key = lambda calories: plan_library.plan_key("meal_plan", plan_library.meal_inputs(stats, "Lose Weight", calories, "vegan, keto", "", ""))
+    assert key(2010) == key(1990)
+    assert key(2010) != key(2100)
+
+def test_profile_inputs_bucket_body_metrics():
+    assert profile(weight_kg=72.4, height_cm=178, age=33) == profile(weight_kg=71.0, height_cm=179, age=36)
+    assert profile(weight_kg=72.4) != profile(weight_kg=78.0)
+    assert profile(gender="Male") != profile(gender="Female")
+
+def test_key_separates_different_body_metrics():
+    inputs = lambda stats: plan_library.workout_inputs(stats, "Beginner", "Strength", [], 45, 3, "")
+    light, heavy = profile(weight_kg=60), profile(weight_kg=110)
+    assert plan_library.plan_key("workout_plan", inputs(light)) != plan_library.plan_key("workout_plan", inputs(heavy))
+
+def test_to_library_scrubs_names_as_whole_words():
+    placeholder = plan_library.NAME_PLACEHOLDER
+    assert plan_library.to_library("Hi Ann, your Annual plan.", "Ann") == f"Hi {placeholder}, your Annual plan."
+    assert plan_library.to_library("Great work, Al. Balance first.", "Al") == f"Great work, {placeholder}. Balance first."
+    assert plan_library.to_library("Jo Ann Lee: go, Jo!", "Jo Ann Lee") == f"{placeholder}: go, {placeholder}!"
+    # Initials are not names worth scrubbing
+    assert plan_library.to_library("A 3-day split", "A Smith") == "A 3-day split"
+    assert plan_library.to_library("Hi there", None) == "Hi there"
+
+def test_from_library_personalises_stored_plans():
+    stored = plan_library.to_library("Hi Ann!", "Ann")
+    assert plan_library.from_library(stored, "Bea") == "Hi Bea!"
+    assert plan_library.from_library(stored, None) == "Hi there!"
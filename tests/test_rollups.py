@@ -0,0 +1,49 @@
+import random
+from datetime import datetime, timedelta, timezone
+import rollups
+
+def log(day: datetime, calories=0, minutes=0, weight=0.0) -> dict:
+    return {'date': day, 'calories_burned': calories, 'workout_duration_min': minutes, 'weight_kg': weight}
+
+def random_saves(count=400, seed=3) -> list:
+    """Saves over ~90 days, many of them overwriting a day saved earlier."""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        log(start + timedelta(days=rng.randrange(90)), rng.randrange(0, 800), rng.choice([0, 0, 20, 45, 60]),
+            rng.choice([0.0, round(rng.uniform(60, 90), 1)]))
+        for _ in range(count)
+    ]
+
+def test_incremental_rollup_matches_full_rebuild():
+    incremental, latest = {}, {}
+    for saved in random_saves():
+        date_str = saved['date'].strftime('%Y-%m-%d')
+        rollups.apply_log_to_rollup(incremental, latest.get(date_str), saved)
+        latest[date_str] = saved
+    assert incremental == rollups.build_rollup(list(latest.values()))
+
+def test_overwriting_a_day_replaces_its_contribution():
+    day = datetime(2025, 2, 10, tzinfo=timezone.utc)
+    first = log(day, calories=300, minutes=30, weight=80.0)
+    second = log(day, calories=100, minutes=0, weight=79.0)
+    rollup = rollups.apply_log_to_rollup({}, None, first)
+    rollups.apply_log_to_rollup(rollup, first, second)
+    week = rollup['weeks'][rollups.week_key(day)]
+    assert (week['calories_burned'], week['workout_minutes'], week['days_logged'], week['workout_days']) == (100, 0, 1, 0)
+    assert week['weight_min'] == week['weight_max'] == 79.0
+    assert rollup['months']['2025-02']['weights'] == {'2025-02-10': 79.0}
+
+def test_rollup_keeps_only_the_most_recent_buckets():
+    start = datetime(2023, 1, 2, tzinfo=timezone.utc)
+    rollup = rollups.build_rollup([log(start + timedelta(weeks=offset), calories=10) for offset in range(120)])
+    assert len(rollup['weeks']) == rollups.ROLLUP_MAX_WEEKS
+    assert len(rollup['months']) == rollups.ROLLUP_MAX_MONTHS
+    assert max(rollup['weeks']) == rollups.week_key(start + timedelta(weeks=119))
+
+def test_daily_series_zero_fills_missing_days():
+    today = datetime(2025, 2, 12, tzinfo=timezone.utc)
+    rollup = rollups.build_rollup([log(today - timedelta(days=1), calories=250, minutes=40)])
+    series = rollups.daily_series(rollup, days=3, today=today.date())
+    assert [row['calories_burned'] for row in series] == [0, 250, 0]
+    assert [row['workout_duration_min'] for row in series] == [0, 40, 0]
@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import pytest
+import backend_logic
+from backend_logic import Backend
+from caching import DailyLogCache
+from rollups import week_key
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+class FakeDocument:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def collection(self, name):
+        return FakeCollection(self.store, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        return FakeSnapshot(self.store.get(self.path))
+
+    def set(self, data, merge=False):
+        self.store[self.path] = {**self.store.get(self.path, {}), **data} if merge else dict(data)
+
+class FakeCollection:
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    def document(self, doc_id):
+        return FakeDocument(self.store, f"{self.path}/{doc_id}")
+
+    def order_by(self, field, direction=None):
+        return self
+
+    def stream(self, transaction=None):
+        prefix = f"{self.path}/"
+        return [FakeSnapshot(data) for path, data in self.store.items() if path.startswith(prefix) and '/' not in path[len(prefix):]]
+
+class FakeTransaction:
+    def set(self, ref, data, merge=False):
+        ref.set(data, merge=merge)
+
+class FakeDB:
+    def __init__(self):
+        self.store = {}
+
+    def collection(self, name):
+        return FakeCollection(self.store, name)
+
+    def transaction(self):
+        return FakeTransaction()
+
+@pytest.fixture
+def backend(monkeypatch):
+    # The fake transaction applies writes directly, so the retry wrapper is not needed
+    monkeypatch.setattr(backend_logic.firestore, 'transactional', lambda fn: fn)
+    backend = Backend.__new__(Backend)
+    backend.db = FakeDB()
+    backend.io_executor = ThreadPoolExecutor(max_workers=2)
+    backend.log_cache = DailyLogCache(10, 60)
+
+    async def update_leaderboards(*args):
+        return True
+    backend.update_leaderboards = update_leaderboards
+    yield backend
+    backend.io_executor.shutdown()
+
+def day(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+def test_first_save_after_deploy_folds_history_into_rollup(backend):
+    """An existing user without a rollup document keeps their earlier logs in the totals."""
+    user_path = "organizations/org/users/alice"
+    backend.db.store[user_path] = {'name': "Alice"}
+    for date_str, calories, minutes in (("2025-02-10", 300, 30), ("2025-02-11", 200, 0)):
+        backend.db.store[f"{user_path}/daily_logs/{date_str}"] = {
+            'date': day(date_str), 'calories_burned': calories, 'workout_duration_min': minutes,
+        }
+
+    # Overwrites 2025-02-11, which predates the rollup
+    saved = asyncio.run(backend.save_daily_log("alice", "org", {
+        'date': day("2025-02-11"), 'calories_burned': 250, 'workout_duration_min': 20,
+    }))
+
+    assert saved
+    week = backend.db.store[f"{user_path}/rollups/activity"]['weeks'][week_key(day("2025-02-10"))]
+    assert week['calories_burned'] == 550
+    assert week['workout_minutes'] == 50
+    assert week['days_logged'] == 2
+    assert week['workout_days'] == 2
+
+def test_save_with_existing_rollup_does_not_read_history(backend, monkeypatch):
+    """Only a missing rollup is rebuilt; an existing one is updated from the saved log alone."""
+    user_path = "organizations/org/users/bob"
+    backend.db.store[user_path] = {'name': "Bob"}
+    asyncio.run(backend.save_daily_log("bob", "org", {
+        'date': day("2025-02-10"), 'calories_burned': 300, 'workout_duration_min': 30,
+    }))
+
+    def fail_stream(self, transaction=None):
+        raise AssertionError("history read for an existing rollup")
+    monkeypatch.setattr(FakeCollection, 'stream', fail_stream)
+    saved = asyncio.run(backend.save_daily_log("bob", "org", {
+        'date': day("2025-02-11"), 'calories_burned': 200, 'workout_duration_min': 0,
+    }))
+
+    assert saved
+    week = backend.db.store[f"{user_path}/rollups/activity"]['weeks'][week_key(day("2025-02-10"))]
+    assert week['calories_burned'] == 500
+    assert week['days_logged'] == 2
+    assert week['workout_days'] == 1
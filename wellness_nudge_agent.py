@@ -1,4 +1,4 @@
-import asyncio
+from async_runtime import run_async
 
 def get_nudge_from_agent(user_input: str, user_profile: dict, backend) -> str:
     """
@@ -23,5 +23,7 @@ def get_nudge_from_agent(user_input: str, user_profile: dict, backend) -> str:
 
     user_prompt = "Give me only a short 2-3 sentence motivational message. Don't add introductions or labels. Address me by my name and suggest one actionable step."
 
-    response = asyncio.run(backend.get_ai_response(system_prompt, user_prompt))
+    # Nudges should feel fresh every time, so they never come from the response cache
+    response = run_async(backend.get_ai_response(system_prompt, user_prompt, use_cache=False, tenant=user_profile.get('org_id'),
+                                                 feature="nudge"))
     return response.strip()